@@ -2,21 +2,27 @@
 #!/usr/bin/env python
 # main.py — orchestrates the full TrendReversal pipeline from one entry-point
 
+import io
+import os
 import runpy
 import subprocess
 import sys
 import argparse
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
+from functools import partial
 from pathlib import Path
 
-from sklearn.model_selection import TimeSeriesSplit
+import pandas as pd
 
-from src.utils import load_csv
+from src.utils import load_csv, load_csv_cache_info
 from src.analysis import show_feature_importances
-from src.detection import find_daily_touches, find_weekly_touches
+from src.detection import find_daily_touches
 from src.labeling import label_reversals
-from src.features import build_feature_matrixwhite
-from src.model import train_model
-from src.backtest import evaluate_preds, backtest_reversals
+from src.feature_store import load_xy
+from src.model import cross_validate, limit_threads
+from src.save_model import save_model
+from src.backtest import backtest_holds, hold_summary
 from src.backtest_keltner_2024_debug_summary import generate_report
 from src.generate_portfolio_report import generate_portfolio_notebook
 
@@ -26,11 +32,25 @@ RESULTS_DIR = SCRIPT_ROOT / "results"
 MODELS_DIR = SCRIPT_ROOT / "models"
 NOTEBOOKS_DIR = SCRIPT_ROOT / "notebooks"
 
-def process_ticker(ticker: str):
+# Holding periods compared per ticker; trades of the first are saved
+HOLD_DAYS = [1, 2, 3, 5, 10]
+
+def process_ticker(ticker: str, cv_jobs: int = 1, warm_start: bool = False) -> dict:
+    """
+    Backtest, cross-validate and fit the model of one ticker, writing its
+    trades and feature-importance plot to per-ticker paths. The model scored
+    by src/predict.py is the universe model fitted afterwards (save_model).
+
+    cv_jobs and warm_start are passed to src.model.cross_validate.
+
+    Returns
+    -------
+    dict
+        The ticker's row of the step 3 summary table.
+    """
     print(f"\n→ Processing {ticker}…")
     df_full = load_csv(f"stock_historical_information/daily/{ticker}_daily.csv")
     daily_events = find_daily_touches(ticker)
-    weekly_events = find_weekly_touches(ticker)
 
     touch_dates = daily_events.index.to_list()
     labeled = label_reversals(df_full, touch_dates, lookahead=[1, 2])
@@ -39,45 +59,34 @@ def process_ticker(ticker: str):
         labeled[['Close_t', 'Reversal', 'First_Reversal_Day', 'First_Reversal_Date']]
     )
 
-    trades = backtest_reversals(events, df_full, hold_days=1)
-    trades["entry_date"] = trades.index
-    print(
-        f"  • Trades: {len(trades)}, Win%: {trades['return_pct'].gt(0).mean():.1%}, "
-        f"AvgRet: {trades['return_pct'].mean():.1%}, "
-        f"CumulRet: {(1 + trades['return_pct']).prod() - 1:.1%}"
-    )
+    all_holds = backtest_holds(events, df_full, hold_days=HOLD_DAYS)
+    for row in hold_summary(all_holds).itertuples():
+        print(
+            f"  • Hold {row.hold_days}d — Trades: {row.trades}, Win%: {row.win_rate:.1%}, "
+            f"AvgRet: {row.avg_return:.1%}, CumulRet: {row.cumul_return:.1%}"
+        )
+
+    trades = all_holds[all_holds["hold_days"] == HOLD_DAYS[0]]
+    trades = trades[["exit_date", "entry_price", "exit_price", "return_pct", "entry_date"]]
 
     RESULTS_DIR.mkdir(exist_ok=True)
     trades_file = RESULTS_DIR / f"{ticker}_trades.csv"
     trades.to_csv(trades_file, index=False)
     print(f"  • Saved trades to {trades_file}")
 
-    X, y = build_feature_matrix(events, weekly_events)
+    X, y = load_xy(ticker)
     print(f"  • Feature matrix: {X.shape}, label dist: {y.value_counts(normalize=True).to_dict()}")
 
-    tscv = TimeSeriesSplit(n_splits=5)
-    metrics = []
     print("  • Running 5-fold CV with consensus RF settings…")
-    for i, (train_idx, test_idx) in enumerate(tscv.split(X), start=1):
-        model = train_model(X.iloc[train_idx], y.iloc[train_idx])
-        preds = model.predict(X.iloc[test_idx])
-        m = evaluate_preds(y.iloc[test_idx], preds)
+    metrics, final_model = cross_validate(X, y, n_splits=5, n_jobs=cv_jobs, warm_start=warm_start)
+    for i, m in enumerate(metrics, start=1):
         print(f"    – Fold {i}: Precision {m['precision']:.3f}, Recall {m['recall']:.3f}, F1 {m['f1']:.3f}")
-        metrics.append(m)
 
     avg = {k: sum(d[k] for d in metrics) / len(metrics) for k in metrics[0]}
     print(
         f"  • CV average — Precision {avg['precision']:.3f}, Recall {avg['recall']:.3f}, F1 {avg['f1']:.3f}"
     )
 
-    final_model = train_model(X, y)
-    MODELS_DIR.mkdir(exist_ok=True)
-    model_path = MODELS_DIR / "trend_reversal_rf.pkl"
-
-    import joblib
-    joblib.dump(final_model, model_path)
-    print(f"  • Saved model to {model_path}")
-
     import matplotlib.pyplot as plt
     imps = show_feature_importances(final_model, X.columns.tolist()).head(7).sort_values()
     fig, ax = plt.subplots()
@@ -90,10 +99,61 @@ def process_ticker(ticker: str):
     plt.close(fig)
     print(f"  • Saved feature importances plot to {plot_file}")
 
+    returns = trades["return_pct"]
+    return {
+        "ticker":       ticker,
+        "trades":       len(trades),
+        "win_rate":     returns.gt(0).mean(),
+        "avg_return":   returns.mean(),
+        "cumul_return": (1 + returns).prod() - 1,
+        "samples":      len(X),
+        "cv_precision": avg["precision"],
+        "cv_recall":    avg["recall"],
+        "cv_f1":        avg["f1"],
+    }
+
+def _init_worker(threads: int):
+    limit_threads(threads)
+    import matplotlib
+    matplotlib.use("Agg")
+
+def _process_logged(ticker: str, **kwargs):
+    # Buffer a worker's output so the parent can print it in ticker order
+    buf = io.StringIO()
+    with redirect_stdout(buf):
+        row = process_ticker(ticker, **kwargs)
+    return row, buf.getvalue()
+
+def run_tickers(tickers, workers: int = 1, **kwargs) -> pd.DataFrame:
+    """
+    Run process_ticker for every ticker, in a pool of `workers` processes if
+    more than one, and merge the per-ticker rows in ticker order into
+    results/ticker_summary.csv. Keyword arguments go to process_ticker.
+    """
+    if workers <= 1:
+        rows = [process_ticker(tk, **kwargs) for tk in tickers]
+    else:
+        threads = max(1, (os.cpu_count() or 1) // workers)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(threads,)) as pool:
+            rows = []
+            for row, log in pool.map(partial(_process_logged, **kwargs), tickers):
+                print(log, end="")
+                rows.append(row)
+
+    summary = pd.DataFrame(rows)
+    RESULTS_DIR.mkdir(exist_ok=True)
+    summary.to_csv(RESULTS_DIR / "ticker_summary.csv", index=False)
+    print(f"Saved per-ticker summary to {RESULTS_DIR / 'ticker_summary.csv'}")
+    return summary
+
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--generate-report", action="store_true", help="Generate visual backtest summary and notebook")
+    parser.add_argument("--workers", type=int, default=1, help="Processes for step 3 (0 = one per core)")
+    parser.add_argument("--cv-jobs", type=int, default=1, help="Parallel CV folds per ticker (-1 = all cores)")
+    parser.add_argument("--warm-start", action="store_true", help="Reuse forest trees across expanding CV folds")
     args = parser.parse_args()
+    workers = args.workers or os.cpu_count() or 1
 
     print("=== Step 1/5: Downloading historical data ===")
     dl1 = SCRIPT_ROOT / "src" / "download_all_yahoo.py"
@@ -120,8 +180,11 @@ def main():
         raise FileNotFoundError(f"Tickers file not found at {tickers_path}")
     tickers = [t.strip().upper() for t in tickers_path.read_text().splitlines() if t.strip() and not t.startswith("#")]
     print(f"Loaded {len(tickers)} tickers.")
-    for tk in tickers:
-        process_ticker(tk)
+    run_tickers(tickers, workers, cv_jobs=args.cv_jobs, warm_start=args.warm_start)
+    if workers <= 1:
+        cache = load_csv_cache_info()
+        print(f"load_csv cache: {cache['hits']} hits, {cache['misses']} misses")
+    save_model(tickers, MODELS_DIR / "trend_reversal_rf.pkl")
 
     print("=== Step 4/5: Aggregating backtests ===")
     agg = SCRIPT_ROOT / "src" / "aggregate.py"
@@ -145,8 +208,6 @@ def main():
     ], check=True)
 
     print("=== Final Step: Consolidating ML trades ===")
-    import pandas as pd
-
     trade_files = list(RESULTS_DIR.glob("*_trades.csv"))
     all_trades = []
     for file in trade_files:
@@ -0,0 +1,62 @@
+# scripts/bench_cv.py
+#
+# Time main.process_ticker's 5-fold TimeSeriesSplit cross-validation plus the
+# final fit three ways: the previous serial loop, src.model.cross_validate
+# with parallel folds, and cross_validate with warm-started forests. Prints
+# the average fold metrics of each so they can be compared.
+#
+# Run from the project root:
+#   python scripts/bench_cv.py [--jobs N] [--tickers N]
+
+import sys
+import time
+import argparse
+import warnings
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import numpy as np
+from sklearn.model_selection import TimeSeriesSplit
+
+from src.backtest import evaluate_preds
+from src.feature_store import load_xy
+from src.model import cross_validate, train_model
+
+
+def legacy_cv(X, y, n_splits=5):
+    # The fold loop process_ticker ran before cross_validate
+    metrics = []
+    for train_idx, test_idx in TimeSeriesSplit(n_splits=n_splits).split(X):
+        model = train_model(X.iloc[train_idx], y.iloc[train_idx])
+        metrics.append(evaluate_preds(y.iloc[test_idx], model.predict(X.iloc[test_idx])))
+    return metrics, train_model(X, y)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--jobs", type=int, default=-1, help="Parallel jobs for cross_validate")
+    parser.add_argument("--tickers", type=int, default=20, help="Tickers from src/tickers.txt to use")
+    args = parser.parse_args()
+    warnings.simplefilter("ignore")
+
+    tickers = [t.strip().upper() for t in Path("src/tickers.txt").read_text().splitlines() if t.strip()]
+    data = [load_xy(t) for t in tickers[:args.tickers]]
+    data = [(X, y) for X, y in data if len(X) >= 20]
+    print(f"{len(data)} tickers, {sum(len(X) for X, _ in data)} samples")
+
+    runs = [
+        ('serial loop', lambda X, y: legacy_cv(X, y)),
+        ('parallel folds', lambda X, y: cross_validate(X, y, n_jobs=args.jobs)),
+        ('warm start', lambda X, y: cross_validate(X, y, n_jobs=args.jobs, warm_start=True)),
+    ]
+    for name, fn in runs:
+        start = time.perf_counter()
+        folds = [fn(X, y)[0] for X, y in data]
+        elapsed = time.perf_counter() - start
+        avg = {k: np.mean([m[k] for metrics in folds for m in metrics]) for k in ('precision', 'recall', 'f1')}
+        print(f"{name:>15}: {elapsed:.2f}s  precision {avg['precision']:.3f}  "
+              f"recall {avg['recall']:.3f}  f1 {avg['f1']:.3f}")
+
+
+if __name__ == "__main__":
+    main()
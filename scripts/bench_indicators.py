@@ -0,0 +1,93 @@
+# scripts/bench_indicators.py
+#
+# Benchmark the fused indicator kernels (src.indicators.add_indicators) against
+# the previous copy-per-call pandas_ta chain used by the rule-based backtests,
+# over every ticker in src/tickers.txt, and report the largest deviation.
+#
+# Run from the project root:
+#   python scripts/bench_indicators.py [--repeat N]
+#
+# The kernels follow pandas_ta 0.3.14b, which generated the stored CSVs. Newer
+# pandas_ta releases changed RSI/ATR smoothing, so those two columns only agree
+# to rounding when 0.3.14b is installed.
+
+import sys
+import time
+import argparse
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import numpy as np
+import pandas as pd
+import pandas_ta as ta
+
+from src.utils import load_csv
+from src.indicators import add_indicators
+
+COLUMNS = ['KC_lower', 'KC_middle', 'KC_upper', 'RSI_14', 'MACD', 'MACD_Signal', 'MACD_Hist', 'EFI', 'ATR']
+
+
+def legacy_chain(df: pd.DataFrame) -> pd.DataFrame:
+    # compute_keltner → compute_rsi → compute_macd → compute_efi → compute_atr, as before
+    df = df.copy()
+    df['EMA20'] = df['Close'].ewm(span=20, adjust=False).mean()
+    df['ATR20'] = (df['High'] - df['Low']).rolling(window=20).mean()
+    df['KC_lower'] = df['EMA20'] - 3.0 * df['ATR20']
+    df['KC_middle'] = df['EMA20']
+    df['KC_upper'] = df['EMA20'] + 3.0 * df['ATR20']
+    df = df.copy()
+    df['RSI_14'] = ta.rsi(df['Close'], length=14)
+    df = df.copy()
+    macd = ta.macd(df['Close'])
+    df['MACD'] = macd['MACD_12_26_9']
+    df['MACD_Signal'] = macd['MACDs_12_26_9']
+    df['MACD_Hist'] = macd['MACDh_12_26_9']
+    df = df.copy()
+    df['EFI'] = ta.efi(close=df['Close'], volume=df['Volume'], length=2)
+    df = df.copy()
+    df['ATR'] = ta.atr(high=df['High'], low=df['Low'], close=df['Close'], length=14)
+    return df
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=3, help="Timed passes over the universe")
+    args = parser.parse_args()
+
+    tickers = [t.strip().upper() for t in Path("src/tickers.txt").read_text().splitlines() if t.strip()]
+    frames = {}
+    for t in tickers:
+        path = Path(f"stock_historical_information/daily/{t}_daily.csv")
+        if path.exists():
+            frames[t] = load_csv(str(path))
+    bars = sum(len(df) for df in frames.values())
+    print(f"{len(frames)} tickers, {bars} daily bars")
+
+    timings = {}
+    for name, fn in [('legacy', legacy_chain), ('fused', add_indicators)]:
+        best = float('inf')
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            for df in frames.values():
+                fn(df)
+            best = min(best, time.perf_counter() - start)
+        timings[name] = best
+        print(f"{name:>7}: {best:.3f}s ({1e6 * best / bars:.2f} µs/bar)")
+    print(f"speedup: {timings['legacy'] / timings['fused']:.1f}x")
+
+    # Numerical agreement with the pandas_ta chain
+    worst = {c: 0.0 for c in COLUMNS}
+    for df in frames.values():
+        a, b = add_indicators(df), legacy_chain(df)
+        for c in COLUMNS:
+            x, y = a[c].to_numpy(), b[c].to_numpy()
+            both = ~np.isnan(x) & ~np.isnan(y)
+            if both.any():
+                worst[c] = max(worst[c], float(np.max(np.abs(x[both] - y[both]) / np.maximum(np.abs(y[both]), 1e-12))))
+    print("max relative deviation vs pandas_ta:")
+    for c, v in worst.items():
+        print(f"  {c:<12} {v:.2e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+# scripts/bench_labeling.py
+#
+# Benchmark the vectorized reversal labels (src.labeling) against the previous
+# per-event loop over every ticker's daily touches, and check that both give
+# the same labels.
+#
+# Run from the project root:
+#   python scripts/bench_labeling.py [--repeat N]
+
+import sys
+import time
+import argparse
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import pandas as pd
+
+from src.utils import load_csv
+from src.detection import _find_touches
+from src.labeling import label_reversals, label_matrix
+
+HORIZONS = [1, 2, 3, 4, 5]
+
+
+def legacy_label_reversals(df_full, touch_dates, lookahead=[1, 2]):
+    # The per-event loop label_reversals used before vectorization
+    records = []
+    for dt in touch_dates:
+        close_t = df_full.at[dt, 'Close']
+        loc = df_full.index.get_loc(dt)
+        future_index = df_full.index[loc+1: loc+1+max(lookahead)]
+        bounced = df_full.loc[future_index, 'Close'].gt(close_t)
+        if bounced.any():
+            first_date = bounced.idxmax()
+            records.append({'Date': dt, 'Close_t': close_t, 'Reversal': True,
+                            'First_Reversal_Day': df_full.index.get_loc(first_date) - loc,
+                            'First_Reversal_Date': first_date})
+        else:
+            records.append({'Date': dt, 'Close_t': close_t, 'Reversal': False,
+                            'First_Reversal_Day': None, 'First_Reversal_Date': None})
+    return pd.DataFrame(records).set_index('Date')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=3, help="Timed passes over the universe")
+    args = parser.parse_args()
+
+    tickers = [t.strip().upper() for t in Path("src/tickers.txt").read_text().splitlines() if t.strip()]
+    cases = []
+    for t in tickers:
+        path = Path(f"stock_historical_information/daily/{t}_daily.csv")
+        if path.exists():
+            df = load_csv(str(path))
+            touches = _find_touches(df).index.to_list()
+            if touches:
+                cases.append((t, df, touches))
+    events = sum(len(c[2]) for c in cases)
+    print(f"{len(cases)} tickers, {events} touch events")
+
+    runs = [
+        ('legacy, each horizon', lambda df, d: [legacy_label_reversals(df, d, [h]) for h in HORIZONS]),
+        ('vectorized, each horizon', lambda df, d: [label_reversals(df, d, [h]) for h in HORIZONS]),
+        ('label_matrix', lambda df, d: label_matrix(df, d, HORIZONS)),
+    ]
+    for name, fn in runs:
+        best = float('inf')
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            for _, df, touches in cases:
+                fn(df, touches)
+            best = min(best, time.perf_counter() - start)
+        print(f"{name:>26}: {best:.3f}s")
+
+    mismatches = 0
+    for t, df, touches in cases:
+        matrix = label_matrix(df, touches, HORIZONS)
+        for h in HORIZONS:
+            old, new = legacy_label_reversals(df, touches, [h]), label_reversals(df, touches, [h])
+            same = (old['Reversal'].equals(new['Reversal'])
+                    and old['Close_t'].equals(new['Close_t'])
+                    and old['First_Reversal_Day'].astype(float).equals(new['First_Reversal_Day'].astype(float))
+                    and pd.to_datetime(old['First_Reversal_Date']).equals(new['First_Reversal_Date'])
+                    and (matrix[f'Reversal_{h}'] == old['Reversal']).all())
+            if not same:
+                mismatches += 1
+                print(f"Mismatch: {t} horizon {h}")
+    print(f"Label mismatches: {mismatches}")
+
+
+if __name__ == "__main__":
+    main()
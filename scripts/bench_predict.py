@@ -0,0 +1,111 @@
+# scripts/bench_predict.py
+#
+# Latency of the latest-bar signal path in src.predict as history grows.
+#
+# For every history length, each ticker's daily and weekly bars are cut to the
+# first N daily bars and the last bar is scored two ways:
+#   - full:   feature_store.build_rows over the whole prefix (detection,
+#             labels and weekly alignment of every touch), then the last row
+#   - latest: predict.touched_on + predict.weekly_touch, which only read the
+#             as-of bar and search back to the latest weekly touch
+# Both must give the same features wherever the last bar is a touch.
+#
+# Run from the project root:
+#   python scripts/bench_predict.py [--tickers N] [--repeat N] [--multiplier 3.0]
+#
+# A --multiplier other than the stored bands' (3.0) times the recomputing path.
+
+import sys
+import io
+import time
+import argparse
+import contextlib
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import numpy as np
+import pandas as pd
+
+from src.feature_store import DAILY_DIR, WEEKLY_DIR, build_rows, feature_spec
+from src.features import FEATURE_COLUMNS, align_features
+from src.predict import touched_on, weekly_touch
+from src.utils import load_csv
+
+LENGTHS = [250, 500, 1000, 2000, 4000, 8000]
+
+
+def latest_features(daily, weekly, spec):
+    # Features of the last daily bar if it is a touch, else None
+    date = touched_on(daily, spec=spec)
+    if date is None:
+        return None
+    features, keep = align_features(pd.DataFrame(index=pd.DatetimeIndex([date])),
+                                    weekly_touch(weekly, date, spec))
+    return features.iloc[0] if keep[0] else None
+
+
+def full_features(daily, weekly, spec):
+    # Silence the "Recomputing Keltner" notes of non-stored multipliers
+    with contextlib.redirect_stdout(io.StringIO()):
+        table = build_rows(daily, weekly, spec)
+    if table.empty or table.index[-1] != daily.index[-1]:
+        return None
+    return table[list(FEATURE_COLUMNS)].iloc[-1]
+
+
+def best_of(fn, cases, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for daily, weekly in cases:
+            fn(daily, weekly)
+        best = min(best, time.perf_counter() - start)
+    return best / len(cases)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tickers", type=int, default=20, help="Tickers with the longest histories to use")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed passes per length")
+    parser.add_argument("--multiplier", type=float, default=3.0, help="Keltner multiplier of the touches")
+    args = parser.parse_args()
+    spec = {**feature_spec(), 'multiplier': args.multiplier}
+
+    tickers = [t.strip().upper() for t in Path("src/tickers.txt").read_text().splitlines()
+               if t.strip() and not t.startswith("#")]
+    frames = []
+    for t in tickers:
+        try:
+            frames.append((load_csv(f"{DAILY_DIR}/{t}_daily.csv"), load_csv(f"{WEEKLY_DIR}/{t}_weekly.csv")))
+        except (OSError, KeyError, ValueError):
+            continue
+    frames = sorted(frames, key=lambda f: -len(f[0]))[:args.tickers]
+    longest = len(frames[0][0])
+    print(f"{len(frames)} tickers, up to {longest} daily bars")
+
+    print(f"{'daily bars':>10} {'full ms':>9} {'latest ms':>10}")
+    for n in [n for n in LENGTHS if n < longest] + [longest]:
+        cases = []
+        for daily, weekly in frames:
+            d = daily.iloc[:n]
+            cases.append((d, weekly.iloc[:weekly.index.searchsorted(d.index[-1], side='right')]))
+        full = best_of(lambda d, w: full_features(d, w, spec), cases, args.repeat)
+        latest = best_of(lambda d, w: latest_features(d, w, spec), cases, args.repeat)
+        print(f"{n:>10} {1e3 * full:>9.2f} {1e3 * latest:>10.2f}")
+
+    # Every touch of the last 250 days of each ticker, scored both ways
+    checked = mismatches = 0
+    for daily, weekly in frames:
+        with contextlib.redirect_stdout(io.StringIO()):
+            table = build_rows(daily, weekly, spec, since=daily.index[-250])
+        for date in table.index:
+            n = daily.index.get_loc(date) + 1
+            got = latest_features(daily.iloc[:n], weekly, spec)
+            checked += 1
+            if got is None or not np.allclose(got.to_numpy(float), table.loc[date, list(FEATURE_COLUMNS)].to_numpy(float)):
+                mismatches += 1
+    print(f"Feature mismatches: {mismatches} of {checked} touches")
+
+
+if __name__ == "__main__":
+    main()
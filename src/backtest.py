@@ -1,5 +1,6 @@
 # src/backtest.py
 
+import numpy as np
 import pandas as pd
 from sklearn.metrics import precision_score, recall_score, f1_score
 
@@ -27,6 +28,90 @@ def evaluate_preds(y_true, y_pred):
     }
 
 
+TRADE_COLUMNS = ['entry_date', 'exit_date', 'entry_price', 'exit_price', 'return_pct']
+
+
+def backtest_holds(
+    df_events: pd.DataFrame,
+    df_full:   pd.DataFrame,
+    hold_days=(1,)
+) -> pd.DataFrame:
+    """
+    Simulate the reversal trades for several holding periods in one pass.
+
+    Every event date is mapped to its bar position once; entry and exit
+    prices for all holding periods are then gathered with array indexing.
+
+    Parameters
+    ----------
+    df_events : pd.DataFrame
+        Touch-event rows indexed by Date, must contain 'Reversal' boolean.
+    df_full : pd.DataFrame
+        Full OHLCV series indexed by Date (must have 'Open','Close').
+    hold_days : int or sequence of int
+        Holding periods to simulate (1 = same-day exit).
+
+    Returns
+    -------
+    pd.DataFrame
+        Long-format table, one row per (holding period, executed trade),
+        ordered by holding period then event: hold_days, event_date,
+        entry_date, exit_date, entry_price, exit_price, return_pct.
+        Events missing from df_full, or whose entry or exit bar lies past
+        its end, are skipped.
+    """
+    holds = np.atleast_1d(np.asarray(hold_days, dtype=np.int64))
+    index = df_full.index
+    n = len(index)
+
+    if 'Reversal' in df_events.columns:
+        dates = df_events.index[df_events['Reversal'].to_numpy(dtype=bool)]
+    else:
+        dates = df_events.index[:0]
+    pos = index.searchsorted(dates)
+    found = pos < n
+    found[found] = index[pos[found]] == dates[found]
+    pos = pos[found]
+
+    # (holding period, event) grid of exit positions
+    exit_pos = pos[None, :] + holds[:, None]
+    valid = (pos[None, :] + 1 < n) & (exit_pos >= 0) & (exit_pos < n)
+    h, e = np.nonzero(valid)
+
+    open_ = df_full['Open'].to_numpy()
+    close = df_full['Close'].to_numpy()
+    entry_p = open_[pos[e] + 1]
+    exit_p = close[exit_pos[h, e]]
+    return pd.DataFrame({
+        'hold_days':   holds[h],
+        'event_date':  index[pos[e]],
+        'entry_date':  index[pos[e] + 1],
+        'exit_date':   index[exit_pos[h, e]],
+        'entry_price': entry_p,
+        'exit_price':  exit_p,
+        'return_pct':  exit_p / entry_p - 1,
+    })
+
+
+def hold_summary(trades: pd.DataFrame) -> pd.DataFrame:
+    """
+    Compare holding periods of a `backtest_holds` table.
+
+    Returns
+    -------
+    pd.DataFrame
+        One row per hold_days: trades, win_rate, avg_return and
+        cumul_return (compounded over the trades in order), as fractions.
+    """
+    grouped = trades.groupby('hold_days')['return_pct']
+    return pd.DataFrame({
+        'trades':       grouped.size(),
+        'win_rate':     grouped.apply(lambda r: r.gt(0).mean()),
+        'avg_return':   grouped.mean(),
+        'cumul_return': grouped.apply(lambda r: (1 + r).prod() - 1),
+    }).reset_index()
+
+
 def backtest_reversals(
     df_events: pd.DataFrame,
     df_full:   pd.DataFrame,
@@ -42,38 +127,18 @@ def backtest_reversals(
     df_full : pd.DataFrame
         Full OHLCV series indexed by Date (must have 'Open','Close').
     hold_days : int
-        Number of days to hold (1 = same-day exit).
+        Number of days to hold (1 = same-day exit). Use `backtest_holds` to
+        compare several holding periods at once.
 
     Returns
     -------
     pd.DataFrame
-        One row per executed trade, columns: entry_date, exit_date,
-        entry_price, exit_price, return_pct.
+        One row per executed trade, indexed by entry_date, columns:
+        exit_date, entry_price, exit_price, return_pct.
     """
-    trades = []
-    for dt, ev in df_events.iterrows():
-        if not ev.get('Reversal', False):
-            continue
-        try:
-            idx      = df_full.index.get_loc(dt)
-            entry_dt = df_full.index[idx + 1]
-            exit_dt  = df_full.index[idx + hold_days]
-        except (KeyError, IndexError):
-            continue
-        entry_p = df_full.at[entry_dt, 'Open']
-        exit_p  = df_full.at[exit_dt,  'Close']
-        ret     = (exit_p / entry_p) - 1
-        trades.append({
-            'entry_date':  entry_dt,
-            'exit_date':   exit_dt,
-            'entry_price': entry_p,
-            'exit_price':  exit_p,
-            'return_pct':  ret
-        })
+    trades = backtest_holds(df_events, df_full, [hold_days])
     # Return empty indexed DataFrame if no trades
-    if trades:
-        return pd.DataFrame(trades).set_index('entry_date')
+    if len(trades):
+        return trades[TRADE_COLUMNS].set_index('entry_date')
     else:
-        return pd.DataFrame(columns=[
-            'entry_date','exit_date','entry_price','exit_price','return_pct'
-        ])
+        return pd.DataFrame(columns=TRADE_COLUMNS)
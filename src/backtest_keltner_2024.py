@@ -9,7 +9,9 @@ parent_dir = os.path.abspath(os.path.join(current_dir, os.pardir))
 sys.path.insert(0, parent_dir)
 
 # ── Now safely import from src/ ───────────────────────────────────────────────
-from src.utils import load_csv, compute_keltner, compute_rsi, compute_macd, compute_efi, compute_atr
+from src.utils import load_csv
+from src.strategy import filter_columns, period_bounds, prepare_frame
+from src.exits import down_close, next_true
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
@@ -17,99 +19,88 @@ import matplotlib.pyplot as plt
 
 
 YEAR = 2024
+YEARS = None  # Years summarized by run_all_backtests; None = every year with data
 TICKERS_FILE = "src/tickers.txt"
 DAILY_DIR = "stock_historical_information/daily"
 RESULTS_DIR = "results"
 ATR_THRESHOLD = 1.0  # Define your ATR threshold here
-
-def backtest_keltner_2024(ticker: str) -> pd.DataFrame:
+WARMUP_NOTE = ("indicators are warmed up on each ticker's full history before the period, "
+               "not recomputed from the period's first bar as in per-year backtests before")
+
+def backtest_keltner_periods(ticker: str, periods=None, sweep=None, param: int = 0) -> pd.DataFrame:
+    # Indicators are computed once over the ticker's full history and every
+    # period (a year or an inclusive (start, end) date pair; default: every
+    # year) is a view of it. Trades enter and exit inside the period, with a
+    # leading 'period' column, but their indicators are warmed up on all the
+    # history before it. This deliberately differs from the former per-year
+    # backtest, which computed indicators on the year's bars alone: its first
+    # ~26 bars had NaN indicators (no trades) and its EMAs started from a
+    # fresh seed, so early-year trades and summaries are not the same.
+    # sweep/param: optional src.indicators.BandSweep (built on the ticker's full
+    # daily history) and the column of it to trade instead of the default bands
     # Load daily CSV
     file_path = os.path.join(DAILY_DIR, f"{ticker}_daily.csv")
     df = load_csv(file_path)
 
     print(f"{ticker}: {len(df)} rows loaded, index dtype = {df.index.dtype}")
 
-    # Filter for the target year
-    df = df[df.index.year == YEAR].copy()
+    # Compute technical indicators and touches of KC_lower
+    df = prepare_frame(df, sweep, param)
     if df.empty:
-        print(f"[{ticker}] No data found for {YEAR}.")
         return pd.DataFrame()
+    close = df['Close'].to_numpy(dtype=float)
 
-    # Compute technical indicators
-    df = compute_keltner(df)
-    df = compute_rsi(df)
-    df = compute_macd(df)
-    df = compute_efi(df)
-    df = compute_atr(df)
-
-    # Identify touches to KC_lower
-    df['Touch'] = (
-        (df['Open'] <= df['KC_lower']) |
-        (df['High'] <= df['KC_lower']) |
-        (df['Low']  <= df['KC_lower']) |
-        (df['Close']<= df['KC_lower'])
-    )
+    # Entry rules: bullish confirmation candle, ATR above threshold and at
+    # least one momentum indicator (RSI < 30, rising MACD histogram or EFI)
+    rules = filter_columns(df, ATR_THRESHOLD)
+    momentum = rules[['USE_RSI_FILTER', 'USE_MACD_HIST_FILTER', 'USE_FORCE_INDEX_FILTER']].any(axis=1)
+    signal = (df['Touch'] & rules['USE_CONFIRMATION_CANDLE'] & rules['USE_ATR_FILTER'] & momentum).to_numpy()
+    entries = np.flatnonzero(signal)
+
+    # Trailing exit: first down close or close above KC_middle, else the
+    # period's last bar
+    nxt = next_true(down_close(close) | (close > df['KC_middle'].to_numpy(dtype=float)))
 
     # Simulate trades
     trades = []
-    for i in range(len(df) - 1):
-        if df.iloc[i]['Touch']:
-            # Confirmation candle
-            if df.iloc[i + 1]['Close'] <= df.iloc[i + 1]['Open']:
-                continue  # Skip if next candle is not bullish
-
-            # Momentum indicators
-            rsi = df.iloc[i]['RSI_14']
-            macd_hist_current = df.iloc[i]['MACD_Hist']
-            macd_hist_prev = df.iloc[i - 1]['MACD_Hist'] if i > 0 else np.nan
-            efi_current = df.iloc[i]['EFI']
-            efi_prev = df.iloc[i - 1]['EFI'] if i > 0 else np.nan
-
-            momentum_conditions = [
-                rsi < 30,
-                macd_hist_current > macd_hist_prev if not np.isnan(macd_hist_prev) else False,
-                efi_current > efi_prev if not np.isnan(efi_prev) else False
-            ]
-
-            if not any(momentum_conditions):
-                continue  # Skip if none of the momentum indicators agree
-
-            # Volatility filter
-            if df.iloc[i]['ATR'] < ATR_THRESHOLD:
-                continue  # Skip if ATR is below threshold
-
-            # Entry
-            entry_date = df.index[i]
-            buy_price = df.iloc[i]['Close']
-
-            # Trailing exit
-            exit_price = None
-            exit_date = None
-            for j in range(i + 1, len(df)):
-                if df.iloc[j]['Close'] < df.iloc[j - 1]['Close']:
-                    exit_price = df.iloc[j]['Close']
-                    exit_date = df.index[j]
-                    break
-                if df.iloc[j]['Close'] > df.iloc[j]['KC_middle']:
-                    exit_price = df.iloc[j]['Close']
-                    exit_date = df.index[j]
-                    break
-            if exit_price is None:
-                exit_price = df.iloc[-1]['Close']
-                exit_date = df.index[-1]
-
-            ret = (exit_price - buy_price) / buy_price
-            trades.append({
-                "ticker": ticker,
-                "entry_date": entry_date,
-                "exit_date": exit_date,
-                "buy_price": round(buy_price, 2),
-                "sell_price": round(exit_price, 2),
-                "return_pct": round(ret * 100, 2),
-                "success": ret > 0
-            })
-
-    return pd.DataFrame(trades)
+    for label, start, stop in period_bounds(df.index, periods):
+        i = entries[(entries >= start) & (entries < stop - 1)]
+        j = np.minimum(nxt[i + 1], stop - 1)
+        buy_price, exit_price = close[i], close[j]
+        ret = (exit_price - buy_price) / buy_price
+        trades.append(pd.DataFrame({
+            "period": label,
+            "ticker": ticker,
+            "entry_date": df.index[i],
+            "exit_date": df.index[j],
+            "buy_price": np.round(buy_price, 2),
+            "sell_price": np.round(exit_price, 2),
+            "return_pct": np.round(ret * 100, 2),
+            "success": ret > 0
+        }))
+
+    trades = [t for t in trades if not t.empty]
+    return pd.concat(trades, ignore_index=True) if trades else pd.DataFrame()
+
+def backtest_keltner_2024(ticker: str, sweep=None, param: int = 0) -> pd.DataFrame:
+    trades = backtest_keltner_periods(ticker, [YEAR], sweep, param)
+    if trades.empty:
+        print(f"[{ticker}] No trades found for {YEAR}.")
+        return trades
+    return trades.drop(columns="period")
+
+def summarize(df_all: pd.DataFrame) -> pd.DataFrame:
+    # Per-ticker trade count, win rate and returns
+    return (
+        df_all.groupby("ticker")
+        .agg(
+            trades=("success", "count"),
+            win_rate_pct=("success", lambda x: round(100 * x.sum() / len(x), 2)),
+            avg_return_pct=("return_pct", "mean"),
+            total_return_pct=("return_pct", "sum")
+        )
+        .reset_index()
+    )
 
 def run_all_backtests():
     print(f"Reading tickers from: {os.path.abspath(TICKERS_FILE)}")
@@ -129,50 +120,49 @@ def run_all_backtests():
     os.makedirs(RESULTS_DIR, exist_ok=True)
     all_trades = []
 
+    # One pass per ticker covers every period
     for ticker in tickers:
         print(f"Backtesting {ticker}...")
         try:
-            trades = backtest_keltner_2024(ticker)
+            trades = backtest_keltner_periods(ticker, YEARS)
             if not trades.empty:
                 all_trades.append(trades)
-                trades.to_csv(os.path.join(RESULTS_DIR, f"{ticker}_trades.csv"), index=False)
+                year_trades = trades[trades["period"] == YEAR]
+                if not year_trades.empty:
+                    year_trades.drop(columns="period").to_csv(
+                        os.path.join(RESULTS_DIR, f"{ticker}_trades.csv"), index=False)
         except Exception as e:
             print(f"Error processing {ticker}: {e}")
 
-    # Summary
-    if all_trades:
-        df_all = pd.concat(all_trades)
-        summary = (
-            df_all.groupby("ticker")
-            .agg(
-                trades=("success", "count"),
-                win_rate_pct=("success", lambda x: round(100 * x.sum() / len(x), 2)),
-                avg_return_pct=("return_pct", "mean"),
-                total_return_pct=("return_pct", "sum")
-            )
-            .reset_index()
-        )
-        summary.to_csv(os.path.join(RESULTS_DIR, f"summary_backtest_{YEAR}.csv"), index=False)
-        print("\n== Backtest Summary ==")
+    if not all_trades:
+        return
+
+    # Summary per period
+    df_all = pd.concat(all_trades)
+    print(f"\nNote: {WARMUP_NOTE}")
+    for period, df_period in df_all.groupby("period", sort=True):
+        summary = summarize(df_period)
+        summary.to_csv(os.path.join(RESULTS_DIR, f"summary_backtest_{period}.csv"), index=False)
+        print(f"\n== Backtest Summary {period} ==")
         print(summary)
 
         # Plotting
         plt.figure(figsize=(10, 6))
         plt.scatter(summary['trades'], summary['win_rate_pct'])
-        plt.title('Win Rate vs Number of Trades')
+        plt.title(f'Win Rate vs Number of Trades ({period})')
         plt.xlabel('Number of Trades')
         plt.ylabel('Win Rate (%)')
         plt.grid(True)
-        plt.savefig(os.path.join(RESULTS_DIR, f"winrate_vs_trades_{YEAR}.png"))
+        plt.savefig(os.path.join(RESULTS_DIR, f"winrate_vs_trades_{period}.png"))
         plt.close()
 
         plt.figure(figsize=(10, 6))
         plt.scatter(summary['avg_return_pct'], summary['total_return_pct'])
-        plt.title('Average Return vs Total Return')
+        plt.title(f'Average Return vs Total Return ({period})')
         plt.xlabel('Average Return (%)')
         plt.ylabel('Total Return (%)')
         plt.grid(True)
-        plt.savefig(os.path.join(RESULTS_DIR, f"avg_vs_total_return_{YEAR}.png"))
+        plt.savefig(os.path.join(RESULTS_DIR, f"avg_vs_total_return_{period}.png"))
         plt.close()
 
 if __name__ == "__main__":
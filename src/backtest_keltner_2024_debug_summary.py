@@ -9,7 +9,7 @@ from nbformat import v4 as nbf
 import nbformat
 from src.utils import load_csv, compute_keltner
 from src.labeling import label_reversals
-from src.backtest import backtest_reversals
+from src.backtest import backtest_holds, hold_summary
 
 # Config
 YEAR = 2024
@@ -19,6 +19,8 @@ DAILY_DIR = "stock_historical_information/daily"
 TICKERS_FILE = "src/tickers.txt"
 SUMMARY_FILE = f"{RESULTS_DIR}/summary_backtest_{YEAR}.csv"
 NOTEBOOK_FILE = f"{NOTEBOOKS_DIR}/backtest_summary_{YEAR}.ipynb"
+HOLD_DAYS = [1, 2, 3, 5, 10]  # Holding periods compared; the report trades the first
+HOLDS_FILE = f"{RESULTS_DIR}/hold_comparison_{YEAR}.csv"
 
 os.makedirs(RESULTS_DIR, exist_ok=True)
 os.makedirs(NOTEBOOKS_DIR, exist_ok=True)
@@ -27,7 +29,7 @@ def generate_report():
     with open(TICKERS_FILE, "r") as f:
         tickers = [line.strip() for line in f if line.strip()]
 
-    all_trades = []
+    all_trades, all_holds = [], []
     for ticker in tickers:
         file_path = os.path.join(DAILY_DIR, f"{ticker}_daily.csv")
         if not os.path.exists(file_path):
@@ -49,7 +51,14 @@ def generate_report():
         if df_events.empty:
             continue
 
-        df_trades = backtest_reversals(df_events, df_2024, hold_days=1)
+        df_holds = backtest_holds(df_events, df_2024, hold_days=HOLD_DAYS)
+        if df_holds.empty:
+            continue
+        df_holds['ticker'] = ticker
+        all_holds.append(df_holds)
+
+        df_trades = df_holds[df_holds['hold_days'] == HOLD_DAYS[0]].set_index('entry_date')
+        df_trades = df_trades[['exit_date', 'entry_price', 'exit_price', 'return_pct']].copy()
         if not df_trades.empty:
             df_trades['ticker'] = ticker
             all_trades.append(df_trades)
@@ -74,6 +83,11 @@ def generate_report():
     )
     summary.to_csv(SUMMARY_FILE, index=False)
 
+    holds = hold_summary(pd.concat(all_holds, ignore_index=True))
+    holds.to_csv(HOLDS_FILE, index=False)
+    print("Holding period comparison:")
+    print(holds.to_string(index=False))
+
     # Plots
     def save_plot(fig, filename):
         fig.tight_layout()
@@ -128,6 +142,13 @@ def generate_report():
     plt.xlabel('Trade Number')
     save_plot(fig, 'debug_drawdown.png')
 
+    fig, ax = plt.subplots(figsize=(10, 5))
+    ax.bar(holds['hold_days'].astype(str), 100 * holds['avg_return'])
+    ax.set_title('Average Trade Return by Holding Period')
+    ax.set_xlabel('Holding Period (days)')
+    ax.set_ylabel('Average Return (%)')
+    save_plot(fig, 'debug_return_by_hold.png')
+
     # Notebook
     def img(path):
         return f"from IPython.display import Image\nImage('../{path}')"
@@ -159,6 +180,10 @@ This report summarizes the backtest results of a strategy that buys stocks when
         nbf.new_markdown_cell("### Drawdown Curve\nTracks the largest decline from a previous peak. The flatter the curve, the less risk you took."),
         nbf.new_code_cell(img('results/debug_drawdown.png')),
 
+        nbf.new_markdown_cell("### Holding Period Comparison\nThe same entries held for different numbers of days. Shows whether exiting later adds return or only risk."),
+        nbf.new_code_cell(f"pd.read_csv('../{HOLDS_FILE}')"),
+        nbf.new_code_cell(img('results/debug_return_by_hold.png')),
+
         nbf.new_markdown_cell("### Per-Ticker Trade Detail Viewer\nYou can view trades for any ticker in the `results/` folder. Change the ticker to explore others."),
         nbf.new_code_cell(
             "ticker = 'AAPL'  # Change to another ticker if desired\ntry:\n    pd.read_csv(f'../results/{ticker}_trades.csv').head()\nexcept FileNotFoundError:\n    print(f'Trade file not found for {ticker}')"
@@ -0,0 +1,190 @@
+# src/bar_store.py
+
+"""
+Columnar, memory-mapped storage for per-ticker bar histories.
+
+Each CSV under stock_historical_information/ can be mirrored by a sibling
+directory ``{ticker}_{daily|weekly}.cols/`` holding one NumPy ``.npy`` file
+per column plus the DatetimeIndex. ``src.utils.load_csv`` opens that store
+memory-mapped whenever it is fresh, so repeated loads skip CSV text and date
+parsing entirely.
+
+Convert the existing CSVs once with:
+
+    python -m src.bar_store [stock_historical_information]
+"""
+
+import json
+import os
+import shutil
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+STORE_SUFFIX = ".cols"
+META_FILE    = "meta.json"
+INDEX_FILE   = "index.npy"
+
+
+def store_path(csv_path) -> Path:
+    """
+    Return the store directory that mirrors `csv_path`.
+    """
+    return Path(csv_path).with_suffix(STORE_SUFFIX)
+
+
+def _source_stamp(csv_path) -> dict:
+    st = os.stat(csv_path)
+    return {'source_mtime_ns': st.st_mtime_ns, 'source_size': st.st_size}
+
+
+def is_fresh(csv_path) -> bool:
+    """
+    True if a store exists for `csv_path` and was built from its current contents.
+
+    A store without its CSV counts as fresh, so the CSVs can be archived once
+    converted. A CSV rewritten after conversion makes the store stale, and
+    readers fall back to the CSV until the store is rebuilt.
+    """
+    meta_file = store_path(csv_path) / META_FILE
+    if not meta_file.exists():
+        return False
+    if not os.path.exists(csv_path):
+        return True
+    meta = json.loads(meta_file.read_text())
+    stamp = _source_stamp(csv_path)
+    return all(meta.get(k) == v for k, v in stamp.items())
+
+
+def write_frame(df: pd.DataFrame, store_dir, source=None, extra: dict = None) -> Path:
+    """
+    Write a Date-indexed numeric DataFrame as one .npy file per column.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Frame indexed by a DatetimeIndex; every column must be numeric or bool.
+    store_dir : str or Path
+        Target directory, replaced atomically if it already exists.
+    source : str or Path, optional
+        CSV the frame was parsed from; its mtime and size are recorded so
+        `is_fresh` can detect later rewrites.
+    extra : dict, optional
+        JSON-serialisable entries added to meta.json (see `read_meta`).
+
+    Returns
+    -------
+    Path
+        The store directory.
+    """
+    store_dir = Path(store_dir)
+    bad = [c for c in df.columns
+           if not (pd.api.types.is_numeric_dtype(df[c]) or pd.api.types.is_bool_dtype(df[c]))]
+    if bad:
+        raise ValueError(f"Non-numeric columns cannot be memory-mapped: {bad}")
+    if not isinstance(df.index, pd.DatetimeIndex):
+        raise ValueError("Frame must be indexed by a DatetimeIndex")
+
+    tmp_dir = store_dir.with_name(store_dir.name + ".tmp")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir(parents=True)
+
+    files = []
+    for i, col in enumerate(df.columns):
+        fname = f"c{i:03d}.npy"
+        np.save(tmp_dir / fname, np.ascontiguousarray(df[col].to_numpy()))
+        files.append(fname)
+    np.save(tmp_dir / INDEX_FILE, df.index.to_numpy(dtype='datetime64[ns]'))
+
+    meta = {
+        'columns':    [str(c) for c in df.columns],
+        'files':      files,
+        'index_name': df.index.name,
+        'rows':       len(df),
+    }
+    if source is not None:
+        meta.update(_source_stamp(source))
+    if extra:
+        meta.update(extra)
+    (tmp_dir / META_FILE).write_text(json.dumps(meta, indent=2))
+
+    shutil.rmtree(store_dir, ignore_errors=True)
+    os.replace(tmp_dir, store_dir)
+    return store_dir
+
+
+def read_meta(store_dir) -> dict:
+    """
+    Return a store's meta.json contents, or {} if there is no store.
+    """
+    meta_file = Path(store_dir) / META_FILE
+    return json.loads(meta_file.read_text()) if meta_file.exists() else {}
+
+
+def read_frame(store_dir, mmap: bool = True) -> pd.DataFrame:
+    """
+    Open a store as a DataFrame whose columns are views on the .npy files.
+
+    Parameters
+    ----------
+    store_dir : str or Path
+        Directory written by `write_frame`.
+    mmap : bool
+        If True (default), columns are copy-on-write memory maps: pages are
+        read lazily and in-place edits never reach the files.
+
+    Returns
+    -------
+    pd.DataFrame
+        Frame with the stored columns and DatetimeIndex.
+    """
+    store_dir = Path(store_dir)
+    meta = json.loads((store_dir / META_FILE).read_text())
+    mode = 'c' if mmap else None
+
+    data = {
+        col: np.load(store_dir / fname, mmap_mode=mode)
+        for col, fname in zip(meta['columns'], meta['files'])
+    }
+    index = pd.DatetimeIndex(np.load(store_dir / INDEX_FILE, mmap_mode=mode), name=meta['index_name'])
+    return pd.DataFrame(data, index=index, copy=False)
+
+
+def convert_csv(csv_path) -> Path:
+    """
+    Parse one bar CSV (raw column names, Date index) and write its store.
+    """
+    from .utils import read_bar_csv
+
+    df = read_bar_csv(csv_path)
+    return write_frame(df, store_path(csv_path), source=csv_path)
+
+
+def convert_tree(root="stock_historical_information", force: bool = False) -> int:
+    """
+    Convert every *.csv below `root` whose store is missing or stale.
+
+    Returns
+    -------
+    int
+        Number of stores written.
+    """
+    written = 0
+    for csv_path in sorted(Path(root).rglob("*.csv")):
+        if not force and is_fresh(csv_path):
+            continue
+        try:
+            convert_csv(csv_path)
+            written += 1
+        except ValueError as e:
+            print(f"Skipping {csv_path}: {e}")
+    return written
+
+
+if __name__ == "__main__":
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    root = args[0] if args else "stock_historical_information"
+    n = convert_tree(root, force="--force" in sys.argv)
+    print(f"Wrote {n} column stores under {root}")
@@ -2,9 +2,25 @@
 
 import pandas as pd
 from .utils import load_csv, compute_keltner
+from .schema import KC_BANDS, keltner_matches, stored_params, record_params
 
+# Bars of Keltner EMA warm-up, in band periods, ahead of a recomputed window;
+# the seed's weight decays to (1 - 2/(period+1))^(10*period) ≈ 2e-9
+WARMUP_PERIODS = 10
 
-def _find_touches(df: pd.DataFrame, recompute_kc: bool = False) -> pd.DataFrame:
+
+def _recompute(df: pd.DataFrame, period: int, multiplier: float, mamode: str, bands: str) -> pd.DataFrame:
+    # Bands of the requested kind, in the stored moving-average mode when the
+    # stored bands are of the same kind and no mode is requested
+    kc = stored_params(df, 'keltner') or {}
+    if mamode is None:
+        mamode = kc['mamode'] if kc.get('bands') == bands and kc.get('mamode') else 'ema'
+    return compute_keltner(df, period, multiplier, bands=bands, mamode=mamode)
+
+
+def _find_touches(df: pd.DataFrame, recompute_kc: bool = False, period: int = 20,
+                  multiplier: float = 3.0, mamode: str = None,
+                  sweep=None, param: int = 0, bands: str = KC_BANDS) -> pd.DataFrame:
     """
     Internal helper: return rows where any OHLC price <= KC_lower.
 
@@ -12,18 +28,47 @@ def _find_touches(df: pd.DataFrame, recompute_kc: bool = False) -> pd.DataFrame:
     ----------
     df : pd.DataFrame
         DataFrame indexed by Date with at least ['Open','High','Low','Close'].
-        If 'KC_lower' is absent or recompute_kc=True, bands will be recalculated.
+        Stored bands (see src.schema) are used when they were built with the
+        requested parameters; otherwise bands are recalculated and a note is printed.
     recompute_kc : bool
         If True, ignore existing KC_lower and recompute via compute_keltner().
+    period, multiplier : int, float
+        Keltner length and band multiplier the touches are defined against.
+    mamode : str, optional
+        Require stored bands built with this moving average ('ema' or 'sma');
+        by default either is accepted.
+    sweep : src.indicators.BandSweep, optional
+        Precomputed bands for many parameter pairs over `df`'s dates; when
+        given, touches and KC_* columns come from its column `param` and the
+        other Keltner arguments are ignored.
+    param : int
+        Column of `sweep` to use.
+    bands : str
+        Channel kind, 'tr' (pandas_ta's, as stored) or 'hl' (the repo's own,
+        see src.schema); stored bands of the other kind are recomputed.
 
     Returns
     -------
     pd.DataFrame
         Subset of df where any OHLC <= KC_lower.
     """
-    # Recompute bands if requested or missing
-    if recompute_kc or 'KC_lower' not in df.columns:
-        df = compute_keltner(df)
+    if sweep is not None:
+        cols = sweep.columns(param, df.index)
+        touch = cols.pop('Touch')
+        out = df.loc[touch].copy()
+        for name, values in cols.items():
+            out[name] = values[touch]
+        p, k = sweep.params[param]
+        return record_params(out, keltner={'mamode': 'ema', 'bands': 'hl', 'length': p, 'scalar': k})
+
+    # Recompute bands if requested or the stored ones don't match
+    if recompute_kc:
+        df = _recompute(df, period, multiplier, mamode, bands)
+    elif not keltner_matches(df, period, multiplier, mamode, bands):
+        kc = stored_params(df, 'keltner')
+        stored = f"{kc['mamode']}-{kc.get('bands')}({kc['length']}, {kc['scalar']})" if kc else "none"
+        print(f"Recomputing Keltner {bands}({period}, {multiplier}): stored bands are {stored}")
+        df = _recompute(df, period, multiplier, mamode, bands)
 
     # Build boolean mask across OHLC vs. lower band
     mask = (
@@ -35,7 +80,33 @@ def _find_touches(df: pd.DataFrame, recompute_kc: bool = False) -> pd.DataFrame:
     return df.loc[mask]
 
 
-def find_daily_touches(ticker: str, recompute_kc: bool = False) -> pd.DataFrame:
+def window_touches(df: pd.DataFrame, start: int, stop: int, period: int = 20,
+                   multiplier: float = 3.0, bands: str = KC_BANDS) -> pd.DataFrame:
+    """
+    Touch rows of ``df.iloc[start:stop]`` computed from trailing bars only.
+
+    Stored bands that match the parameters are read for those rows alone;
+    otherwise the bands are recomputed over the window plus
+    WARMUP_PERIODS × period bars before it, which agrees with a full-history
+    recomputation to ~1e-9 of price. The cost depends on the window size,
+    not on the length of `df`.
+
+    Returns
+    -------
+    pd.DataFrame
+        As `_find_touches`, for the rows of the window.
+    """
+    if keltner_matches(df, period, multiplier, bands=bands):
+        return _find_touches(df.iloc[start:stop], period=period, multiplier=multiplier, bands=bands)
+    lo = max(0, start - WARMUP_PERIODS * period)
+    window = _recompute(df.iloc[lo:stop], period, multiplier, None, bands)
+    touches = _find_touches(window, period=period, multiplier=multiplier, bands=bands)
+    return touches[touches.index >= df.index[start]] if start < stop else touches
+
+
+def find_daily_touches(ticker: str, recompute_kc: bool = False, period: int = 20,
+                       multiplier: float = 3.0, mamode: str = None,
+                       sweep=None, param: int = 0, bands: str = KC_BANDS) -> pd.DataFrame:
     """
     Load daily CSV for a ticker and return all lower-band touch events.
 
@@ -46,6 +117,8 @@ def find_daily_touches(ticker: str, recompute_kc: bool = False) -> pd.DataFrame:
         stock_historical_information/daily/{ticker}_daily.csv
     recompute_kc : bool
         If True, Keltner bands are recalculated instead of using existing columns.
+    period, multiplier, mamode, sweep, param, bands :
+        Keltner parameters, see `_find_touches`.
 
     Returns
     -------
@@ -54,10 +127,12 @@ def find_daily_touches(ticker: str, recompute_kc: bool = False) -> pd.DataFrame:
     """
     path = f"stock_historical_information/daily/{ticker}_daily.csv"
     df = load_csv(path)
-    return _find_touches(df, recompute_kc=recompute_kc)
+    return _find_touches(df, recompute_kc, period, multiplier, mamode, sweep, param, bands)
 
 
-def find_weekly_touches(ticker: str, recompute_kc: bool = False) -> pd.DataFrame:
+def find_weekly_touches(ticker: str, recompute_kc: bool = False, period: int = 20,
+                        multiplier: float = 3.0, mamode: str = None,
+                        sweep=None, param: int = 0, bands: str = KC_BANDS) -> pd.DataFrame:
     """
     Load weekly CSV for a ticker and return all lower-band touch events.
 
@@ -68,6 +143,8 @@ def find_weekly_touches(ticker: str, recompute_kc: bool = False) -> pd.DataFrame
         stock_historical_information/weekly/{ticker}_weekly.csv
     recompute_kc : bool
         If True, Keltner bands are recalculated instead of using existing columns.
+    period, multiplier, mamode, sweep, param, bands :
+        Keltner parameters, see `_find_touches`.
 
     Returns
     -------
@@ -76,4 +153,4 @@ def find_weekly_touches(ticker: str, recompute_kc: bool = False) -> pd.DataFrame
     """
     path = f"stock_historical_information/weekly/{ticker}_weekly.csv"
     df = load_csv(path)
-    return _find_touches(df, recompute_kc=recompute_kc)
+    return _find_touches(df, recompute_kc, period, multiplier, mamode, sweep, param, bands)
@@ -1,5 +1,6 @@
-# src/download_all.py — incremental downloader for TrendReversal with clean session, cache wipe, retry, and throttling
+# src/download_all.py — incremental downloader for TrendReversal with concurrent workers, retry, and token-bucket throttling
 import os
+import sys
 import time
 import shutil
 from pathlib import Path
@@ -7,11 +8,19 @@ from datetime import datetime, timedelta
 
 import yfinance as yf
 import pandas as pd
-import pandas_ta as ta
 import requests
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 
+# Fix import paths when run as a script
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.utils import read_csv_tail, write_new_bars
+from src.indicator_state import (
+    CHECKPOINT_BARS, compute_indicators, rebuild_indicators, refresh_tail, save_checkpoint, stored_mamode,
+)
+from src.rate_limit import TokenBucket, rate_limited, run_parallel
+
 # ── PROJECT ROOT CONFIG ──
 PROJECT_ROOT = Path(
     os.getenv("TREND_REV_ROOT", Path(__file__).resolve().parent.parent)
@@ -23,6 +32,15 @@ TICKERS_FILE = SRC_DIR / "tickers.txt"
 
 DAILY_DIR  = OUTPUT_DIR / "daily"
 WEEKLY_DIR = OUTPUT_DIR / "weekly"
+REFETCH_BARS = 3  # stored bars downloaded again to catch late corrections
+KC_MAMODE  = "sma"  # Keltner moving average of new CSVs; existing ones keep their header's
+
+# ── THROTTLING ──
+MAX_WORKERS   = int(os.getenv("TREND_REV_WORKERS", 8))
+RATE_PER_SEC  = float(os.getenv("YAHOO_RATE_PER_SEC", 2.0))  # sustained requests/second
+RATE_BURST    = float(os.getenv("YAHOO_RATE_BURST", 4))
+RETRIES       = 3
+RETRY_BACKOFF = 2.0  # seconds, doubled per attempt
 
 
 
@@ -50,44 +68,39 @@ def process_df(df: pd.DataFrame, ticker: str) -> pd.DataFrame:
         columns=lambda c: c.replace(f"_{ticker}", "") if c.endswith(f"_{ticker}") else c,
         inplace=True
     )
-    df.ta.macd(append=True)
-    df.ta.rsi(append=True)
-    df.ta.efi(length=2, append=True)
-    df.ta.ema(length=11, append=True)
-    df.ta.ema(length=22, append=True)
-    df.ta.kc(length=20, scalar=3, mamode="sma", append=True)
     return df
 
-def update_periodic(ticker: str, interval: str, out_dir: Path, period_delta: timedelta):
+def fetch_yahoo(ticker: str, interval: str, start: str, end: str) -> pd.DataFrame:
+    # yf.download keeps module-global state between calls, so threads use Ticker.history
+    df = yf.Ticker(ticker).history(
+        start=start,
+        end=end,
+        interval=interval,
+        auto_adjust=False,
+        actions=False,
+    )
+    if df.index.tz is not None:
+        df.index = df.index.tz_localize(None)
+    return df
+
+def update_periodic(ticker: str, interval: str, out_dir: Path, period_delta: timedelta, fetch=fetch_yahoo):
     suffix = 'daily' if interval == '1d' else 'weekly'
     csv_path = out_dir / f"{ticker}_{suffix}.csv"
 
+    today = datetime.today().strftime('%Y-%m-%d')
     if csv_path.exists():
-        try:
-            df_old = pd.read_csv(csv_path, parse_dates=['Date'], index_col='Date')
-        except ValueError:
-            df_old = pd.read_csv(csv_path, parse_dates=[0], index_col=0)
-            df_old.index.name = 'Date'
-        last_date = df_old.index.max()
-        start = (last_date + period_delta).strftime('%Y-%m-%d')
+        # Only the last few rows are parsed; the rest of the file is never read
+        _, df_tail = read_csv_tail(csv_path, REFETCH_BARS)
+        last_date = df_tail.index.max()
+        if (last_date + period_delta).strftime('%Y-%m-%d') > today:
+            print(f"[{ticker}][{suffix}] up-to-date through {last_date.date()}")
+            return
+        start = df_tail.index.min().strftime('%Y-%m-%d')
     else:
-        df_old = pd.DataFrame()
         start = BASE_START
 
-    today = datetime.today().strftime('%Y-%m-%d')
-    if start > today:
-        print(f"[{ticker}][{suffix}] up-to-date through {last_date.date()}")
-        return
-
     try:
-        df_new = yf.download(
-            tickers=ticker,
-            start=start,
-            end=today,
-            interval=interval,
-            auto_adjust=False,
-            progress=False,
-        )
+        df_new = fetch(ticker, interval, start, today)
     except Exception as e:
         print(f"[{ticker}][{suffix}] download failed: {e}")
         return
@@ -95,27 +108,53 @@ def update_periodic(ticker: str, interval: str, out_dir: Path, period_delta: tim
     if df_new.empty:
         print(f"[{ticker}][{suffix}] no new data since {start}")
         return
-        return
 
     df_new.index.name = 'Date'
     df_new = process_df(df_new, ticker)
 
-    df_combined = pd.concat([df_old, df_new[~df_new.index.isin(df_old.index)]])
-    df_combined.sort_index(inplace=True)
-    df_combined.to_csv(csv_path)
-    print(f"[{ticker}][{suffix}] updated {start} → {today} ({len(df_new)} rows)")
-
-    time.sleep(1.5)  # ⚠️ throttle requests
+    if csv_path.exists():
+        # Prices first: the indicators of revised and new rows are recomputed
+        # below, in the Keltner mode the file already stores
+        kc_mamode = stored_mamode(csv_path) or KC_MAMODE
+        mode = write_new_bars(csv_path, df_new, tail_rows=CHECKPOINT_BARS)
+        if mode == 'rewrite':
+            # Prices changed before the checkpoint: every later indicator is stale
+            rebuild_indicators(csv_path, kc_mamode)
+        elif mode in ('append', 'tail'):
+            # Only bars after the checkpoint changed
+            refresh_tail(csv_path, kc_mamode)
+    else:
+        df_new, checkpoint = compute_indicators(df_new, KC_MAMODE)
+        df_new.to_csv(csv_path)
+        save_checkpoint(csv_path, checkpoint)
+        mode = 'created'
+    print(f"[{ticker}][{suffix}] {mode} {start} → {today} ({len(df_new)} rows)")
 
-def main():
+def main(fetch=None, workers: int = MAX_WORKERS):
     print(f"Project root: {PROJECT_ROOT}")
     ensure_dirs()
     tickers = load_tickers()
 
+    # One bucket for the provider, shared by every worker thread
+    if fetch is None:
+        fetch = rate_limited(
+            fetch_yahoo,
+            TokenBucket(RATE_PER_SEC, RATE_BURST),
+            retries=RETRIES,
+            backoff=RETRY_BACKOFF,
+        )
+
+    jobs = []
     for ticker in tickers:
-        print(f"→ Updating {ticker}")
-        update_periodic(ticker, interval="1d",  out_dir=DAILY_DIR,  period_delta=timedelta(days=1))
-        update_periodic(ticker, interval="1wk", out_dir=WEEKLY_DIR, period_delta=timedelta(days=7))
+        jobs.append((ticker, "1d",  DAILY_DIR,  timedelta(days=1), fetch))
+        jobs.append((ticker, "1wk", WEEKLY_DIR, timedelta(days=7), fetch))
+
+    start = time.perf_counter()
+    results = run_parallel(jobs, update_periodic, workers=workers)
+    for (ticker, interval, *_), res in results.items():
+        if isinstance(res, Exception):
+            print(f"[{ticker}][{interval}] update failed: {res}")
+    print(f"Updated {len(tickers)} tickers in {time.perf_counter() - start:.1f}s with {workers} workers")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -21,17 +21,30 @@
 
 
 import os
+import sys
+import json
 import time
+import bisect
 import shutil
+import threading
 from pathlib import Path
 from datetime import datetime, timedelta
 
+import numpy as np
 import pandas as pd
-import pandas_ta as ta
 import requests
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 
+# Fix import paths when run as a script
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.utils import read_csv_tail, write_new_bars
+from src.indicator_state import (
+    CHECKPOINT_BARS, compute_indicators, rebuild_indicators, refresh_tail, save_checkpoint, stored_mamode,
+)
+from src.rate_limit import TokenBucket, rate_limited, run_parallel
+
 # ── PROJECT ROOT CONFIG ──
 PROJECT_ROOT = Path(
     os.getenv("TREND_REV_ROOT", Path(__file__).resolve().parent.parent)
@@ -41,9 +54,20 @@ OUTPUT_DIR   = PROJECT_ROOT / "stock_historical_information"
 BASE_START   = "2007-01-01"
 TICKERS_FILE = SRC_DIR / "tickers.txt"
 ALPHAVANTAGE_API_KEY = os.getenv("ALPHAVANTAGE_API_KEY")  # Required for Alpha Vantage
+ALPHAVANTAGE_URL     = os.getenv("ALPHAVANTAGE_URL", "https://www.alphavantage.co/query")
 
 DAILY_DIR  = OUTPUT_DIR / "daily"
 WEEKLY_DIR = OUTPUT_DIR / "weekly"
+REFETCH_BARS = 3  # stored bars downloaded again to catch late corrections
+KC_MAMODE  = "ema"  # Keltner moving average of new CSVs; existing ones keep their header's
+
+# ── THROTTLING ── defaults fit a free key (5 requests/min); premium plans
+# (75+/min) raise ALPHAVANTAGE_RATE_PER_MIN and ALPHAVANTAGE_RATE_BURST
+MAX_WORKERS   = int(os.getenv("TREND_REV_WORKERS", 8))
+RATE_PER_MIN  = float(os.getenv("ALPHAVANTAGE_RATE_PER_MIN", 5))
+RATE_BURST    = float(os.getenv("ALPHAVANTAGE_RATE_BURST", 1))
+RETRIES       = 3
+RETRY_BACKOFF = 5.0  # seconds, doubled per attempt
 
 # ── HELPERS ──
 def ensure_dirs():
@@ -63,16 +87,50 @@ def process_df(df: pd.DataFrame, ticker: str) -> pd.DataFrame:
         columns=lambda c: c.replace(f"_{ticker}", "") if c.endswith(f"_{ticker}") else c,
         inplace=True
     )
-    df.ta.macd(append=True)
-    df.ta.rsi(append=True)
-    df.ta.efi(length=2, append=True)
-    df.ta.ema(length=11, append=True)
-    df.ta.ema(length=22, append=True)
-    df.ta.kc(length=20, scalar=3, mamode="Ema", append=True)
     return df
 
-def fetch_alpha_vantage_data(ticker: str, interval: str) -> pd.DataFrame:
-    base_url = "https://www.alphavantage.co/query"
+# Alpha Vantage field suffix ("1. open", "5. adjusted close", ...) → CSV column
+AV_FIELDS = {
+    'open':           'Open',
+    'high':           'High',
+    'low':            'Low',
+    'close':          'Close',
+    'adjusted close': 'Adj Close',
+    'volume':         'Volume',
+}
+COMPACT_BARS = 100  # bars returned by outputsize=compact
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """Keep-alive session shared by all worker threads, with transport-level retry."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            retry = Retry(
+                total=3,
+                backoff_factor=1.0,
+                status_forcelist=[429, 500, 502, 503, 504],
+                allowed_methods=["GET"],
+            )
+            adapter = HTTPAdapter(max_retries=retry, pool_connections=MAX_WORKERS, pool_maxsize=MAX_WORKERS)
+            session = requests.Session()
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _session = session
+        return _session
+
+def _wants_compact(interval: str, start: str) -> bool:
+    # Compact payloads hold the latest 100 daily bars; keep a margin for holidays
+    if interval != '1d' or start is None:
+        return False
+    today = datetime.today().strftime('%Y-%m-%d')
+    return np.busday_count(start, today) < COMPACT_BARS - 10
+
+def fetch_alpha_vantage_data(ticker: str, interval: str, start: str = None, end: str = None) -> pd.DataFrame:
+    base_url = ALPHAVANTAGE_URL
     if interval == '1d':
         function = "TIME_SERIES_DAILY_ADJUSTED"
         key = "Time Series (Daily)"
@@ -86,56 +144,63 @@ def fetch_alpha_vantage_data(ticker: str, interval: str) -> pd.DataFrame:
         "function": function,
         "symbol": ticker,
         "apikey": ALPHAVANTAGE_API_KEY,
-        "outputsize": "full"
     }
+    if interval == '1d':
+        params["outputsize"] = "compact" if _wants_compact(interval, start) else "full"
 
-    response = requests.get(base_url, params=params)
-    if response.status_code != 200:
-        raise Exception(f"API request failed: {response.status_code}")
+    with get_session().get(base_url, params=params, stream=True, timeout=60) as response:
+        if response.status_code != 200:
+            raise Exception(f"API request failed: {response.status_code}")
+        # Parse straight from the socket instead of buffering .content/.text first
+        response.raw.decode_content = True
+        payload = json.load(response.raw)
 
-    data = response.json().get(key, {})
+    data = payload.get(key, {})
     if not data:
-        raise Exception(f"No data returned for {ticker}")
-
-    df = pd.DataFrame.from_dict(data, orient='index')
-    df.index = pd.to_datetime(df.index)
-    df.sort_index(inplace=True)
-
-    df.rename(columns=lambda c: c.split(". ")[-1], inplace=True)
-    df = df.rename(columns={
-        'adjusted close': 'Adj Close',
-        'volume': 'Volume',
-        'open': 'Open',
-        'high': 'High',
-        'low': 'Low',
-        'close': 'Close'
-    })
-    df = df[['Open', 'High', 'Low', 'Close', 'Adj Close', 'Volume']].astype(float)
-    return df
+        # Throttling and key errors arrive as 200s with a "Note"/"Information" message
+        msg = payload.get("Note") or payload.get("Information") or payload.get("Error Message")
+        raise Exception(f"No data returned for {ticker}" + (f": {msg}" if msg else ""))
+
+    # ISO dates sort chronologically; drop everything before `start` before converting
+    dates = sorted(data)
+    if start is not None:
+        dates = dates[bisect.bisect_left(dates, start):]
+    if end is not None:
+        dates = dates[:bisect.bisect_right(dates, end)]
 
-def update_periodic(ticker: str, interval: str, out_dir: Path, period_delta: timedelta):
+    fields = {}
+    for field in data[dates[0]] if dates else []:
+        name = AV_FIELDS.get(field.split(". ")[-1])
+        if name:
+            fields[name] = field
+
+    columns = {
+        name: np.fromiter((float(data[d][fields[name]]) for d in dates), dtype=np.float64, count=len(dates))
+        for name in ['Open', 'High', 'Low', 'Close', 'Adj Close', 'Volume']
+        if name in fields
+    }
+    index = pd.DatetimeIndex(np.array(dates, dtype='datetime64[ns]'))
+    return pd.DataFrame(columns, index=index)
+
+def update_periodic(ticker: str, interval: str, out_dir: Path, period_delta: timedelta,
+                    fetch=fetch_alpha_vantage_data):
     suffix = 'daily' if interval == '1d' else 'weekly'
     csv_path = out_dir / f"{ticker}_{suffix}.csv"
 
+    today = datetime.today().strftime('%Y-%m-%d')
     if csv_path.exists():
-        try:
-            df_old = pd.read_csv(csv_path, parse_dates=['Date'], index_col='Date')
-        except ValueError:
-            df_old = pd.read_csv(csv_path, parse_dates=[0], index_col=0)
-            df_old.index.name = 'Date'
-        last_date = df_old.index.max()
-        start = (last_date + period_delta).strftime('%Y-%m-%d')
+        # Only the last few rows are parsed; the rest of the file is never read
+        _, df_tail = read_csv_tail(csv_path, REFETCH_BARS)
+        last_date = df_tail.index.max()
+        if (last_date + period_delta).strftime('%Y-%m-%d') > today:
+            print(f"[{ticker}][{suffix}] up-to-date through {last_date.date()}")
+            return
+        start = df_tail.index.min().strftime('%Y-%m-%d')
     else:
-        df_old = pd.DataFrame()
         start = BASE_START
 
-    today = datetime.today().strftime('%Y-%m-%d')
-    if start > today:
-        print(f"[{ticker}][{suffix}] up-to-date through {last_date.date()}")
-        return
-
     try:
-        df_new = fetch_alpha_vantage_data(ticker, interval)
+        df_new = fetch(ticker, interval, start, today)
     except Exception as e:
         print(f"[{ticker}][{suffix}] download failed: {e}")
         return
@@ -148,22 +213,49 @@ def update_periodic(ticker: str, interval: str, out_dir: Path, period_delta: tim
     df_new.index.name = 'Date'
     df_new = process_df(df_new, ticker)
 
-    df_combined = pd.concat([df_old, df_new[~df_new.index.isin(df_old.index)]])
-    df_combined.sort_index(inplace=True)
-    df_combined.to_csv(csv_path)
-    print(f"[{ticker}][{suffix}] updated {start} → {today} ({len(df_new)} rows)")
-
-    # time.sleep(15)  # Alpha Vantage allows 5 requests/min on free tier
+    if csv_path.exists():
+        # Prices first: the indicators of revised and new rows are recomputed
+        # below, in the Keltner mode the file already stores
+        kc_mamode = stored_mamode(csv_path) or KC_MAMODE
+        mode = write_new_bars(csv_path, df_new, tail_rows=CHECKPOINT_BARS)
+        if mode == 'rewrite':
+            # Prices changed before the checkpoint: every later indicator is stale
+            rebuild_indicators(csv_path, kc_mamode)
+        elif mode in ('append', 'tail'):
+            # Only bars after the checkpoint changed
+            refresh_tail(csv_path, kc_mamode)
+    else:
+        df_new, checkpoint = compute_indicators(df_new, KC_MAMODE)
+        df_new.to_csv(csv_path)
+        save_checkpoint(csv_path, checkpoint)
+        mode = 'created'
+    print(f"[{ticker}][{suffix}] {mode} {start} → {today} ({len(df_new)} rows)")
 
-def main():
+def main(fetch=None, workers: int = MAX_WORKERS):
     print(f"Project root: {PROJECT_ROOT}")
     ensure_dirs()
     tickers = load_tickers()
 
+    # One bucket for the API key, shared by every worker thread
+    if fetch is None:
+        fetch = rate_limited(
+            fetch_alpha_vantage_data,
+            TokenBucket.per_minute(RATE_PER_MIN, RATE_BURST),
+            retries=RETRIES,
+            backoff=RETRY_BACKOFF,
+        )
+
+    jobs = []
     for ticker in tickers:
-        print(f"→ Updating {ticker}")
-        update_periodic(ticker, interval="1d",  out_dir=DAILY_DIR,  period_delta=timedelta(days=1))
-        update_periodic(ticker, interval="1wk", out_dir=WEEKLY_DIR, period_delta=timedelta(days=7))
+        jobs.append((ticker, "1d",  DAILY_DIR,  timedelta(days=1), fetch))
+        jobs.append((ticker, "1wk", WEEKLY_DIR, timedelta(days=7), fetch))
+
+    start = time.perf_counter()
+    results = run_parallel(jobs, update_periodic, workers=workers)
+    for (ticker, interval, *_), res in results.items():
+        if isinstance(res, Exception):
+            print(f"[{ticker}][{interval}] update failed: {res}")
+    print(f"Updated {len(tickers)} tickers in {time.perf_counter() - start:.1f}s with {workers} workers")
 
     print("\n✅ All tickers processed. Historical data updated or created successfully.")
 
@@ -0,0 +1,78 @@
+# src/exits.py
+
+"""
+Exit resolution for the rule-based Keltner backtests.
+
+Instead of scanning forward bar by bar from every entry, each exit rule is
+turned into a boolean array over the bars and a reverse cumulative minimum
+gives, for every bar, the index of the next bar where the rule fires. Every
+trade's exit is then a single array lookup, so a ticker costs O(n) however
+many entries it has.
+"""
+
+import numpy as np
+
+NO_EXIT = -1
+
+
+def next_true(mask: np.ndarray) -> np.ndarray:
+    """
+    For every position k, the smallest j >= k with mask[j] True.
+
+    Returns
+    -------
+    np.ndarray
+        int array of length len(mask) + 1; positions with no later True bar
+        (and the extra last slot) hold len(mask).
+    """
+    n = len(mask)
+    idx = np.where(mask, np.arange(n), n)
+    out = np.empty(n + 1, dtype=np.int64)
+    out[n] = n
+    out[:n] = np.minimum.accumulate(idx[::-1])[::-1]
+    return out
+
+
+def down_close(close: np.ndarray) -> np.ndarray:
+    """
+    True on bars that close below the previous close (never on the first bar).
+    """
+    mask = np.zeros(len(close), dtype=bool)
+    mask[1:] = close[1:] < close[:-1]
+    return mask
+
+
+def trailing_exits(close: np.ndarray, middle: np.ndarray, entries: np.ndarray,
+                   above_middle: bool = False, hold_to_end: bool = False) -> np.ndarray:
+    """
+    First bar after each entry that closes below the previous close or on the
+    wrong side of the Keltner middle band.
+
+    Parameters
+    ----------
+    close, middle : np.ndarray
+        Close prices and KC_middle per bar (NaN comparisons never fire).
+    entries : np.ndarray
+        Integer bar positions of the entries.
+    above_middle : bool
+        Exit on a close above KC_middle instead of below it.
+    hold_to_end : bool
+        If no bar fires, exit on the last bar instead of returning NO_EXIT.
+
+    Returns
+    -------
+    np.ndarray
+        Exit bar position for every entry, or NO_EXIT.
+    """
+    crossed = close > middle if above_middle else close < middle
+    nxt = next_true(down_close(close) | crossed)[np.asarray(entries, dtype=np.int64) + 1]
+    n = len(close)
+    return np.where(nxt < n, nxt, n - 1 if hold_to_end else NO_EXIT)
+
+
+def fixed_exits(n_bars: int, entries: np.ndarray, hold: int = 5) -> np.ndarray:
+    """
+    Exit `hold` bars after each entry, or NO_EXIT if that bar does not exist.
+    """
+    exits = np.asarray(entries, dtype=np.int64) + hold
+    return np.where(exits < n_bars, exits, NO_EXIT)
@@ -0,0 +1,220 @@
+# src/feature_store.py
+
+"""
+Persistent per-ticker table of touch events, labels and features.
+
+Training, tuning and prediction all need the same preprocessing: daily and
+weekly touch detection, reversal labels and the weekly as-of feature join.
+This module runs it once per data update and keeps the result per ticker as a
+column store (the src.bar_store format) under
+
+    feature_store/{spec hash}/{TICKER}.cols/
+
+The spec hash covers everything that shapes the rows (lookahead, Keltner
+parameters, feature columns), so changing any of them starts a new store
+instead of mixing rows. The store's meta.json records the data version it was
+built from: the CSV stamps, last bar dates and a content hash of every bar but
+the last (which downloads may still revise). When the CSVs gain new bars and
+that hashed prefix is unchanged, only events whose label window or weekly row
+could have changed are recomputed and the new ones appended; any other change
+to history, such as a price fix inside it, triggers a full rebuild.
+
+Refresh every ticker in src/tickers.txt with:
+
+    python -m src.feature_store [--rebuild] [TICKER ...]
+"""
+
+import hashlib
+import json
+import os
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from . import bar_store
+from .detection import _find_touches
+from .features import FEATURE_COLUMNS, align_features
+from .labeling import label_reversals
+from .utils import load_csv
+
+STORE_ROOT   = "feature_store"
+DAILY_DIR    = "stock_historical_information/daily"
+WEEKLY_DIR   = "stock_historical_information/weekly"
+TICKERS_FILE = "src/tickers.txt"
+LOOKAHEAD    = [1, 2]
+SPEC_VERSION = 2  # 2: recomputed bands are the stored (true-range) kind
+
+LABEL_COLUMNS = ['Close_t', 'Reversal', 'First_Reversal_Day']
+
+
+def feature_spec(lookahead=LOOKAHEAD, period: int = 20, multiplier: float = 3.0) -> dict:
+    """
+    Everything that determines a store's rows.
+    """
+    return {
+        'version':    SPEC_VERSION,
+        'lookahead':  sorted(lookahead),
+        'period':     period,
+        'multiplier': float(multiplier),
+        'features':   FEATURE_COLUMNS,
+    }
+
+
+def spec_hash(spec: dict) -> str:
+    return hashlib.sha1(json.dumps(spec, sort_keys=True).encode()).hexdigest()[:12]
+
+
+def store_path(ticker: str, spec: dict = None, root=STORE_ROOT) -> Path:
+    spec = spec or feature_spec()
+    return Path(root) / spec_hash(spec) / f"{ticker}{bar_store.STORE_SUFFIX}"
+
+
+def _stamp(path) -> list:
+    st = os.stat(path)
+    return [st.st_mtime_ns, st.st_size]
+
+
+def _prefix_hash(df: pd.DataFrame, rows: int) -> str:
+    # Content of the first `rows` bars: column names, dates and values
+    head = df.iloc[:max(rows, 0)]
+    h = hashlib.sha1(json.dumps([str(c) for c in head.columns]).encode())
+    h.update(pd.util.hash_pandas_object(head, index=True).to_numpy().tobytes())
+    return h.hexdigest()
+
+
+def build_rows(daily: pd.DataFrame, weekly: pd.DataFrame, spec: dict, since=None) -> pd.DataFrame:
+    """
+    Detect, label and featurize the daily touch events of one ticker.
+
+    Parameters
+    ----------
+    daily, weekly : pd.DataFrame
+        Full daily and weekly histories as returned by load_csv.
+    spec : dict
+        Output of `feature_spec`.
+    since : pd.Timestamp, optional
+        Only return events on or after this date.
+
+    Returns
+    -------
+    pd.DataFrame
+        Events that pass the feature NaN filter, indexed by touch date, with
+        the FEATURE_COLUMNS features followed by LABEL_COLUMNS.
+    """
+    daily_events = _find_touches(daily, period=spec['period'], multiplier=spec['multiplier'])
+    weekly_events = _find_touches(weekly, period=spec['period'], multiplier=spec['multiplier'])
+    if since is not None:
+        daily_events = daily_events[daily_events.index >= since]
+
+    labeled = label_reversals(daily, daily_events.index.to_list(), lookahead=spec['lookahead'])
+    events = daily_events.join(labeled[['Close_t', 'Reversal', 'First_Reversal_Day', 'First_Reversal_Date']])
+
+    features, keep = align_features(events, weekly_events)
+    table = features[keep].copy()
+    for col in LABEL_COLUMNS:
+        table[col] = events[col].to_numpy(dtype=bool if col == 'Reversal' else float)[keep]
+    return table
+
+
+def refresh(ticker: str, spec: dict = None, root=STORE_ROOT, rebuild: bool = False) -> str:
+    """
+    Bring a ticker's store up to date with its daily and weekly CSVs.
+
+    Returns
+    -------
+    str
+        'unchanged' (CSV stamps match the store), 'append' (stored rows kept,
+        recent events recomputed and new ones added) or 'rebuild'.
+    """
+    spec = spec or feature_spec()
+    store = store_path(ticker, spec, root)
+    daily_path = f"{DAILY_DIR}/{ticker}_daily.csv"
+    weekly_path = f"{WEEKLY_DIR}/{ticker}_weekly.csv"
+
+    meta = {} if rebuild else bar_store.read_meta(store)
+    stamps = {'daily_stamp': _stamp(daily_path), 'weekly_stamp': _stamp(weekly_path)}
+    if meta and all(meta.get(k) == v for k, v in stamps.items()):
+        return 'unchanged'
+
+    daily, weekly = load_csv(daily_path), load_csv(weekly_path)
+
+    def extends(df, rows, prefix):
+        # Every stored bar but the last is unchanged in the current history
+        return prefix is not None and rows <= len(df) and _prefix_hash(df, rows - 1) == prefix
+
+    if meta and extends(daily, meta['daily_rows'], meta.get('daily_prefix')) \
+            and extends(weekly, meta['weekly_rows'], meta.get('weekly_prefix')):
+        # Events whose lookahead window reaches the old last bar (which may
+        # have been revised) or was cut off by it, or that may align to the
+        # last stored weekly bar, can change
+        first_open = daily.index[max(0, meta['daily_rows'] - max(spec['lookahead']) - 1)]
+        cutoff = min(first_open, pd.Timestamp(meta['weekly_last']))
+        old = bar_store.read_frame(store, mmap=False)
+        new = build_rows(daily, weekly, spec, since=cutoff)
+        table = pd.concat([old[old.index < cutoff], new]) if len(new) else old[old.index < cutoff]
+        mode = 'append'
+    else:
+        table = build_rows(daily, weekly, spec)
+        mode = 'rebuild'
+
+    table.index.name = 'Date'
+    bar_store.write_frame(table, store, extra={
+        **stamps,
+        'spec':          spec,
+        'daily_rows':    len(daily),
+        'daily_last':    str(daily.index[-1].date()),
+        'daily_prefix':  _prefix_hash(daily, len(daily) - 1),
+        'weekly_rows':   len(weekly),
+        'weekly_last':   str(weekly.index[-1].date()),
+        'weekly_prefix': _prefix_hash(weekly, len(weekly) - 1),
+    })
+    return mode
+
+
+def load_table(ticker: str, spec: dict = None, root=STORE_ROOT, refresh_first: bool = True) -> pd.DataFrame:
+    """
+    Return a ticker's stored event table (see `build_rows`), refreshing it first
+    by default. ``attrs['daily_last']`` holds the last daily bar it covers.
+    """
+    spec = spec or feature_spec()
+    if refresh_first:
+        refresh(ticker, spec, root)
+    store = store_path(ticker, spec, root)
+    table = bar_store.read_frame(store)
+    table.attrs['daily_last'] = pd.Timestamp(bar_store.read_meta(store)['daily_last'])
+    return table
+
+
+def load_xy(ticker: str, spec: dict = None, root=STORE_ROOT, refresh_first: bool = True):
+    """
+    Feature matrix and labels for a ticker, as build_feature_matrix returns them
+    for its touch events and weekly touches.
+    """
+    table = load_table(ticker, spec, root, refresh_first)
+    X = table[list(FEATURE_COLUMNS)].reset_index(drop=True) if len(table) else pd.DataFrame()
+    y = pd.Series(list(np.asarray(table['Reversal'])), name='Reversal')
+    return X, y
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    tickers = [a.upper() for a in argv if not a.startswith("--")]
+    if not tickers:
+        tickers = [t.strip().upper() for t in Path(TICKERS_FILE).read_text().splitlines()
+                   if t.strip() and not t.startswith("#")]
+
+    counts = {}
+    for ticker in tickers:
+        try:
+            mode = refresh(ticker, rebuild="--rebuild" in argv)
+        except (OSError, KeyError, ValueError) as e:
+            print(f"Skipping {ticker}: {e}")
+            mode = 'failed'
+        counts[mode] = counts.get(mode, 0) + 1
+    print(f"Feature store refreshed for {len(tickers)} tickers: {counts}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,15 +2,82 @@
 import pandas as pd
 import numpy as np
 
+# Feature name → weekly indicator column it is read from
+FEATURE_COLUMNS = {
+    'MACD': 'MACD',
+    'MACDh': 'MACD_Hist',
+    'MACDs': 'MACD_Signal',
+    'RSI': 'RSI_14',
+    'ForceIndex': 'EFI',
+    'EMA11': 'EMA11',
+    'EMA22': 'EMA22',
+    'ATR20': 'ATR20',
+    'KC_lower': 'KC_lower',
+    'KC_middle': 'KC_middle',
+    'KC_upper': 'KC_upper',
+}
+
+
+def asof_positions(index: pd.DatetimeIndex, dates) -> np.ndarray:
+    """
+    Position in the sorted `index` of the latest entry on or before each date,
+    or -1 where there is none (including NaT dates).
+    """
+    dates = pd.DatetimeIndex(dates)
+    pos = index.searchsorted(dates, side='right') - 1
+    pos[dates.isna()] = -1
+    return pos
+
+
+def align_features(events: pd.DataFrame, weekly_df: pd.DataFrame):
+    """
+    Look up every event's features in its latest weekly row on or before the entry date.
+
+    Parameters
+    ----------
+    events, weekly_df : pd.DataFrame
+        As for `build_feature_matrix`.
+
+    Returns
+    -------
+    features : pd.DataFrame
+        One row per event (indexed like `events`), one column per FEATURE_COLUMNS entry.
+    keep : np.ndarray
+        Bool mask of events with an earlier weekly row, no NaN in that row and
+        no NaN feature.
+    """
+    if not weekly_df.index.is_monotonic_increasing:
+        weekly_df = weekly_df.sort_index()
+
+    entry_dates = pd.to_datetime(events['Entry Date']) if 'Entry Date' in events.columns else events.index
+    pos = asof_positions(pd.DatetimeIndex(weekly_df.index), entry_dates)
+
+    # Position -1 (no weekly row yet) picks the padding appended to each column
+    keep = np.append(~weekly_df.isna().any(axis=1).to_numpy(), False)[pos]
+    features = {}
+    for name, col in FEATURE_COLUMNS.items():
+        if col in weekly_df.columns:
+            values = np.append(weekly_df[col].to_numpy(dtype=float), np.nan)[pos]
+        else:
+            values = np.full(len(pos), np.nan)
+        features[name] = values
+        keep &= ~np.isnan(values)
+    return pd.DataFrame(features, index=events.index), keep
+
 
 def build_feature_matrix(events: pd.DataFrame, weekly_df: pd.DataFrame):
     """
     Build feature matrix X and labels y from weekly stock data and trade events.
 
+    Every event is aligned to the latest weekly row on or before its entry date
+    with one sorted as-of lookup. Events with no earlier weekly row, with any
+    NaN in that row, or with a NaN feature are dropped; X and y stay aligned.
+
     Parameters
     ----------
     events : pd.DataFrame
         DataFrame with trade events (must include 'Entry Date', 'Ticker', 'Reversal').
+        Without an 'Entry Date' column the events' index is used as the entry date.
     weekly_df : pd.DataFrame
         Weekly OHLCV + indicator data, indexed by date.
 
@@ -21,46 +88,7 @@ def build_feature_matrix(events: pd.DataFrame, weekly_df: pd.DataFrame):
     y : pd.Series or None
         Series of labels if 'Reversal' column exists, else None.
     """
-    features = []
-    labels = []
-
-    for _, row in events.iterrows():
-        entry_date = pd.to_datetime(row['Entry Date'])
-
-        # Try to align entry_date with the nearest previous available weekly date
-        if entry_date not in weekly_df.index:
-            # Pick latest row before or equal to entry_date
-            weekly_slice = weekly_df[weekly_df.index <= entry_date]
-            if weekly_slice.empty:
-                continue  # no data available before entry
-            entry_row = weekly_slice.iloc[-1]
-        else:
-            entry_row = weekly_df.loc[entry_date]
-
-        # Extract relevant features (skip NaNs)
-        if entry_row.isna().any():
-            continue
-
-        feature = {
-            'MACD': entry_row.get('MACD_12_26_9', np.nan),
-            'MACDh': entry_row.get('MACDh_12_26_9', np.nan),
-            'MACDs': entry_row.get('MACDs_12_26_9', np.nan),
-            'RSI': entry_row.get('RSI_14', np.nan),
-            'ForceIndex': entry_row.get('Elder_Force_Index_2', np.nan),
-            'EMA11': entry_row.get('EMA11', np.nan),
-            'EMA22': entry_row.get('EMA22', np.nan),
-            'ATR20': entry_row.get('ATR20', np.nan),
-            'KC_lower': entry_row.get('KC_lower', np.nan),
-            'KC_middle': entry_row.get('KC_middle', np.nan),
-            'KC_upper': entry_row.get('KC_upper', np.nan),
-        }
-
-        if np.isnan(list(feature.values())).any():
-            continue
-
-        features.append(feature)
-        labels.append(row['Reversal'] if 'Reversal' in row else None)
-
-    X = pd.DataFrame(features)
-    y = pd.Series(labels, name='Reversal') if 'Reversal' in events.columns else None
+    features, keep = align_features(events, weekly_df)
+    X = features[keep].reset_index(drop=True) if keep.any() else pd.DataFrame()
+    y = pd.Series(list(events['Reversal'].to_numpy()[keep]), name='Reversal') if 'Reversal' in events.columns else None
     return X, y
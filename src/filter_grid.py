@@ -0,0 +1,198 @@
+# src/filter_grid.py
+
+"""
+Evaluate every filter configuration of the rule-based backtest in one pass per ticker.
+
+Each ticker's bars and indicators are loaded once and turned into the shared
+candidate table of src.strategy (filter bitmask plus both exits per touch).
+Every row of configs/filter_config_matrix.csv is then just a bit test over
+that table, and the trades come out in the same schema as
+backtest_rule_based.backtest_keltner_2024.
+
+`run_grid_parallel` spreads the same work over a process pool: the candidate
+table and closes of every ticker are built once, written as memory-mapped
+columns (the src.bar_store format) and opened read-only by each worker, which
+evaluates (ticker, block of configs) units without copying or recomputing
+them; a unit is only the bit tests of its configs.
+"""
+
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from src import bar_store
+from src.strategy import DAILY_DIR, StrategyConfig, config_candidates, prepare_frame, trade_arrays, trades_frame
+from src.utils import load_csv
+
+# Columns of the candidate table a work unit reads (Entry Date is the index)
+CAND_COLUMNS = ['Buy Price', 'Filters', 'Trailing Exit', 'Fixed Exit']
+
+
+def run_grid(configs: pd.DataFrame, tickers, progress=None, base: StrategyConfig = None) -> pd.DataFrame:
+    """
+    Trades of every configuration for every ticker.
+
+    Parameters
+    ----------
+    configs : pd.DataFrame
+        Rows of filter_config_matrix.csv: 'Config_ID' plus the USE_* flags.
+    tickers : list of str
+        Tickers to load; failures are reported and skipped.
+    progress : callable, optional
+        Wrapper for the ticker iterable (e.g. tqdm).
+    base : StrategyConfig, optional
+        Year, ATR threshold and fixed hold shared by every config (defaults
+        to StrategyConfig()); the USE_* flags come from each row.
+
+    Returns
+    -------
+    pd.DataFrame
+        Trade rows (config-major, then ticker order) with 'Config_ID' and the
+        flag values appended, as batch_run_filters wrote them.
+    """
+    base = base or StrategyConfig()
+    loaded = []
+    for ticker in (progress(tickers) if progress else tickers):
+        try:
+            df = prepare_frame(load_csv(f"{DAILY_DIR}/{ticker}_daily.csv"))
+            if df.empty:
+                continue
+            cands = config_candidates(df, ticker, base)
+            loaded.append((ticker, cands, df.index, df['Close'].to_numpy(dtype=float)))
+        except Exception as e:
+            print(f"Error with {ticker}: {e}")
+
+    rows = [row for _, row in configs.iterrows()]
+    results = {}
+    for k, row in enumerate(rows):
+        config = StrategyConfig.from_flags(row, base)
+        for ticker, cands, index, close in loaded:
+            results[(k, ticker)] = trade_arrays(cands, index, close, config)
+    return _merge(results, rows, [t for t, *_ in loaded])
+
+
+def _merge(results: dict, rows: list, tickers: list) -> pd.DataFrame:
+    # Stack (config position, ticker) → trade arrays in config-major, ticker
+    # order and append the config ID and flag values, as batch_run_filters
+    # always wrote them
+    keys = [(k, t) for k in range(len(rows)) for t in tickers if results.get((k, t)) is not None]
+    out = trades_frame([results[key] for key in keys], [t for _, t in keys])
+    if out.empty:
+        return out
+    lengths = [len(results[key]['Buy Price']) for key in keys]
+    picks = np.repeat([k for k, _ in keys], lengths)
+    for col in rows[0].index:
+        out[col] = pd.Series([row[col] for row in rows]).to_numpy()[picks]
+    return out
+
+
+def build_panel(tickers, panel_dir, base: StrategyConfig = None) -> dict:
+    """
+    Prepare every ticker's frame and candidate table once and write them,
+    stacked, as two column stores under `panel_dir`: 'bars' (closes) and
+    'cands' (CAND_COLUMNS, indexed by entry date).
+
+    Returns
+    -------
+    dict
+        Ticker → (start, stop, cand_start, cand_stop) rows of its bars and
+        candidates in the two stores.
+    """
+    base = base or StrategyConfig()
+    bars, cands, offsets, pos, cpos = [], [], {}, 0, 0
+    for ticker in tickers:
+        try:
+            df = prepare_frame(load_csv(f"{DAILY_DIR}/{ticker}_daily.csv"))
+            if df.empty:
+                continue
+            table = config_candidates(df, ticker, base)
+        except Exception as e:
+            print(f"Error with {ticker}: {e}")
+            continue
+        bars.append(df[['Close']])
+        cands.append(table.set_index('Entry Date')[CAND_COLUMNS])
+        offsets[ticker] = (pos, pos + len(df), cpos, cpos + len(table))
+        pos += len(df)
+        cpos += len(table)
+    if offsets:
+        bar_store.write_frame(pd.concat(bars), os.path.join(panel_dir, "bars"))
+        bar_store.write_frame(pd.concat(cands), os.path.join(panel_dir, "cands"))
+    return offsets
+
+
+# Stores opened once per worker process by _open_panel
+_panel = None
+
+
+def _open_panel(panel_dir):
+    global _panel
+    _panel = (bar_store.read_frame(os.path.join(panel_dir, "bars"), mmap=True),
+              bar_store.read_frame(os.path.join(panel_dir, "cands"), mmap=True))
+
+
+def _run_unit(ticker, rows, block):
+    # Evaluate a block of (row position, config) pairs on one ticker's
+    # precomputed candidates
+    t0 = time.perf_counter()
+    start, stop, cstart, cstop = rows
+    bars, cands = _panel
+    df = bars.iloc[start:stop]
+    table = cands.iloc[cstart:cstop].rename_axis('Entry Date').reset_index()
+    close = df['Close'].to_numpy(dtype=float)
+    out = {k: trade_arrays(table, df.index, close, config) for k, config in block}
+    return ticker, out, os.getpid(), len(block), time.perf_counter() - t0
+
+
+def run_grid_parallel(configs: pd.DataFrame, tickers, workers: int = None,
+                      block_size: int = 16, base: StrategyConfig = None) -> pd.DataFrame:
+    """
+    `run_grid` on a process pool over a memory-mapped indicator panel.
+
+    Parameters
+    ----------
+    configs, tickers, base :
+        As for `run_grid`.
+    workers : int, optional
+        Worker processes (default: os.cpu_count()).
+    block_size : int
+        Configs evaluated per (ticker, block) work unit.
+
+    Returns
+    -------
+    pd.DataFrame
+        The same table as `run_grid`. Per-worker throughput is printed.
+    """
+    base = base or StrategyConfig()
+    rows = [row for _, row in configs.iterrows()]
+    pairs = [(k, StrategyConfig.from_flags(row, base)) for k, row in enumerate(rows)]
+    blocks = [pairs[i:i + block_size] for i in range(0, len(pairs), block_size)]
+
+    panel_dir = tempfile.mkdtemp(prefix="filter_grid_")
+    try:
+        offsets = build_panel(tickers, panel_dir, base)
+        if not offsets:
+            return pd.DataFrame()
+
+        results, stats = {}, {}
+        with ProcessPoolExecutor(max_workers=workers, initializer=_open_panel,
+                                 initargs=(panel_dir,)) as pool:
+            futures = [pool.submit(_run_unit, t, rows, block)
+                       for t, rows in offsets.items() for block in blocks]
+            for fut in as_completed(futures):
+                ticker, out, pid, n, elapsed = fut.result()
+                for k, trades in out.items():
+                    results[(k, ticker)] = trades
+                units, evals, busy = stats.get(pid, (0, 0, 0.0))
+                stats[pid] = (units + 1, evals + n, busy + elapsed)
+    finally:
+        shutil.rmtree(panel_dir, ignore_errors=True)
+
+    for pid, (units, evals, busy) in sorted(stats.items()):
+        print(f"worker {pid}: {units} units, {evals} ticker-configs, {evals / max(busy, 1e-9):.0f}/s")
+
+    return _merge(results, rows, list(offsets))
@@ -0,0 +1,389 @@
+# src/indicator_state.py
+
+"""
+Incremental technical indicators for the downloaders.
+
+The downloaders append a few bars per night and revise the last ones (the
+daily bar or the weekly bar still in progress). Running pandas_ta over just
+those bars leaves them with NaN warm-up values, and running it over the full
+history costs O(history). This module keeps the recursive state of every
+indicator the downloaders store (EMA values, Wilder RSI averages, the Keltner
+basis/band EMA or SMA window and the MACD signal EMA) in a JSON file next to
+each CSV, as a checkpoint CHECKPOINT_BARS bars before the file's end. After
+each download `refresh_tail` recomputes the indicators from the checkpoint
+over the bars after it and rewrites only those rows, so both appended bars
+and revisions of the last stored ones cost O(new bars + CHECKPOINT_BARS).
+
+The recursions follow pandas' EWM update step by step, so extending a history
+bar by bar gives bit-identical results to one pass over the full history, and
+matches pandas_ta's macd/rsi/efi/ema/kc to floating-point rounding.
+
+The Keltner mode of an existing file is the one its header already holds
+(`stored_mamode`); asking for another one is an error rather than a silent
+schema change. Columns the engine does not compute are left as they are.
+"""
+
+import copy
+import json
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from .schema import parse_column
+
+NAN = float('nan')
+
+BAR_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Adj Close', 'Volume']
+
+# Trailing bars recomputed on every update. Revisions within them (see
+# utils.write_new_bars with tail_rows=CHECKPOINT_BARS) are repaired from the
+# checkpoint; earlier ones need `rebuild_indicators`.
+CHECKPOINT_BARS = 16
+
+
+class _Ewm:
+    """pandas' ewm().mean() recursion (ignore_na=False) applied one value at a time."""
+
+    def __init__(self, com: float, adjust: bool, min_periods: int = 0):
+        alpha = 1.0 / (1.0 + com)
+        self.factor = 1.0 - alpha
+        self.new_wt = 1.0 if adjust else alpha
+        self.adjust = adjust
+        self.minp = max(min_periods, 1)
+        self.weighted = NAN
+        self.old_wt = 1.0
+        self.nobs = 0
+        self.started = False
+
+    def update(self, cur: float) -> float:
+        cur = float(cur)
+        is_obs = cur == cur
+        if not self.started:
+            self.started = True
+            self.weighted = cur
+            self.nobs = int(is_obs)
+        else:
+            self.nobs += is_obs
+            if self.weighted == self.weighted:
+                self.old_wt *= self.factor
+                if is_obs:
+                    if self.weighted != cur:
+                        self.weighted = self.old_wt * self.weighted + self.new_wt * cur
+                        self.weighted /= (self.old_wt + self.new_wt)
+                    self.old_wt = self.old_wt + self.new_wt if self.adjust else 1.0
+            elif is_obs:
+                self.weighted = cur
+        return self.weighted if self.nobs >= self.minp else NAN
+
+
+class _Ema:
+    """pandas_ta ema: SMA of the first `length` values as seed, then ewm(span, adjust=False)."""
+
+    def __init__(self, length: int):
+        self.length = length
+        self.seen = 0
+        self.seed_buf = []
+        self.ewm = _Ewm(com=(length - 1) / 2.0, adjust=False)
+
+    def update(self, x: float) -> float:
+        x = float(x)
+        self.seen += 1
+        if self.seen < self.length:
+            self.seed_buf.append(x)
+            return self.ewm.update(NAN)
+        if self.seen == self.length:
+            vals = np.array(self.seed_buf + [x], dtype=float)
+            mask = ~np.isnan(vals)
+            seed = float(np.where(mask, vals, 0.0).sum() / mask.sum()) if mask.any() else NAN
+            self.seed_buf = []
+            return self.ewm.update(seed)
+        return self.ewm.update(x)
+
+
+class _Rma:
+    """pandas_ta rma (Wilder smoothing): ewm(alpha=1/length, min_periods=length)."""
+
+    def __init__(self, length: int):
+        self.ewm = _Ewm(com=1.0 / (1.0 / length) - 1.0, adjust=True, min_periods=length)
+
+    def update(self, x: float) -> float:
+        return self.ewm.update(x)
+
+
+class _Sma:
+    """Rolling mean over the last `length` values (NaN until the window is full)."""
+
+    def __init__(self, length: int):
+        self.length = length
+        self.window = []
+
+    def update(self, x: float) -> float:
+        self.window.append(float(x))
+        if len(self.window) > self.length:
+            self.window.pop(0)
+        vals = np.array(self.window, dtype=float)
+        if len(vals) < self.length or np.isnan(vals).any():
+            return NAN
+        return float(vals.mean())
+
+
+_COMPONENTS = {cls.__name__: cls for cls in (_Ewm, _Ema, _Rma, _Sma)}
+
+
+def _to_dict(obj):
+    out = {'__kind__': type(obj).__name__}
+    for k, v in vars(obj).items():
+        out[k] = _to_dict(v) if type(v).__name__ in _COMPONENTS else v
+    return out
+
+
+def _from_dict(d):
+    obj = _COMPONENTS[d['__kind__']].__new__(_COMPONENTS[d['__kind__']])
+    for k, v in d.items():
+        if k != '__kind__':
+            setattr(obj, k, _from_dict(v) if isinstance(v, dict) and '__kind__' in v else v)
+    return obj
+
+
+class IndicatorState:
+    """
+    Recursive state for the indicator set written by the downloaders:
+    MACD(12,26,9), RSI(14), EFI(2), EMA(11), EMA(22) and Keltner(20, 3.0).
+
+    Parameters
+    ----------
+    kc_mamode : str
+        Keltner moving-average mode, 'ema' or 'sma' (as passed to ta.kc).
+    """
+
+    def __init__(self, kc_mamode: str = "ema"):
+        self.kc_mamode = kc_mamode.lower()
+        if self.kc_mamode not in ('ema', 'sma'):
+            raise ValueError(f"Unsupported Keltner mamode: {kc_mamode}")
+        ma = _Ema if self.kc_mamode == 'ema' else _Sma
+
+        self.last_date = None
+        self.prev_close = NAN
+        self.macd_fast = _Ema(12)
+        self.macd_slow = _Ema(26)
+        self.macd_signal = _Ema(9)
+        self.rsi_up = _Rma(14)
+        self.rsi_down = _Rma(14)
+        self.efi = _Ema(2)
+        self.ema11 = _Ema(11)
+        self.ema22 = _Ema(22)
+        self.kc_basis = ma(20)
+        self.kc_band = ma(20)
+
+    @property
+    def columns(self) -> list:
+        m = self.kc_mamode[0]
+        return [
+            'MACD_12_26_9', 'MACDh_12_26_9', 'MACDs_12_26_9', 'RSI_14', 'EFI_2',
+            'EMA_11', 'EMA_22', f'KCL{m}_20_3.0', f'KCB{m}_20_3.0', f'KCU{m}_20_3.0',
+        ]
+
+    def update(self, bars: pd.DataFrame) -> pd.DataFrame:
+        """
+        Extend every indicator over `bars` and return their values.
+
+        Parameters
+        ----------
+        bars : pd.DataFrame
+            Bars strictly after `last_date`, indexed by Date, with at least
+            'High', 'Low', 'Close' and 'Volume'.
+
+        Returns
+        -------
+        pd.DataFrame
+            Indicator columns (pandas_ta names) indexed like `bars`.
+        """
+        if self.last_date is not None and len(bars) and bars.index.min() <= pd.Timestamp(self.last_date):
+            raise ValueError(f"Bars must start after {self.last_date}")
+
+        high = bars['High'].to_numpy(dtype=float)
+        low = bars['Low'].to_numpy(dtype=float)
+        close = bars['Close'].to_numpy(dtype=float)
+        volume = bars['Volume'].to_numpy(dtype=float)
+        out = np.full((len(bars), 10), NAN)
+
+        for i in range(len(bars)):
+            c, pc = close[i], self.prev_close
+            diff = c - pc
+
+            macd = self.macd_fast.update(c) - self.macd_slow.update(c)
+            # The signal EMA starts at the first valid MACD value
+            signal = self.macd_signal.update(macd) if (macd == macd or self.macd_signal.seen) else NAN
+
+            up = self.rsi_up.update(max(diff, 0.0) if diff == diff else NAN)
+            down = self.rsi_down.update(min(diff, 0.0) if diff == diff else NAN)
+            denom = up + abs(down)
+            rsi = 100 * up / denom if denom != 0 else NAN
+
+            tr = max(abs(high[i] - low[i]), abs(high[i] - pc), abs(pc - low[i])) if pc == pc else NAN
+            basis = self.kc_basis.update(c)
+            band = self.kc_band.update(tr)
+
+            out[i] = (
+                macd, macd - signal, signal, rsi, self.efi.update(diff * volume[i]),
+                self.ema11.update(c), self.ema22.update(c),
+                basis - 3.0 * band, basis, basis + 3.0 * band,
+            )
+            self.prev_close = c
+
+        if len(bars):
+            self.last_date = str(bars.index.max().date())
+        return pd.DataFrame(out, index=bars.index, columns=self.columns)
+
+    def to_dict(self) -> dict:
+        return {k: _to_dict(v) if type(v).__name__ in _COMPONENTS else v for k, v in vars(self).items()}
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "IndicatorState":
+        obj = cls.__new__(cls)
+        for k, v in d.items():
+            setattr(obj, k, _from_dict(v) if isinstance(v, dict) and '__kind__' in v else v)
+        return obj
+
+    def save(self, path):
+        Path(path).write_text(json.dumps(self.to_dict()))
+
+    @classmethod
+    def load(cls, path) -> "IndicatorState":
+        return cls.from_dict(json.loads(Path(path).read_text()))
+
+
+def state_path(csv_path) -> Path:
+    """
+    Return the JSON state file kept next to a ticker/timeframe CSV.
+    """
+    return Path(csv_path).with_suffix(".state.json")
+
+
+def stored_mamode(csv_path):
+    """
+    Keltner moving-average mode ('ema' or 'sma') of the KC columns in a CSV
+    header, or None if the file has none.
+    """
+    with open(csv_path) as f:
+        header = f.readline().strip().split(',')
+    modes = {p[2]['mamode'] for p in map(parse_column, header) if p and p[0] == 'keltner'}
+    if len(modes) > 1:
+        raise ValueError(f"{csv_path} mixes Keltner modes {sorted(map(str, modes))}")
+    return modes.pop() if modes else None
+
+
+def resolve_mamode(csv_path, kc_mamode: str = None) -> str:
+    """
+    Keltner mode to maintain for an existing CSV: the one of its header, which
+    `kc_mamode` (if given) must agree with; `kc_mamode` or 'ema' for a header
+    without KC columns.
+    """
+    stored = stored_mamode(csv_path)
+    if kc_mamode and stored and stored != kc_mamode.lower():
+        raise ValueError(f"{csv_path} stores {stored} Keltner bands, not {kc_mamode.lower()}")
+    return (stored or kc_mamode or 'ema').lower()
+
+
+def _run(state: IndicatorState, bars: pd.DataFrame):
+    # Indicators of `bars`, and a copy of the state CHECKPOINT_BARS bars before their end
+    split = max(0, len(bars) - CHECKPOINT_BARS)
+    head = state.update(bars.iloc[:split])
+    checkpoint = copy.deepcopy(state)
+    return pd.concat([head, state.update(bars.iloc[split:])]), checkpoint
+
+
+def save_checkpoint(csv_path, state: IndicatorState):
+    """
+    Save `state` as the checkpoint of `csv_path`.
+    """
+    state_path(csv_path).write_text(json.dumps({'checkpoint_bars': CHECKPOINT_BARS, 'state': state.to_dict()}))
+
+
+def load_checkpoint(csv_path):
+    """
+    The saved checkpoint of `csv_path`, or None if there is none (or only a
+    state saved in another layout).
+    """
+    path = state_path(csv_path)
+    if not path.exists():
+        return None
+    saved = json.loads(path.read_text())
+    if saved.get('checkpoint_bars') != CHECKPOINT_BARS:
+        return None
+    return IndicatorState.from_dict(saved['state'])
+
+
+def compute_indicators(bars: pd.DataFrame, kc_mamode: str = "ema"):
+    """
+    Run the engine over a full history.
+
+    Returns
+    -------
+    frame : pd.DataFrame
+        `bars` price columns followed by the indicator columns.
+    checkpoint : IndicatorState
+        State positioned CHECKPOINT_BARS bars before the end, to be saved with
+        `save_checkpoint` once the frame is written.
+    """
+    ind, checkpoint = _run(IndicatorState(kc_mamode), bars)
+    prices = bars[[c for c in BAR_COLUMNS if c in bars.columns]]
+    return pd.concat([prices, ind], axis=1), checkpoint
+
+
+def rebuild_indicators(csv_path, kc_mamode: str = None) -> IndicatorState:
+    """
+    Recompute every indicator column of a stored CSV over its full history and
+    save the checkpoint. Used to bootstrap the checkpoint for existing files
+    and after price corrections before it. The Keltner mode comes from the
+    header (see `resolve_mamode`); other columns keep their values and place.
+    """
+    df = pd.read_csv(csv_path, index_col=0, parse_dates=[0])
+    df.index.name = 'Date'
+    state = IndicatorState(resolve_mamode(csv_path, kc_mamode))
+    df[state.columns], checkpoint = _run(state, df)
+    df.to_csv(csv_path)
+    save_checkpoint(csv_path, checkpoint)
+    return checkpoint
+
+
+def refresh_tail(csv_path, kc_mamode: str = None) -> IndicatorState:
+    """
+    Recompute the indicator columns of the bars after the saved checkpoint,
+    rewrite only those rows and move the checkpoint forward.
+
+    Falls back to `rebuild_indicators` when there is no checkpoint, it was
+    built for another Keltner mode, its bar is no longer in the file, or the
+    file lacks the indicator columns.
+    """
+    from .utils import read_csv_tail
+
+    kc_mamode = resolve_mamode(csv_path, kc_mamode)
+    checkpoint = load_checkpoint(csv_path)
+    if checkpoint is None or checkpoint.kc_mamode != kc_mamode:
+        return rebuild_indicators(csv_path, kc_mamode)
+
+    # Parse back from the end until the checkpoint's bar is reached
+    since = pd.Timestamp(checkpoint.last_date) if checkpoint.last_date else None
+    n = 2 * CHECKPOINT_BARS
+    while True:
+        _, tail = read_csv_tail(csv_path, n)
+        if len(tail) < n or (since is not None and tail.index.min() <= since):
+            break
+        n *= 4
+    if since is not None and since not in tail.index:
+        return rebuild_indicators(csv_path, kc_mamode)
+    if any(c not in tail.columns for c in checkpoint.columns):
+        return rebuild_indicators(csv_path, kc_mamode)
+
+    k = len(tail) if since is None else int((tail.index > since).sum())
+    if k == 0:
+        return checkpoint
+    offset, rows = read_csv_tail(csv_path, k)
+    rows[checkpoint.columns], new_checkpoint = _run(checkpoint, rows)
+    with open(csv_path, 'rb+') as f:
+        f.truncate(offset)
+    rows.to_csv(csv_path, mode='a', header=False)
+    save_checkpoint(csv_path, new_checkpoint)
+    return new_checkpoint
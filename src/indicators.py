@@ -0,0 +1,320 @@
+# src/indicators.py
+
+"""
+Fused indicator kernels on contiguous float64 arrays.
+
+`add_indicators` computes the Keltner channel, RSI, MACD, Elder Force Index and
+ATR used by the rule-based backtests in one pass: OHLCV columns are pulled out
+once as float64 arrays, every indicator is computed on arrays, and the results
+are attached to a new frame that shares the input's column buffers instead of
+copying the frame once per indicator.
+
+RSI, MACD, EFI and ATR reproduce pandas_ta 0.3.14b (rsi, macd, efi, atr), the
+version that wrote the stored CSV indicator columns; the Keltner channel is the
+repo's own EMA / high-low-range variant from `src.utils.compute_keltner`.
+"""
+
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from . import schema
+
+
+def float_array(values) -> np.ndarray:
+    return np.ascontiguousarray(values, dtype=np.float64)
+
+
+def ewm_mean(x: np.ndarray, com: float, adjust: bool = False, min_periods: int = 0) -> np.ndarray:
+    """
+    Exponentially weighted mean of an array (pandas ewm().mean() semantics).
+    """
+    # pandas' compiled EWM recursion, run on a Series view of the array
+    return pd.Series(x, copy=False).ewm(com=com, adjust=adjust, min_periods=min_periods).mean().to_numpy()
+
+
+def ema(x: np.ndarray, span: int) -> np.ndarray:
+    """
+    Plain EMA: ewm(span, adjust=False), seeded with the first value.
+    """
+    return ewm_mean(x, com=(span - 1) / 2.0)
+
+
+def ta_ema(x: np.ndarray, length: int) -> np.ndarray:
+    """
+    pandas_ta ema: SMA of the first `length` values as seed, then ewm(span, adjust=False).
+    """
+    if len(x) < length:
+        return np.full(len(x), np.nan)
+    x = x.copy()
+    head = x[:length]
+    mask = ~np.isnan(head)
+    x[length - 1] = np.where(mask, head, 0.0).sum() / mask.sum() if mask.any() else np.nan
+    x[:length - 1] = np.nan
+    return ewm_mean(x, com=(length - 1) / 2.0)
+
+
+def rma(x: np.ndarray, length: int) -> np.ndarray:
+    """
+    Wilder smoothing as in pandas_ta rma: ewm(alpha=1/length, min_periods=length).
+    """
+    return ewm_mean(x, com=1.0 / (1.0 / length) - 1.0, adjust=True, min_periods=length)
+
+
+def rolling_mean(x: np.ndarray, window: int) -> np.ndarray:
+    """
+    Trailing mean over `window` values, NaN until the first full window.
+    """
+    out = np.full(len(x), np.nan)
+    if len(x) >= window:
+        out[window - 1:] = sliding_window_view(x, window).mean(axis=1)
+    return out
+
+
+def true_range(high: np.ndarray, low: np.ndarray, close: np.ndarray) -> np.ndarray:
+    """
+    pandas_ta true_range (drift 1): NaN on the first bar.
+    """
+    hl = high - low
+    if (hl == 0).any():
+        # pandas_ta's non_zero_range nudges the whole series off zero
+        hl = hl + np.finfo(float).eps
+    prev = np.empty_like(close)
+    prev[0] = np.nan
+    prev[1:] = close[:-1]
+    tr = np.fmax(np.abs(hl), np.fmax(np.abs(high - prev), np.abs(prev - low)))
+    tr[0] = np.nan
+    return tr
+
+
+def keltner(close: np.ndarray, high: np.ndarray, low: np.ndarray,
+            period: int = 20, multiplier: float = 3.0):
+    """
+    Repo Keltner channel: EMA(period) of Close ± multiplier × SMA(period) of High-Low.
+
+    Returns
+    -------
+    tuple of np.ndarray
+        (ema, atr, lower, middle, upper)
+    """
+    mid = ema(close, period)
+    atr = rolling_mean(high - low, period)
+    return mid, atr, mid - multiplier * atr, mid, mid + multiplier * atr
+
+
+def ta_keltner(close: np.ndarray, high: np.ndarray, low: np.ndarray,
+               period: int = 20, multiplier: float = 3.0, mamode: str = 'ema'):
+    """
+    pandas_ta kc (the stored KCL?/KCB?/KCU? columns): MA(period) of Close ±
+    multiplier × MA(period) of the true range, with 'ema' or 'sma' averages.
+
+    Returns
+    -------
+    tuple of np.ndarray
+        (basis, band, lower, middle, upper)
+    """
+    if mamode not in ('ema', 'sma'):
+        raise ValueError(f"Unsupported Keltner mamode: {mamode}")
+    ma = ta_ema if mamode == 'ema' else rolling_mean
+    basis = ma(close, period)
+    band = ma(true_range(high, low, close), period)
+    return basis, band, basis - multiplier * band, basis, basis + multiplier * band
+
+
+class BandSweep(NamedTuple):
+    """
+    Keltner channels for several (period, multiplier) pairs over one history.
+
+    Column k of every matrix belongs to ``params[k]``.
+    """
+    index: pd.DatetimeIndex
+    params: list
+    lower: np.ndarray
+    middle: np.ndarray
+    upper: np.ndarray
+    touches: np.ndarray
+
+    def param_index(self, period: int, multiplier: float) -> int:
+        return self.params.index((period, float(multiplier)))
+
+    def columns(self, param: int, index: pd.Index = None) -> dict:
+        """
+        Bands and touch flags of one parameter pair as canonical columns
+        ('KC_lower', 'KC_middle', 'KC_upper', 'Touch'), optionally aligned
+        to the dates of `index`.
+        """
+        rows = slice(None)
+        if index is not None and not index.equals(self.index):
+            rows = self.index.get_indexer(index)
+            if (rows < 0).any():
+                raise ValueError("Sweep does not cover every requested date")
+        return {
+            'KC_lower':  self.lower[rows, param],
+            'KC_middle': self.middle[rows, param],
+            'KC_upper':  self.upper[rows, param],
+            'Touch':     self.touches[rows, param],
+        }
+
+
+def keltner_sweep(df: pd.DataFrame, periods, multipliers) -> BandSweep:
+    """
+    Keltner channels (see `keltner`) for every period × multiplier pair in one pass.
+
+    The EMA and high-low ATR are computed once per period and shared by all
+    multipliers; the bands for each period are a single broadcast.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Bars with 'Open', 'High', 'Low', 'Close'.
+    periods : iterable of int
+        Channel lengths.
+    multipliers : iterable of float
+        Band multipliers.
+
+    Returns
+    -------
+    BandSweep
+        (n_bars × n_params) lower/middle/upper matrices and a boolean touch
+        matrix (any OHLC price <= the lower band), parameters ordered
+        period-major: [(p0, m0), (p0, m1), ..., (p1, m0), ...].
+    """
+    high, low = float_array(df['High']), float_array(df['Low'])
+    close = float_array(df['Close'])
+    periods = list(periods)
+    mults = np.asarray(list(multipliers), dtype=np.float64)
+    n, m = len(close), len(mults)
+
+    lower = np.empty((n, len(periods) * m))
+    middle = np.empty_like(lower)
+    upper = np.empty_like(lower)
+    hl = high - low
+    for j, period in enumerate(periods):
+        mid = ema(close, period)
+        atr = rolling_mean(hl, period)
+        block = slice(j * m, (j + 1) * m)
+        width = mults[None, :] * atr[:, None]
+        lower[:, block] = mid[:, None] - width
+        middle[:, block] = mid[:, None]
+        upper[:, block] = mid[:, None] + width
+
+    # Any OHLC <= lower is the same as the lowest non-NaN price <= lower
+    floor = np.fmin.reduce([float_array(df['Open']), high, low, close])
+    touches = floor[:, None] <= lower
+
+    params = [(p, float(k)) for p in periods for k in mults]
+    return BandSweep(df.index, params, lower, middle, upper, touches)
+
+
+def rsi(close: np.ndarray, length: int = 14) -> np.ndarray:
+    """
+    pandas_ta rsi.
+    """
+    diff = np.empty_like(close)
+    diff[0] = np.nan
+    diff[1:] = np.diff(close)
+    up = np.where(diff < 0, 0.0, diff)
+    down = np.where(diff > 0, 0.0, diff)
+    up_avg, down_avg = rma(up, length), rma(down, length)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return 100 * up_avg / (up_avg + np.abs(down_avg))
+
+
+def macd(close: np.ndarray, fast: int = 12, slow: int = 26, signal: int = 9):
+    """
+    pandas_ta macd.
+
+    Returns
+    -------
+    tuple of np.ndarray
+        (macd, signal, histogram)
+    """
+    line = ta_ema(close, fast) - ta_ema(close, slow)
+    sig = np.full(len(line), np.nan)
+    valid = np.flatnonzero(~np.isnan(line))
+    if len(valid):
+        sig[valid[0]:] = ta_ema(line[valid[0]:], signal)
+    return line, sig, line - sig
+
+
+def efi(close: np.ndarray, volume: np.ndarray, length: int = 2) -> np.ndarray:
+    """
+    pandas_ta efi (EMA mode).
+    """
+    pv = np.empty_like(close)
+    pv[0] = np.nan
+    pv[1:] = np.diff(close) * volume[1:]
+    return ta_ema(pv, length)
+
+
+def atr(high: np.ndarray, low: np.ndarray, close: np.ndarray, length: int = 14) -> np.ndarray:
+    """
+    pandas_ta atr (RMA of true range).
+    """
+    return rma(true_range(high, low, close), length)
+
+
+def add_indicators(
+    df: pd.DataFrame,
+    keltner_period: int = 20,
+    keltner_multiplier: float = 3.0,
+    rsi_period: int = 14,
+    efi_length: int = 2,
+    atr_period: int = 14,
+) -> pd.DataFrame:
+    """
+    Compute every indicator used by the rule-based backtests in one pass.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Daily bars with 'Open', 'High', 'Low', 'Close', 'Volume'. It is not modified.
+    keltner_period, keltner_multiplier : int, float
+        Keltner channel settings (see `src.utils.compute_keltner`).
+    rsi_period, efi_length, atr_period : int
+        Lengths for RSI, Elder Force Index and ATR.
+
+    Returns
+    -------
+    pd.DataFrame
+        New frame sharing `df`'s column buffers, with 'EMA20', 'ATR20',
+        'KC_lower', 'KC_middle', 'KC_upper', 'RSI_14', 'MACD', 'MACD_Signal',
+        'MACD_Hist', 'EFI' and 'ATR' added (replacing same-named columns).
+    """
+    high, low = float_array(df['High']), float_array(df['Low'])
+    close, volume = float_array(df['Close']), float_array(df['Volume'])
+
+    ema_k, atr_k, lower, middle, upper = keltner(close, high, low, keltner_period, keltner_multiplier)
+    macd_line, macd_sig, macd_hist = macd(close)
+    out = {
+        'EMA20':       ema_k,
+        'ATR20':       atr_k,
+        'KC_lower':    lower,
+        'KC_middle':   middle,
+        'KC_upper':    upper,
+        'RSI_14':      rsi(close, rsi_period),
+        'MACD':        macd_line,
+        'MACD_Signal': macd_sig,
+        'MACD_Hist':   macd_hist,
+        'EFI':         efi(close, volume, efi_length),
+        'ATR':         atr(high, low, close, atr_period),
+    }
+    return schema.record_params(
+        attach_columns(df, out),
+        keltner={'mamode': 'ema', 'bands': 'hl', 'length': keltner_period, 'scalar': keltner_multiplier},
+        macd={'fast': 12, 'slow': 26, 'signal': 9},
+        efi={'length': efi_length},
+    )
+
+
+def attach_columns(df: pd.DataFrame, columns: dict) -> pd.DataFrame:
+    """
+    Return a frame with `df`'s columns plus `columns`, without copying `df`'s data.
+    """
+    data = {c: df[c].to_numpy() for c in df.columns if c not in columns}
+    data.update(columns)
+    out = pd.DataFrame(data, index=df.index, copy=False)
+    out.attrs.update(df.attrs)
+    return out
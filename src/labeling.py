@@ -1,9 +1,32 @@
 # src/labeling.py
 
+import numpy as np
 import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
 from typing import List
 
 
+def _first_bounce(df_full: pd.DataFrame, touch_dates, horizon: int):
+    """
+    Touch-day closes and the offset (1..horizon) of the first later Close above
+    them, for every touch date at once. Offset is 0 where no bounce occurs.
+    """
+    index = df_full.index
+    pos = index.get_indexer(pd.DatetimeIndex(touch_dates))
+    if (pos < 0).any():
+        raise KeyError(list(pd.DatetimeIndex(touch_dates)[pos < 0]))
+
+    close = df_full['Close'].to_numpy(dtype=float)
+    # Row k of `future` holds the `horizon` closes after bar k (NaN past the end)
+    padded = np.concatenate([close, np.full(horizon, np.nan)])
+    future = sliding_window_view(padded[1:], horizon)[pos]
+
+    close_t = close[pos]
+    bounced = future > close_t[:, None]
+    offset = np.where(bounced.any(axis=1), bounced.argmax(axis=1) + 1, 0)
+    return pos, close_t, offset
+
+
 def label_reversals(
     df_full: pd.DataFrame,
     touch_dates: List[pd.Timestamp],
@@ -33,39 +56,51 @@ def label_reversals(
         - 'First_Reversal_Day': int offset of first bounce day or None
         - 'First_Reversal_Date': Date of first bounce or None
     """
-    records = []
-    for dt in touch_dates:
-        close_t = df_full.at[dt, 'Close']
-        # position of touch date in full index
-        loc = df_full.index.get_loc(dt)
-        max_off = max(lookahead)
-        # slice next max_off days
-        future_index = df_full.index[loc+1: loc+1+max_off]
-        future_closes = df_full.loc[future_index, 'Close']
-
-        bounced = future_closes.gt(close_t)
-        if bounced.any():
-            # first date where True
-            first_date = bounced.idxmax()
-            first_offset = df_full.index.get_loc(first_date) - loc
-            rec = {
-                'Date': dt,
-                'Close_t': close_t,
-                'Reversal': True,
-                'First_Reversal_Day': first_offset,
-                'First_Reversal_Date': first_date
-            }
-        else:
-            rec = {
-                'Date': dt,
-                'Close_t': close_t,
-                'Reversal': False,
-                'First_Reversal_Day': None,
-                'First_Reversal_Date': None
-            }
-        records.append(rec)
-
-    out = pd.DataFrame(records).set_index('Date')
+    pos, close_t, offset = _first_bounce(df_full, touch_dates, max(lookahead))
+    found = offset > 0
+
+    if found.any():
+        first_day = offset if found.all() else np.where(found, offset, np.nan)
+        first_date = df_full.index[np.where(found, pos + offset, 0)].where(found, pd.NaT)
+    else:
+        # No bounce at all: object columns of None, as the per-event records gave
+        first_day = first_date = np.full(len(pos), None, dtype=object)
+
+    out = pd.DataFrame({
+        'Close_t': close_t,
+        'Reversal': found,
+        'First_Reversal_Day': first_day,
+        'First_Reversal_Date': first_date,
+    }, index=pd.DatetimeIndex(touch_dates, name='Date'))
     return out
 
 
+def label_matrix(
+    df_full: pd.DataFrame,
+    touch_dates: List[pd.Timestamp],
+    horizons: List[int] = [1, 2, 3, 4, 5]
+) -> pd.DataFrame:
+    """
+    Reversal labels for several lookahead horizons in one pass.
+
+    Parameters
+    ----------
+    df_full : pd.DataFrame
+        Full daily data indexed by Date with at least a 'Close' column.
+    touch_dates : List[pd.Timestamp]
+        Dates where price touched/crossed KC_lower.
+    horizons : List[int]
+        Lookahead windows (in trading days).
+
+    Returns
+    -------
+    pd.DataFrame
+        Indexed by touch_dates with 'Close_t', 'First_Reversal_Day' (0 if no
+        bounce within the longest horizon) and one bool column 'Reversal_{h}'
+        per horizon, equal to label_reversals(..., lookahead=[h])['Reversal'].
+    """
+    _, close_t, offset = _first_bounce(df_full, touch_dates, max(horizons))
+    out = {'Close_t': close_t, 'First_Reversal_Day': offset}
+    for h in horizons:
+        out[f'Reversal_{h}'] = (offset > 0) & (offset <= h)
+    return pd.DataFrame(out, index=pd.DatetimeIndex(touch_dates, name='Date'))
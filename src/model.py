@@ -1,16 +1,63 @@
 # src/model.py
 
+import math
+import os
+import warnings
+
+import numpy as np
+
+from joblib import Parallel, delayed
 from sklearn.pipeline import Pipeline
 from sklearn.preprocessing import StandardScaler
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.model_selection import GridSearchCV, TimeSeriesSplit
 
+from src.backtest import evaluate_preds
+
+# Thread pools capped in each worker process so N workers don't oversubscribe the cores
+THREAD_ENV_VARS = ["OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS", "LOKY_MAX_CPU_COUNT"]
+
+
+def limit_threads(threads: int):
+    """
+    Cap the BLAS/OpenMP pools of this process (and of the loky workers it
+    spawns) at `threads`; meant as a ProcessPoolExecutor initializer.
+    """
+    for var in THREAD_ENV_VARS:
+        os.environ[var] = str(threads)
+    from threadpoolctl import threadpool_limits
+    threadpool_limits(threads)
+
+
+def build_pipeline(params: dict = None) -> Pipeline:
+    """
+    Unfitted scaling + RandomForest pipeline with the consensus defaults,
+    optionally overridden by `params` (e.g. {'clf__max_depth': 10}).
+    """
+    # Base pipeline with consensus defaults
+    pipeline = Pipeline([
+        ('scaler', StandardScaler()),
+        ('clf', RandomForestClassifier(
+            n_estimators=50,        # from consensus_params.json
+            max_depth=5,            # cast float → int
+            min_samples_leaf=1,
+            max_features='sqrt',
+            class_weight='balanced',
+            random_state=42
+        ))
+    ])
+    if params:
+        pipeline.set_params(**params)
+    return pipeline
+
 
 def train_model(
     X_train,
     y_train,
     param_grid: dict = None,
-    cv_splits: int = 5
+    cv_splits: int = 5,
+    params: dict = None,
+    n_jobs: int = -1
 ):
     """
     Train a RandomForest-based model within a pipeline (scaling + classifier).
@@ -25,6 +72,11 @@ def train_model(
         Hyperparameter grid for GridSearchCV. If None, uses default params.
     cv_splits : int
         Number of splits for TimeSeriesSplit cross-validation.
+    params : dict, optional
+        Pipeline parameters (e.g. {'clf__max_depth': 10}) overriding the
+        consensus defaults.
+    n_jobs : int
+        Parallel jobs of the grid search.
 
     Returns
     -------
@@ -38,18 +90,7 @@ def train_model(
     If param_grid is provided, does a GridSearchCV over it, otherwise uses
     the consensus defaults baked into the classifier.
     """
-    # Base pipeline with consensus defaults
-    pipeline = Pipeline([
-        ('scaler', StandardScaler()),
-        ('clf', RandomForestClassifier(
-            n_estimators=50,        # from consensus_params.json
-            max_depth=5,            # cast float → int
-            min_samples_leaf=1,
-            max_features='sqrt',
-            class_weight='balanced',
-            random_state=42
-        ))
-    ])
+    pipeline = build_pipeline(params)
 
     # If someone passes a grid, still let them re−tune
     if param_grid:
@@ -59,10 +100,87 @@ def train_model(
             param_grid,
             cv=tscv,
             scoring='f1',
-            n_jobs=-1
+            n_jobs=n_jobs
         )
         grid.fit(X_train, y_train)
         return grid
     else:
         pipeline.fit(X_train, y_train)
-        return pipeline
\ No newline at end of file
+        return pipeline
+
+
+def _fit_fold(X, y, train_idx, test_idx, params):
+    model = train_model(X.iloc[train_idx], y.iloc[train_idx], params=params)
+    return evaluate_preds(y.iloc[test_idx], model.predict(X.iloc[test_idx]))
+
+
+def _warm_folds(X, y, splits, params, refresh, n_jobs):
+    # Expanding-window folds: every training set contains the previous one,
+    # so trees grown on it are still valid (no test rows leak in). Each fold
+    # keeps the newest trees of the previous forest and replaces the oldest
+    # `refresh` share with trees grown on the enlarged training set. The
+    # scaler stays the one fitted on the first fold; the trees do not depend
+    # on the scaling, only on it being applied consistently.
+    model, metrics = None, []
+    for train_idx, test_idx in splits:
+        X_train, y_train = X.iloc[train_idx], y.iloc[train_idx]
+        if model is None or not np.array_equal(np.unique(y_train), clf.classes_):
+            # Trees of a forest must share its classes; start over if they change
+            model = train_model(X_train, y_train, params=params)
+            clf = model.named_steps['clf']
+            clf.set_params(warm_start=True, n_jobs=n_jobs)
+            size = clf.n_estimators
+        else:
+            keep = size - max(1, math.ceil(size * refresh))
+            clf.estimators_ = clf.estimators_[len(clf.estimators_) - keep:]
+            with warnings.catch_warnings():
+                # class_weight='balanced' is recomputed on each fit's data,
+                # which is what the new trees should see
+                warnings.simplefilter('ignore', UserWarning)
+                clf.fit(model.named_steps['scaler'].transform(X_train), y_train)
+        metrics.append(evaluate_preds(y.iloc[test_idx], model.predict(X.iloc[test_idx])))
+    return metrics
+
+
+def cross_validate(X, y, n_splits: int = 5, n_jobs: int = 1, warm_start: bool = False,
+                   refresh: float = 0.5, params: dict = None):
+    """
+    TimeSeriesSplit cross-validation of `train_model` plus the final fit on all data.
+
+    Parameters
+    ----------
+    X, y : pd.DataFrame, pd.Series
+        Features and labels in time order.
+    n_splits : int
+        Number of expanding-window folds.
+    n_jobs : int
+        Parallel jobs. The folds and the final fit are independent fits and
+        run concurrently; fold metrics are identical to fitting them one
+        after another. With warm_start the folds run in order and n_jobs
+        parallelizes the tree fits within each one.
+    warm_start : bool
+        Reuse trees across folds instead of refitting every fold from
+        scratch: fold k keeps the newest (1 - refresh) share of fold k-1's
+        trees and grows the rest on its own training set. Forests keep the
+        same size, so metrics stay comparable, at roughly `refresh` of the
+        cost of later folds.
+    refresh : float
+        Share of trees regrown per fold when warm-starting.
+    params : dict, optional
+        Pipeline parameters passed to `train_model`.
+
+    Returns
+    -------
+    (list of dict, estimator)
+        Per-fold metrics ('precision', 'recall', 'f1') and the pipeline fitted
+        on all of X, y.
+    """
+    splits = list(TimeSeriesSplit(n_splits=n_splits).split(X))
+    if warm_start:
+        metrics = _warm_folds(X, y, splits, params, refresh, n_jobs)
+        return metrics, train_model(X, y, params=params)
+
+    jobs = [delayed(_fit_fold)(X, y, tr, te, params) for tr, te in splits]
+    jobs.append(delayed(train_model)(X, y, params=params))
+    *metrics, final = Parallel(n_jobs=n_jobs, prefer='threads')(jobs)
+    return metrics, final
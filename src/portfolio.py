@@ -0,0 +1,266 @@
+# src/portfolio.py
+
+"""
+Portfolio-level simulation of per-ticker trade signals on a common calendar.
+
+The backtests produce trades per ticker as if each one had unlimited capital
+to itself. This module replays the trades of every ticker together: all
+closes are aligned onto one trading calendar as a dense (days × tickers)
+array, and the signals are processed day by day against a single account
+with limited cash, a maximum number of open positions and a per-position
+size (a fraction of current equity).
+
+Only days with an entry or exit are visited in Python, and each visit costs a
+vector operation over the open positions. The equity curve is then
+marked to market for every calendar day at once from the cumulative
+share matrix.
+
+Run the default rule-based strategy over src/tickers.txt with:
+
+    python -m src.portfolio [--capital 100000] [--max-positions 10] [--position-size 0.1]
+"""
+
+import argparse
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from src.strategy import DAILY_DIR, StrategyConfig, backtest_ticker
+from src.utils import load_csv
+
+TICKERS_FILE = "src/tickers.txt"
+RESULTS_DIR = "results"
+
+TRADING_DAYS = 252
+
+
+@dataclass(frozen=True)
+class PortfolioConfig:
+    """
+    Account constraints of one simulation.
+    """
+    initial_capital: float = 100_000.0
+    max_positions: int = 10
+    position_size: float = 0.1  # fraction of equity committed to each new position
+
+
+class Calendar(NamedTuple):
+    """
+    Closes of several tickers on the union of their trading days.
+
+    Column k of `close` belongs to ``tickers[k]``. Prices are forward-filled
+    over days a ticker did not trade and NaN before its first bar.
+    """
+    dates: pd.DatetimeIndex
+    tickers: list
+    close: np.ndarray
+
+
+def build_calendar(tickers, daily_dir: str = DAILY_DIR) -> Calendar:
+    """
+    Load the daily closes of `tickers` onto one calendar; unreadable tickers
+    are reported and left out.
+    """
+    series = {}
+    for ticker in tickers:
+        try:
+            series[ticker] = load_csv(f"{daily_dir}/{ticker}_daily.csv")['Close']
+        except (OSError, KeyError, ValueError) as e:
+            print(f"Skipping {ticker}: {e}")
+    if not series:
+        return Calendar(pd.DatetimeIndex([]), [], np.empty((0, 0)))
+
+    dates = pd.DatetimeIndex(np.unique(np.concatenate([s.index.to_numpy() for s in series.values()])))
+    close = np.full((len(dates), len(series)), np.nan)
+    for k, s in enumerate(series.values()):
+        close[dates.searchsorted(s.index), k] = s.to_numpy(dtype=float)
+    close = pd.DataFrame(close).ffill().to_numpy()
+    return Calendar(dates, list(series), close)
+
+
+def simulate(trades: pd.DataFrame, calendar: Calendar, config: PortfolioConfig = None,
+             rank_by: str = None) -> tuple:
+    """
+    Replay trade signals of many tickers through one capital-constrained account.
+
+    On every day, positions due to exit are closed first, then the day's
+    entries are taken in order (by descending `rank_by`, else table order)
+    while a position slot and cash are free. Each entry buys
+    ``position_size × equity`` (equity marked at that day's closes after the
+    exits), or the remaining cash if less, in fractional shares. A ticker
+    already held is not bought again. Trades entering and exiting on the same
+    day are allowed.
+
+    Parameters
+    ----------
+    trades : pd.DataFrame
+        Signals with 'Ticker', 'Entry Date', 'Exit Date', 'Buy Price' and
+        'Sell Price' (the src.strategy trade schema). Trades of tickers or
+        dates missing from the calendar are ignored.
+    calendar : Calendar
+        Output of `build_calendar`.
+    config : PortfolioConfig, optional
+        Account constraints (defaults to PortfolioConfig()).
+    rank_by : str, optional
+        Column ranking same-day entries, higher first.
+
+    Returns
+    -------
+    (pd.DataFrame, pd.DataFrame)
+        Equity curve indexed by calendar date, with columns 'Cash',
+        'Holdings', 'Equity', 'Positions' and 'Drawdown %'; and the trades
+        taken, with 'Shares' and 'PnL' appended.
+    """
+    config = config or PortfolioConfig()
+    n_days = len(calendar.dates)
+    col_of = {t: k for k, t in enumerate(calendar.tickers)}
+
+    signals = trades.reset_index(drop=True)
+    if rank_by is not None:
+        signals = signals.sort_values(rank_by, ascending=False, kind='stable')
+    col = signals['Ticker'].map(col_of).fillna(-1).to_numpy(dtype=np.int64)
+    erow = calendar.dates.get_indexer(pd.DatetimeIndex(signals['Entry Date']))
+    xrow = calendar.dates.get_indexer(pd.DatetimeIndex(signals['Exit Date']))
+    ok = (col >= 0) & (erow >= 0) & (xrow >= erow)
+    signals, col, erow, xrow = signals[ok], col[ok], erow[ok], xrow[ok]
+    buy = signals['Buy Price'].to_numpy(dtype=float)
+    sell = signals['Sell Price'].to_numpy(dtype=float)
+
+    # Signal positions grouped by entry day, in priority order
+    order = np.argsort(erow, kind='stable')
+    days, starts = np.unique(erow[order], return_index=True)
+    by_day = dict(zip(days, np.split(order, starts[1:])))
+    event_days = np.union1d(erow, xrow)
+
+    cash = config.initial_capital
+    shares = np.zeros(len(signals))
+    held = np.zeros(len(calendar.tickers), dtype=bool)
+    open_ = np.empty(0, dtype=np.int64)
+    for day in event_days:
+        # Exits first, so their cash and slots are free for today's entries
+        due = xrow[open_] == day
+        if due.any():
+            cash += shares[open_[due]] @ sell[open_[due]]
+            held[col[open_[due]]] = False
+            open_ = open_[~due]
+
+        taken = []
+        equity = cash + shares[open_] @ calendar.close[day, col[open_]]
+        for i in by_day.get(day, ()):
+            if len(open_) + len(taken) >= config.max_positions:
+                break
+            if held[col[i]] or cash <= 0 or not buy[i] > 0:
+                continue
+            size = min(config.position_size * equity, cash)
+            shares[i] = size / buy[i]
+            cash -= size
+            held[col[i]] = True
+            taken.append(i)
+
+        if taken:
+            taken = np.asarray(taken, dtype=np.int64)
+            same_day = xrow[taken] == day
+            cash += shares[taken[same_day]] @ sell[taken[same_day]]
+            held[col[taken[same_day]]] = False
+            open_ = np.concatenate([open_, taken[~same_day]])
+
+    # Daily mark-to-market from cumulative share and cash changes
+    t = np.flatnonzero(shares > 0)
+    delta = np.zeros((n_days, len(calendar.tickers)))
+    np.add.at(delta, (erow[t], col[t]), shares[t])
+    np.add.at(delta, (xrow[t], col[t]), -shares[t])
+    holdings = (np.cumsum(delta, axis=0) * np.nan_to_num(calendar.close)).sum(axis=1)
+    flows = np.zeros(n_days)
+    np.add.at(flows, erow[t], -shares[t] * buy[t])
+    np.add.at(flows, xrow[t], shares[t] * sell[t])
+    counts = np.zeros(n_days, dtype=np.int64)
+    np.add.at(counts, erow[t], 1)
+    np.add.at(counts, xrow[t], -1)
+
+    cash_curve = config.initial_capital + np.cumsum(flows)
+    equity = cash_curve + holdings
+    peak = np.maximum.accumulate(equity) if n_days else equity
+    curve = pd.DataFrame({
+        'Cash':       cash_curve,
+        'Holdings':   holdings,
+        'Equity':     equity,
+        'Positions':  np.cumsum(counts),
+        'Drawdown %': 100 * (equity / peak - 1),
+    }, index=calendar.dates)
+
+    fills = signals.iloc[t].copy()
+    fills['Shares'] = shares[t]
+    fills['PnL'] = shares[t] * (sell[t] - buy[t])
+    return curve, fills
+
+
+def portfolio_stats(curve: pd.DataFrame) -> dict:
+    """
+    Headline figures of an equity curve from `simulate`.
+    """
+    equity = curve['Equity'].to_numpy()
+    years = max((curve.index[-1] - curve.index[0]).days / 365.25, 1e-9)
+    daily = np.diff(equity) / equity[:-1]
+    return {
+        'Total Return %': 100 * (equity[-1] / equity[0] - 1),
+        'CAGR %':         100 * ((equity[-1] / equity[0]) ** (1 / years) - 1),
+        'Max Drawdown %': curve['Drawdown %'].min(),
+        'Sharpe':         np.sqrt(TRADING_DAYS) * daily.mean() / daily.std() if daily.std() > 0 else np.nan,
+        'Exposure %':     100 * (curve['Holdings'] / curve['Equity']).mean(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--capital", type=float, default=PortfolioConfig.initial_capital)
+    parser.add_argument("--max-positions", type=int, default=PortfolioConfig.max_positions)
+    parser.add_argument("--position-size", type=float, default=PortfolioConfig.position_size,
+                        help="Fraction of equity per new position")
+    args = parser.parse_args()
+    config = PortfolioConfig(args.capital, args.max_positions, args.position_size)
+
+    tickers = [t.strip().upper() for t in Path(TICKERS_FILE).read_text().splitlines()
+               if t.strip() and not t.startswith("#")]
+
+    t0 = time.perf_counter()
+    calendar = build_calendar(tickers)
+    t1 = time.perf_counter()
+    parts = []
+    for ticker in calendar.tickers:
+        trades = backtest_ticker(ticker, StrategyConfig())
+        if not trades.empty:
+            parts.append(trades)
+    signals = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(
+        columns=['Ticker', 'Entry Date', 'Exit Date', 'Buy Price', 'Sell Price'])
+    t2 = time.perf_counter()
+    curve, fills = simulate(signals, calendar, config)
+    t3 = time.perf_counter()
+
+    print(f"Calendar: {len(calendar.dates)} days × {len(calendar.tickers)} tickers ({t1 - t0:.1f}s)")
+    print(f"Signals: {len(signals)} trades ({t2 - t1:.1f}s)")
+    print(f"Simulated: {len(fills)} trades taken ({t3 - t2:.2f}s)")
+    for name, value in portfolio_stats(curve).items():
+        print(f"  {name}: {value:.2f}")
+
+    Path(RESULTS_DIR).mkdir(exist_ok=True)
+    curve.to_csv(Path(RESULTS_DIR) / "portfolio_equity.csv", index_label="Date")
+    fills.to_csv(Path(RESULTS_DIR) / "portfolio_trades.csv", index=False)
+
+    import matplotlib.pyplot as plt
+    fig, ax = plt.subplots(figsize=(10, 5))
+    curve['Equity'].plot(ax=ax)
+    ax.set_title('Portfolio Equity')
+    ax.set_xlabel('Date')
+    ax.set_ylabel('Equity')
+    fig.tight_layout()
+    fig.savefig(Path(RESULTS_DIR) / "portfolio_equity.png")
+    plt.close(fig)
+    print(f"Saved equity curve to {Path(RESULTS_DIR) / 'portfolio_equity.csv'}")
+
+
+if __name__ == "__main__":
+    main()
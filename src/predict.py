@@ -1,72 +1,161 @@
 #!/usr/bin/env python
 # src/predict.py
+#
+# Score today's lower-band touches (or those of any past day with --as-of):
+#   1) scan every ticker's daily bars for a touch on the as-of bar, reading
+#      only that bar when the stored Keltner bands match the feature spec
+#      (else recomputing them over a short warm-up window)
+#   2) build the weekly as-of features for the touched tickers only, from the
+#      latest weekly touch found by searching back from the as-of date
+#   3) score all of them with one predict_proba call
+#
+# Nothing is labelled and no step walks the full history, so the time per
+# ticker does not grow with its history (see scripts/bench_predict.py).
+#
+# Run:
+#   python -m src.predict [--as-of YYYY-MM-DD] [--threshold 0.6]
+
+import argparse
 
 import joblib
 import pandas as pd
 from pathlib import Path
 
 # Absolute imports to work whether run as module or script
-from src.utils       import load_csv
-from src.detection   import find_daily_touches, find_weekly_touches
-from src.labeling    import label_reversals
-from src.features    import build_feature_matrix
+from src.detection     import window_touches
+from src.feature_store import DAILY_DIR, WEEKLY_DIR, feature_spec
+from src.features      import FEATURE_COLUMNS, align_features
+from src.save_model    import MODEL_PATH
+from src.utils         import load_csv
 
 # Configuration
-MODEL_PATH   = Path("models") / "trend_reversal_rf.pkl"
 TICKERS_FILE = Path("src") / "tickers.txt"
 THRESHOLD    = 0.60
 RESULTS_DIR  = Path("results")
-RESULTS_DIR.mkdir(exist_ok=True)
-
-# Load trained model
-model = joblib.load(MODEL_PATH)
-
-signals = []
-for line in TICKERS_FILE.read_text().splitlines():
-    ticker = line.strip().upper()
-    if not ticker or ticker.startswith("#"):
-        continue
-
-    # 1) Load full history and detect today's touch events
-    df_full      = load_csv(f"stock_historical_information/daily/{ticker}_daily.csv")
-    daily_events = find_daily_touches(ticker)
-    weekly_events= find_weekly_touches(ticker)
-    if daily_events.empty:
-        continue
-
-    # 2) Check if the most recent touch is today
-    today = daily_events.index.max()
-    if today != df_full.index[-1]:
-        continue
-
-    # 3) Label reversals so we have the 'Reversal' column
-    labeled = label_reversals(
-        df_full,
-        daily_events.index.to_list(),
-        lookahead=[1, 2]
-    )
-
-    # 4) Merge labels onto daily events, then isolate today's row
-    events = daily_events.join(
-        labeled[['Close_t', 'Reversal', 'First_Reversal_Day', 'First_Reversal_Date']]
-    )
-    today_events = events.loc[[today]]
-
-    # 5) Build feature matrix for today
-    X, _ = build_feature_matrix(today_events, weekly_events)
-
-    # 6) Predict probability of a reversal
-    prob = model.predict_proba(X)[0, 1]
-    if prob >= THRESHOLD:
-        signals.append({
-            'ticker':      ticker,
-            'date':        today,
-            'probability': prob
-        })
-
-# Save signals for tomorrow's open
-out = pd.DataFrame(signals)
-out_path = RESULTS_DIR / f"signals_{pd.Timestamp.today().date()}.csv"
-out.to_csv(out_path, index=False)
-print(f"Saved {len(signals)} signals to {out_path}")
-print(out.to_string(index=False))
+WEEKLY_CHUNK = 64    # weekly bars in the first block searched back for a touch; doubles per block
+
+
+def touched_on(daily: pd.DataFrame, as_of=None, spec: dict = None):
+    """
+    Date of the as-of bar if it touched the lower Keltner band, else None.
+
+    The as-of bar is the last bar, or the bar dated `as_of` (None if the
+    ticker did not trade that day).
+    """
+    spec = spec or feature_spec()
+    if daily.empty:
+        return None
+    if as_of is None:
+        pos = len(daily) - 1
+    else:
+        pos = daily.index.searchsorted(pd.Timestamp(as_of))
+        if pos == len(daily) or daily.index[pos] != pd.Timestamp(as_of):
+            return None
+
+    touches = window_touches(daily, pos, pos + 1, spec['period'], spec['multiplier'])
+    return daily.index[pos] if len(touches) else None
+
+
+def weekly_touch(weekly: pd.DataFrame, date, spec: dict = None) -> pd.DataFrame:
+    """
+    Latest weekly touch row on or before `date` (empty if there is none).
+
+    Blocks of WEEKLY_CHUNK, 2×WEEKLY_CHUNK, ... bars are searched back from
+    `date`, so the cost follows the distance to that touch rather than the
+    length of the history.
+    """
+    spec = spec or feature_spec()
+    stop = weekly.index.searchsorted(pd.Timestamp(date), side='right')
+    size = WEEKLY_CHUNK
+    while stop > 0:
+        start = max(0, stop - size)
+        touches = window_touches(weekly, start, stop, spec['period'], spec['multiplier'])
+        if len(touches):
+            return touches.iloc[[-1]]
+        stop, size = start, 2 * size
+    return weekly.iloc[:0]
+
+
+def scan(tickers, as_of=None, spec: dict = None) -> list:
+    """
+    (ticker, date) of every ticker whose as-of bar touched the lower band.
+    """
+    hits = []
+    for ticker in tickers:
+        try:
+            date = touched_on(load_csv(f"{DAILY_DIR}/{ticker}_daily.csv"), as_of, spec)
+        except (OSError, KeyError, ValueError) as e:
+            print(f"Skipping {ticker}: {e}")
+            continue
+        if date is not None:
+            hits.append((ticker, date))
+    return hits
+
+
+def feature_rows(hits, spec: dict = None) -> pd.DataFrame:
+    """
+    FEATURE_COLUMNS of each (ticker, date) touch from its latest weekly touch
+    row on or before the date (`weekly_touch`), as the feature store builds
+    them. Touches without complete features are dropped.
+
+    Returns
+    -------
+    pd.DataFrame
+        'ticker' and 'date' followed by the features, one row per touch.
+    """
+    spec = spec or feature_spec()
+    rows = []
+    for ticker, date in hits:
+        weekly = load_csv(f"{WEEKLY_DIR}/{ticker}_weekly.csv")
+        features, keep = align_features(pd.DataFrame(index=pd.DatetimeIndex([date])),
+                                        weekly_touch(weekly, date, spec))
+        if keep[0]:
+            rows.append(features.assign(ticker=ticker, date=date))
+    if not rows:
+        return pd.DataFrame(columns=['ticker', 'date', *FEATURE_COLUMNS])
+    return pd.concat(rows, ignore_index=True)[['ticker', 'date', *FEATURE_COLUMNS]]
+
+
+def score(model, rows: pd.DataFrame, threshold: float = THRESHOLD) -> pd.DataFrame:
+    """
+    Reversal probability of every feature row in one predict_proba call;
+    returns the rows at or above `threshold` as ticker, date, probability.
+    """
+    if rows.empty:
+        return pd.DataFrame(columns=['ticker', 'date', 'probability'])
+    out = rows[['ticker', 'date']].copy()
+    out['probability'] = model.predict_proba(rows[list(FEATURE_COLUMNS)])[:, 1]
+    return out[out['probability'] >= threshold].reset_index(drop=True)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--as-of", default=None, help="Replay the touches of this date (YYYY-MM-DD)")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD)
+    args = parser.parse_args()
+
+    tickers = [
+        line.strip().upper()
+        for line in TICKERS_FILE.read_text().splitlines()
+        if line.strip() and not line.startswith("#")
+    ]
+
+    # Load the universe model (src/save_model.py)
+    model = joblib.load(MODEL_PATH)
+
+    hits = scan(tickers, args.as_of)
+    rows = feature_rows(hits)
+    out = score(model, rows, args.threshold)
+    print(f"{len(hits)} of {len(tickers)} tickers touched the lower band, {len(rows)} with features")
+
+    # Save signals for the next open
+    day = pd.Timestamp(args.as_of).date() if args.as_of else pd.Timestamp.today().date()
+    RESULTS_DIR.mkdir(exist_ok=True)
+    out_path = RESULTS_DIR / f"signals_{day}.csv"
+    out.to_csv(out_path, index=False)
+    print(f"Saved {len(out)} signals to {out_path}")
+    print(out.to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+# src/rate_limit.py
+
+"""
+Rate limiting, retry and thread-pool helpers for the downloaders.
+
+Each provider gets one TokenBucket shared by all worker threads, so the refresh
+runs as fast as the provider's quota allows instead of sleeping a fixed time
+after every request. Fetch functions are plain callables, which lets tests swap
+in a stub that talks to a local HTTP server.
+"""
+
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import wraps
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket.
+
+    Parameters
+    ----------
+    rate : float
+        Tokens added per second (the sustained request rate).
+    capacity : float
+        Maximum tokens held, i.e. the largest burst allowed after idling.
+    """
+
+    def __init__(self, rate: float, capacity: float = 1.0, clock=time.monotonic, sleep=time.sleep):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.capacity = max(capacity, 1.0)
+        self.tokens = self.capacity
+        self.clock = clock
+        self.sleep = sleep
+        self.updated = clock()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def per_minute(cls, requests: float, burst: float = 1.0) -> "TokenBucket":
+        return cls(requests / 60.0, burst)
+
+    def acquire(self, tokens: float = 1.0):
+        """
+        Block until `tokens` are available, then take them.
+        """
+        while True:
+            with self._lock:
+                now = self.clock()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait = (tokens - self.tokens) / self.rate
+            self.sleep(wait)
+
+
+def rate_limited(fetch, limiter: TokenBucket = None, retries: int = 3,
+                 backoff: float = 1.0, max_backoff: float = 60.0):
+    """
+    Wrap a fetch function so every attempt takes a token and failures are retried.
+
+    Parameters
+    ----------
+    fetch : callable
+        Function performing one provider request.
+    limiter : TokenBucket, optional
+        Bucket shared by every caller of the same provider.
+    retries : int
+        Extra attempts after the first failure.
+    backoff : float
+        Base delay in seconds; attempt k waits about backoff * 2**k (with jitter).
+    max_backoff : float
+        Upper bound on a single retry delay.
+
+    Returns
+    -------
+    callable
+        Function with the same signature as `fetch`.
+    """
+    @wraps(fetch)
+    def wrapper(*args, **kwargs):
+        for attempt in range(retries + 1):
+            if limiter is not None:
+                limiter.acquire()
+            try:
+                return fetch(*args, **kwargs)
+            except Exception:
+                if attempt == retries:
+                    raise
+                delay = min(max_backoff, backoff * 2 ** attempt)
+                time.sleep(delay * random.uniform(0.5, 1.0))
+    return wrapper
+
+
+def run_parallel(jobs, func, workers: int = 8) -> dict:
+    """
+    Run func(*job) for every job on a thread pool.
+
+    Parameters
+    ----------
+    jobs : iterable of tuple
+        Positional arguments for each call.
+    func : callable
+        Work function; should handle its own expected errors.
+    workers : int
+        Number of threads.
+
+    Returns
+    -------
+    dict
+        Maps each job tuple to its return value, or to the exception it raised.
+    """
+    results = {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(func, *job): job for job in jobs}
+        for fut in as_completed(futures):
+            job = futures[fut]
+            try:
+                results[job] = fut.result()
+            except Exception as e:
+                results[job] = e
+    return results
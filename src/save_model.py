@@ -1,40 +1,59 @@
 # src/save_model.py
+#
+# Train the universe model that src/predict.py scores with: one pipeline fit
+# on the pooled feature-store rows of every ticker, saved to MODEL_PATH.
+# main.py calls save_model after its per-ticker step; run it alone with:
+#   python -m src.save_model [TICKER ...]
+
+import sys
 
 import joblib
+import pandas as pd
 from pathlib           import Path
 
-from src.utils         import load_csv
-from src.detection     import find_daily_touches, find_weekly_touches
-from src.labeling      import label_reversals
-from src.features      import build_feature_matrix
+from src.feature_store import load_xy
 from src.model         import train_model
 
 
-# Pick one representative ticker (e.g. AAPL) or ensemble later
-TICKER     = "AAPL"
-MODEL_PATH = Path("models") / "trend_reversal_rf.pkl"
-
-# 1. Build X, y on the full history
-df_full      = load_csv(f"stock_historical_information/daily/{TICKER}_daily.csv")
-daily_events = find_daily_touches(TICKER)
-weekly_events= find_weekly_touches(TICKER)
-
-labeled = label_reversals(
-    df_full,
-    daily_events.index.to_list(),
-    lookahead=[1, 2]
-)
-
-events = daily_events.join(
-    labeled[['Close_t','Reversal','First_Reversal_Day','First_Reversal_Date']]
-)
-
-X, y = build_feature_matrix(events, weekly_events)
-
-# 2. Train on all available data
-model = train_model(X, y)
-
-# 3. Save to disk
-MODEL_PATH.parent.mkdir(exist_ok=True)
-joblib.dump(model, MODEL_PATH)
-print(f"Saved model to {MODEL_PATH}")
+MODEL_PATH   = Path("models") / "trend_reversal_rf.pkl"
+TICKERS_FILE = Path("src") / "tickers.txt"
+
+
+def save_model(tickers, path=MODEL_PATH) -> Path:
+    """
+    Fit one model on the touch events of all `tickers` and save it to `path`.
+
+    Tickers whose store cannot be loaded are reported and left out.
+    """
+    Xs, ys = [], []
+    for ticker in tickers:
+        try:
+            # 1. Load X, y on the full history from the feature store
+            X, y = load_xy(ticker)
+        except (OSError, KeyError, ValueError) as e:
+            print(f"Skipping {ticker}: {e}")
+            continue
+        if len(X):
+            Xs.append(X)
+            ys.append(y)
+    if not Xs:
+        raise ValueError("No feature rows to train the universe model on")
+
+    # 2. Train on all available data
+    X, y = pd.concat(Xs, ignore_index=True), pd.concat(ys, ignore_index=True)
+    model = train_model(X, y)
+
+    # 3. Save to disk
+    path = Path(path)
+    path.parent.mkdir(exist_ok=True)
+    joblib.dump(model, path)
+    print(f"Saved universe model ({len(X)} events, {len(Xs)} tickers) to {path}")
+    return path
+
+
+if __name__ == "__main__":
+    tickers = [a.upper() for a in sys.argv[1:]] or [
+        t.strip().upper() for t in TICKERS_FILE.read_text().splitlines()
+        if t.strip() and not t.startswith("#")
+    ]
+    save_model(tickers)
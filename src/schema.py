@@ -0,0 +1,152 @@
+# src/schema.py
+
+"""
+Registry of stored indicator column names.
+
+The downloaders write pandas_ta's own column names, which encode the indicator
+parameters (and, for Keltner, the moving-average mode): ``KCLe_20_3.0`` is the
+lower band of an EMA-based channel of length 20 and scalar 3.0,
+``KCLs_20_3.0`` the SMA-based one, ``MACD_12_26_9`` / ``MACDh_…`` /
+``MACDs_…`` the MACD line, histogram and signal, ``EFI_2`` a 2-bar Elder Force
+Index. `resolve` renames any of these variants to the canonical names the rest
+of the pipeline reads and records the parameters in ``df.attrs['indicator_params']``,
+so callers can decide whether the stored values match what they need.
+
+Two kinds of Keltner channel exist side by side, told apart by the 'bands'
+parameter: 'tr', pandas_ta's kc as stored by the downloaders (moving average
+of Close ± scalar × moving average of the true range), and 'hl', the repo's
+own channel of `src.utils.compute_keltner` (EMA of Close ± scalar × SMA of
+High − Low). Their bands and ATR differ, so one never stands in for the other.
+"""
+
+import re
+
+import pandas as pd
+
+# pattern → (indicator, canonical name per matched part, param names)
+_NUM = r"(\d+(?:\.\d+)?)"
+REGISTRY = [
+    (re.compile(rf"^KC([LBU])([a-z]?)_{_NUM}_{_NUM}$"), 'keltner',
+     {'L': 'KC_lower', 'B': 'KC_middle', 'U': 'KC_upper'}, ('mamode', 'length', 'scalar')),
+    (re.compile(rf"^MACD([hs]?)_{_NUM}_{_NUM}_{_NUM}$"), 'macd',
+     {'': 'MACD', 'h': 'MACD_Hist', 's': 'MACD_Signal'}, ('fast', 'slow', 'signal')),
+    (re.compile(rf"^EFI()_{_NUM}$"), 'efi',
+     {'': 'EFI'}, ('length',)),
+    (re.compile(rf"^EMA()_{_NUM}$"), 'ema',
+     None, ('length',)),
+]
+
+# pandas_ta's mamode initials in Keltner column names
+KC_MAMODES = {'e': 'ema', 's': 'sma', '': None}
+
+# Keltner band kind of the stored columns, which Keltner(length, scalar)
+# means unless a caller asks for another
+KC_BANDS = 'tr'
+
+PARAMS_ATTR = 'indicator_params'
+
+
+def _number(s: str):
+    return float(s) if '.' in s else int(s)
+
+
+def parse_column(name: str):
+    """
+    Identify a pandas_ta indicator column.
+
+    Parameters
+    ----------
+    name : str
+        Column name as written by pandas_ta, e.g. 'KCLe_20_3.0'.
+
+    Returns
+    -------
+    tuple or None
+        (indicator, canonical name, params dict), or None if the name is not
+        a registered variant.
+    """
+    for pattern, indicator, parts, param_names in REGISTRY:
+        m = pattern.match(str(name))
+        if not m:
+            continue
+        part, *values = m.groups()
+        if indicator == 'keltner':
+            params = {'mamode': KC_MAMODES.get(values[0], values[0]), 'bands': 'tr',
+                      'length': _number(values[1]), 'scalar': _number(values[2])}
+        else:
+            params = dict(zip(param_names, map(_number, values)))
+        canonical = parts[part] if parts else f"EMA{params['length']}"
+        return indicator, canonical, params
+    return None
+
+
+def resolve(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Rename stored indicator columns to canonical names, in place.
+
+    Keltner bands become 'KC_lower', 'KC_middle', 'KC_upper' (plus 'ATR{length}',
+    the band's true-range average recovered from the channel width, if
+    absent), MACD columns
+    become 'MACD', 'MACD_Hist', 'MACD_Signal', 'EFI_n' becomes 'EFI' and
+    'EMA_n' becomes 'EMAn'. The parameters of each renamed indicator are stored
+    in ``df.attrs['indicator_params']``, e.g.
+    ``{'keltner': {'mamode': 'ema', 'bands': 'tr', 'length': 20, 'scalar': 3.0}, ...}``.
+
+    When a file carries several variants of one indicator, the first one is
+    used and the others keep their stored names.
+
+    Returns
+    -------
+    pd.DataFrame
+        `df`, for chaining.
+    """
+    rename, params = {}, {}
+    for col in df.columns:
+        parsed = parse_column(col)
+        if parsed is None:
+            continue
+        indicator, canonical, p = parsed
+        key = indicator if indicator != 'ema' else canonical
+        if canonical in df.columns or canonical in rename.values() or params.setdefault(key, p) != p:
+            continue
+        rename[col] = canonical
+    df.rename(columns=rename, inplace=True)
+
+    kc = params.get('keltner')
+    if kc and {'KC_middle', 'KC_upper'} <= set(df.columns):
+        atr_col = f"ATR{kc['length']}"
+        if atr_col not in df.columns:
+            df[atr_col] = (df['KC_upper'] - df['KC_middle']) / kc['scalar']
+
+    df.attrs[PARAMS_ATTR] = params
+    return df
+
+
+def record_params(df: pd.DataFrame, **params) -> pd.DataFrame:
+    """
+    Record the parameters of freshly computed indicators in `df.attrs`, in place.
+    """
+    df.attrs[PARAMS_ATTR] = {**df.attrs.get(PARAMS_ATTR, {}), **params}
+    return df
+
+
+def stored_params(df: pd.DataFrame, indicator: str):
+    """
+    Return the parameters recorded by `resolve` for `indicator`, or None.
+    """
+    return df.attrs.get(PARAMS_ATTR, {}).get(indicator)
+
+
+def keltner_matches(df: pd.DataFrame, period: int, multiplier: float, mamode: str = None,
+                    bands: str = KC_BANDS) -> bool:
+    """
+    True if `df` holds Keltner bands of kind `bands` ('tr' or 'hl', see the
+    module docstring) built with the given length and scalar (and
+    moving-average mode, when one is requested).
+    """
+    kc = stored_params(df, 'keltner')
+    if kc is None or 'KC_lower' not in df.columns:
+        return False
+    return (kc.get('bands') == bands and kc['length'] == period
+            and float(kc['scalar']) == float(multiplier)
+            and (mamode is None or kc['mamode'] == mamode))
@@ -0,0 +1,401 @@
+# src/strategy.py
+
+"""
+Rule-based Keltner bounce strategy as an explicit configuration plus a pure function.
+
+`StrategyConfig` is a frozen (hashable, picklable) dataclass holding every
+switch that used to be a module global of src/backtest_rule_based.py, and
+`run_backtest(frame, config)` depends only on its arguments, so any number of
+configurations can run side by side in threads or worker processes.
+
+The engine is shared with src/filter_grid.py: every entry filter becomes a
+boolean per touch bar, the passing filters of each touch are packed into a
+bitmask, and both exit variants are resolved once for every touch
+(src/exits.py). A configuration then selects its trades with two bit tests:
+
+  - every enabled gate filter (confirmation candle, ATR, MACD divergence) passes
+  - at least one enabled momentum filter (RSI, MACD histogram, Force Index) passes
+
+Indicators are always computed over a ticker's full history. A year (or any
+date range) is a view of that table: its trades are the candidates entering
+inside it whose exit also falls inside it, so no period starts with a NaN
+warm-up and `run_periods` evaluates every year of a ticker in one pass. The
+indicators of a period are thus warmed up on the bars before it, a deliberate
+change from filtering the bars to the year first: those trades differ from a
+backtest on the period's bars alone, mostly in its first weeks.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, fields, replace
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from src.exits import NO_EXIT, fixed_exits, trailing_exits
+from src.indicators import add_indicators, attach_columns
+from src.utils import _load_cache_key, load_csv
+
+DAILY_DIR = "stock_historical_information/daily"
+
+# Bit of each entry filter in a candidate's 'Filters' mask
+FILTER_BITS = {
+    'USE_CONFIRMATION_CANDLE': 1,
+    'USE_RSI_FILTER':          2,
+    'USE_MACD_HIST_FILTER':    4,
+    'USE_FORCE_INDEX_FILTER':  8,
+    'USE_ATR_FILTER':          16,
+    'USE_MACD_DIVERGENCE':     32,
+}
+MOMENTUM_FLAGS = ['USE_RSI_FILTER', 'USE_MACD_HIST_FILTER', 'USE_FORCE_INDEX_FILTER']
+
+# Completed backtests keyed on (data version, config), most recently used last
+RESULT_CACHE_SIZE = 1024
+_result_cache = OrderedDict()
+_result_lock = threading.Lock()
+
+
+@dataclass(frozen=True)
+class StrategyConfig:
+    """
+    Settings of one rule-based backtest run.
+
+    The use_* fields mirror the USE_* columns of configs/filter_config_matrix.csv.
+    """
+    use_confirmation_candle: bool = True
+    use_rsi_filter: bool = True
+    use_macd_hist_filter: bool = True
+    use_force_index_filter: bool = True
+    use_atr_filter: bool = True
+    use_macd_divergence: bool = True
+    use_trailing_exit: bool = True
+    atr_threshold: float = 1.0
+    fixed_hold_days: int = 5
+    year: Optional[int] = None
+
+    @classmethod
+    def from_flags(cls, flags, base: "StrategyConfig" = None) -> "StrategyConfig":
+        """
+        Build a config from a mapping with USE_* keys (e.g. a filter-matrix row),
+        taking every other setting from `base`.
+        """
+        base = base or cls()
+        names = {f.name for f in fields(cls)}
+        values = {k.lower(): bool(v) for k, v in dict(flags).items() if k.lower() in names}
+        return replace(base, **values)
+
+    def flags(self) -> dict:
+        """
+        The filter switches keyed by their USE_* names.
+        """
+        return {k.upper(): v for k, v in asdict(self).items() if k.startswith('use_')}
+
+    def config_hash(self) -> str:
+        """
+        Stable digest of every setting, for persistent result caches.
+        """
+        return hashlib.sha1(json.dumps(asdict(self), sort_keys=True).encode()).hexdigest()[:16]
+
+
+def prepare_frame(df: pd.DataFrame, sweep=None, param: int = 0) -> pd.DataFrame:
+    """
+    Daily bars with every indicator and the 'Touch' column.
+
+    sweep/param: optional src.indicators.BandSweep (built on the ticker's full
+    daily history) and the column of it to trade instead of the default bands.
+    """
+    if df.empty:
+        return df
+
+    df = add_indicators(df)
+
+    if sweep is not None:
+        df = attach_columns(df, sweep.columns(param, df.index))
+    else:
+        df['Touch'] = (
+            (df['Open'] <= df['KC_lower']) |
+            (df['High'] <= df['KC_lower']) |
+            (df['Low']  <= df['KC_lower']) |
+            (df['Close']<= df['KC_lower'])
+        )
+    return df
+
+
+def _lag(x: np.ndarray, k: int = 1) -> np.ndarray:
+    out = np.full(len(x), np.nan)
+    out[k:] = x[:-k]
+    return out
+
+
+def filter_columns(df: pd.DataFrame, atr_threshold: float = 1.0) -> pd.DataFrame:
+    """
+    One boolean column per entry filter, True where the bar passes it
+    (NaN comparisons fail, as in the scalar rules).
+    """
+    close = df['Close'].to_numpy(dtype=float)
+    open_ = df['Open'].to_numpy(dtype=float)
+    hist = df['MACD_Hist'].to_numpy(dtype=float)
+    efi = df['EFI'].to_numpy(dtype=float)
+    macd = df['MACD'].to_numpy(dtype=float)
+
+    # Next bar must close above its open; a missing next bar never trades
+    confirm = np.zeros(len(df), dtype=bool)
+    confirm[:-1] = ~(close[1:] <= open_[1:])
+
+    return pd.DataFrame({
+        'USE_CONFIRMATION_CANDLE': confirm,
+        'USE_RSI_FILTER':          df['RSI_14'].to_numpy(dtype=float) < 30,
+        'USE_MACD_HIST_FILTER':    hist > _lag(hist),
+        'USE_FORCE_INDEX_FILTER':  efi > _lag(efi),
+        'USE_ATR_FILTER':          ~(df['ATR'].to_numpy(dtype=float) < atr_threshold),
+        'USE_MACD_DIVERGENCE':     (close > _lag(close, 5)) & (macd < _lag(macd, 5)),
+    }, index=df.index)
+
+
+def candidate_table(df: pd.DataFrame, ticker: str, atr_threshold: float = 1.0,
+                    hold: int = 5) -> pd.DataFrame:
+    """
+    Every touch bar of a prepared frame that can enter a trade, with its filter
+    bitmask and the exits under both exit variants.
+
+    Returns
+    -------
+    pd.DataFrame
+        Columns 'Ticker', 'Entry Date', 'Buy Price', 'Filters' (uint8) and,
+        per exit variant, 'Trailing Exit' / 'Fixed Exit' bar positions
+        (NO_EXIT when there is none).
+    """
+    close = df['Close'].to_numpy(dtype=float)
+    entries = np.flatnonzero(df['Touch'].to_numpy(dtype=bool)[:-1])
+
+    cols = filter_columns(df, atr_threshold).to_numpy()[entries]
+    bits = np.array([FILTER_BITS[f] for f in FILTER_BITS], dtype=np.uint8)
+    mask = (cols * bits).sum(axis=1).astype(np.uint8)
+
+    return pd.DataFrame({
+        'Ticker':        ticker,
+        'Entry Date':    df.index[entries],
+        'Buy Price':     close[entries],
+        'Filters':       mask,
+        'Trailing Exit': trailing_exits(close, df['KC_middle'].to_numpy(dtype=float), entries),
+        'Fixed Exit':    fixed_exits(len(df), entries, hold),
+    })
+
+
+def period_bounds(index: pd.DatetimeIndex, periods=None) -> list:
+    """
+    Bar positions of each period of a sorted daily index.
+
+    Parameters
+    ----------
+    index : pd.DatetimeIndex
+        Dates of the bars.
+    periods : iterable, optional
+        Calendar years (int) and/or inclusive (start, end) date pairs.
+        Defaults to every year present in `index`.
+
+    Returns
+    -------
+    list of tuple
+        (label, start, stop) per period, where bars start..stop-1 fall inside
+        it; the label is the year or 'start:end'.
+    """
+    if periods is None:
+        periods = sorted(set(index.year))
+    bounds = []
+    for period in periods:
+        if isinstance(period, (int, np.integer)):
+            label = int(period)
+            lo = pd.Timestamp(year=label, month=1, day=1)
+            hi = pd.Timestamp(year=label + 1, month=1, day=1)
+            start, stop = index.searchsorted(lo), index.searchsorted(hi)
+        else:
+            lo, hi = map(pd.Timestamp, period)
+            label = f"{lo.date()}:{hi.date()}"
+            start, stop = index.searchsorted(lo), index.searchsorted(hi, side='right')
+        bounds.append((label, int(start), int(stop)))
+    return bounds
+
+
+def period_candidates(cands: pd.DataFrame, index: pd.DatetimeIndex, start: int, stop: int) -> pd.DataFrame:
+    """
+    The candidates of a full-history table entering on bars start..stop-1:
+    exits past the view's last bar become NO_EXIT. Indicators keep their
+    values from the full history, so this is a backtest of bars ..stop-1
+    trading from `start`, not one of bars start..stop-1 alone.
+    """
+    entry = index.searchsorted(cands['Entry Date'].to_numpy())
+    view = cands[(entry >= start) & (entry < stop)].copy()
+    for col in ('Trailing Exit', 'Fixed Exit'):
+        exits = view[col].to_numpy()
+        view[col] = np.where(exits < stop, exits, NO_EXIT)
+    return view
+
+
+def config_candidates(df: pd.DataFrame, ticker: str, config: StrategyConfig) -> pd.DataFrame:
+    """
+    `candidate_table` of a prepared full-history frame, restricted to config.year.
+    """
+    cands = candidate_table(df, ticker, config.atr_threshold, config.fixed_hold_days)
+    if config.year is None:
+        return cands
+    [(_, start, stop)] = period_bounds(df.index, [config.year])
+    return period_candidates(cands, df.index, start, stop)
+
+
+def config_masks(config: StrategyConfig) -> tuple:
+    """
+    (gate bits that must all pass, momentum bits of which one must pass).
+    """
+    flags = config.flags()
+    gate = sum(bit for f, bit in FILTER_BITS.items() if f not in MOMENTUM_FLAGS and flags[f])
+    momentum = sum(FILTER_BITS[f] for f in MOMENTUM_FLAGS if flags[f])
+    return gate, momentum
+
+
+def trade_arrays(cands: pd.DataFrame, index: pd.DatetimeIndex, close: np.ndarray,
+                 config: StrategyConfig) -> dict:
+    """
+    Trades of one configuration from a ticker's candidate table as arrays
+    ('Entry Date', 'Exit Date', 'Buy Price', 'Sell Price'), or None if there are none.
+    """
+    gate, momentum = config_masks(config)
+    filters = cands['Filters'].to_numpy()
+    exits = cands['Trailing Exit' if config.use_trailing_exit else 'Fixed Exit'].to_numpy()
+    take = ((filters & gate) == gate) & ((filters & momentum) != 0) & (exits != NO_EXIT)
+
+    if not take.any():
+        return None
+    j = exits[take]
+    return {
+        'Entry Date': cands['Entry Date'].to_numpy()[take],
+        'Exit Date':  index.to_numpy()[j],
+        'Buy Price':  cands['Buy Price'].to_numpy()[take],
+        'Sell Price': close[j],
+    }
+
+
+def trades_frame(parts, tickers) -> pd.DataFrame:
+    """
+    Stack `trade_arrays` results (one per entry of `tickers`) into one trade table.
+    """
+    if not parts:
+        return pd.DataFrame()
+    lengths = [len(p['Buy Price']) for p in parts]
+    buy = np.concatenate([p['Buy Price'] for p in parts])
+    sell = np.concatenate([p['Sell Price'] for p in parts])
+    return pd.DataFrame({
+        'Ticker':     np.repeat(np.asarray(tickers, dtype=object), lengths),
+        'Entry Date': np.concatenate([p['Entry Date'] for p in parts]),
+        'Exit Date':  np.concatenate([p['Exit Date'] for p in parts]),
+        'Buy Price':  buy,
+        'Sell Price': sell,
+        'Return %':   100 * (sell - buy) / buy,
+    })
+
+
+def select_trades(cands: pd.DataFrame, index: pd.DatetimeIndex, close: np.ndarray,
+                  config: StrategyConfig) -> pd.DataFrame:
+    """
+    Trades of one configuration from a ticker's candidate table.
+    """
+    arrays = trade_arrays(cands, index, close, config)
+    if arrays is None:
+        return pd.DataFrame()
+    return trades_frame([arrays], [cands['Ticker'].iloc[0]])
+
+
+def run_backtest(frame: pd.DataFrame, config: StrategyConfig, ticker: str = "",
+                 sweep=None, param: int = 0) -> pd.DataFrame:
+    """
+    Backtest the Keltner bounce strategy on one ticker's daily bars.
+
+    Parameters
+    ----------
+    frame : pd.DataFrame
+        Daily bars as returned by load_csv; not modified.
+    config : StrategyConfig
+        Filters, exit variant, ATR threshold and year (indicators still use
+        the bars before it).
+    ticker : str
+        Value of the 'Ticker' column.
+    sweep, param :
+        Optional band sweep column to trade (see `prepare_frame`).
+
+    Returns
+    -------
+    pd.DataFrame
+        One row per trade: 'Ticker', 'Entry Date', 'Exit Date', 'Buy Price',
+        'Sell Price', 'Return %' (empty frame if there are none).
+    """
+    df = prepare_frame(frame, sweep, param)
+    if df.empty:
+        return pd.DataFrame()
+    cands = config_candidates(df, ticker, config)
+    return select_trades(cands, df.index, df['Close'].to_numpy(dtype=float), config)
+
+
+def run_periods(frame: pd.DataFrame, config: StrategyConfig, periods=None, ticker: str = "",
+                sweep=None, param: int = 0) -> pd.DataFrame:
+    """
+    `run_backtest` for several periods from one indicator pass.
+
+    Each period gives the trades `run_backtest` would with config.year set to
+    it; config.year itself is ignored.
+
+    Parameters
+    ----------
+    periods : iterable, optional
+        Years and/or (start, end) date pairs (see `period_bounds`); defaults to
+        every year of `frame`.
+
+    Returns
+    -------
+    pd.DataFrame
+        The `run_backtest` columns preceded by 'Period' (empty frame if there
+        are no trades).
+    """
+    df = prepare_frame(frame, sweep, param)
+    if df.empty:
+        return pd.DataFrame()
+    cands = candidate_table(df, ticker, config.atr_threshold, config.fixed_hold_days)
+    close = df['Close'].to_numpy(dtype=float)
+
+    parts, labels = [], []
+    for label, start, stop in period_bounds(df.index, periods):
+        arrays = trade_arrays(period_candidates(cands, df.index, start, stop), df.index, close, config)
+        if arrays is not None:
+            parts.append(arrays)
+            labels.append(label)
+    out = trades_frame(parts, [ticker] * len(parts))
+    if not out.empty:
+        out.insert(0, 'Period', np.repeat(np.asarray(labels, dtype=object),
+                                          [len(p['Buy Price']) for p in parts]))
+    return out
+
+
+def backtest_ticker(ticker: str, config: StrategyConfig, daily_dir: str = DAILY_DIR) -> pd.DataFrame:
+    """
+    `run_backtest` on a ticker's daily CSV, cached on (data version, config).
+
+    The data version is the CSV's path, mtime and size, so rewriting the file
+    invalidates its results. Returns a copy; safe to call from several threads.
+    """
+    path = os.path.join(daily_dir, f"{ticker}_daily.csv")
+    key = (_load_cache_key(path), config.config_hash())
+    with _result_lock:
+        trades = _result_cache.get(key)
+        if trades is not None:
+            _result_cache.move_to_end(key)
+            return trades.copy()
+
+    trades = run_backtest(load_csv(path), config, ticker)
+    with _result_lock:
+        _result_cache[key] = trades
+        while len(_result_cache) > RESULT_CACHE_SIZE:
+            _result_cache.popitem(last=False)
+    return trades.copy()
@@ -1,31 +1,27 @@
 # src/utils.py
 
+import io
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
 import pandas as pd
 
+from . import bar_store, indicators, schema
 
-def load_csv(path: str) -> pd.DataFrame:
-    """
-    Load a CSV with a date column ('Date_' or 'Date'), parse dates, rename, and set as index.
+# Parsed frames kept by load_csv, most recently used last
+LOAD_CACHE_SIZE = 32
+_load_cache = OrderedDict()
+_load_stats = {'hits': 0, 'misses': 0}
+_load_lock = threading.Lock()
 
-    Expected raw columns may include:
-      - Date_ or Date
-      - Open, High, Low, Close, Volume
-      - MACD_12_26_9, MACDh_12_26_9, MACDs_12_26_9
-      - RSI_14, EFI_2
-      - EMA_11, EMA_22
-      - KCLs_20_3.0, KCBs_20_3.0, KCUs_20_3.0
 
-    This function will:
-      1. Detect the date column, parse it to datetime.
-      2. Rename it to 'Date'.
-      3. Rename indicator columns:
-         - 'KCLs_20_3.0' → 'KC_lower'
-         - 'KCBs_20_3.0' → 'KC_middle'
-         - 'KCUs_20_3.0' → 'KC_upper'
-         - 'EFI_2' → 'Elder_Force_Index_2'
-         - 'EMA_11' → 'EMA11'
-         - 'EMA_22' → 'EMA22'
-      4. Set the 'Date' column as index.
+def read_bar_csv(path) -> pd.DataFrame:
+    """
+    Parse a bar CSV into a frame indexed by 'Date', keeping raw column names.
+
+    The date column may be 'Date_' or 'Date'; otherwise the first column is used.
     """
     # Read without parse_dates to inspect columns
     df = pd.read_csv(path)
@@ -46,57 +42,277 @@ def load_csv(path: str) -> pd.DataFrame:
     if date_col != 'Date':
         df.rename(columns={date_col: 'Date'}, inplace=True)
 
-    # Indicator column renames
-    rename_map = {
-        'KCLs_20_3.0': 'KC_lower',
-        'KCBs_20_3.0': 'KC_middle',
-        'KCUs_20_3.0': 'KC_upper',
-        'EFI_2':       'Elder_Force_Index_2',
-        'EMA_11':      'EMA11',
-        'EMA_22':      'EMA22'
-    }
-    df.rename(columns=rename_map, inplace=True)
-
     # Set index
     df.set_index('Date', inplace=True)
     return df
 
 
-def compute_keltner(df: pd.DataFrame, period: int = 20, multiplier: float = 3.0) -> pd.DataFrame:
+# Columns compared when deciding whether a re-downloaded bar corrects a stored one
+PRICE_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+
+def read_csv_tail(path, n_rows: int = 10):
     """
-    Compute a 3-level Keltner Channel (lower, middle, upper) based on EMA and ATR.
+    Parse the header and the last `n_rows` rows of a bar CSV without reading the rest.
+
+    Parameters
+    ----------
+    path : str or Path
+        CSV whose first column holds the bar dates.
+    n_rows : int
+        Number of trailing rows to parse.
+
+    Returns
+    -------
+    offset : int
+        Byte offset at which the first returned row starts in the file.
+    tail : pd.DataFrame
+        The trailing rows, indexed by the parsed date column.
     """
-    df = df.copy()
-    df['EMA20']     = df['Close'].ewm(span=period, adjust=False).mean()
-    df['ATR20']     = (df['High'] - df['Low']).rolling(window=period).mean()
-    df['KC_lower']  = df['EMA20'] - multiplier * df['ATR20']
-    df['KC_middle'] = df['EMA20']
-    df['KC_upper']  = df['EMA20'] + multiplier * df['ATR20']
-    return df
+    with open(path, 'rb') as f:
+        header = f.readline()
+        body_start = f.tell()
+        f.seek(0, os.SEEK_END)
+        pos = f.tell()
+        data = b''
+        while pos > body_start and data.count(b'\n') <= n_rows:
+            step = min(8192, pos - body_start)
+            pos -= step
+            f.seek(pos)
+            data = f.read(step) + data
+
+    lines = data.splitlines(keepends=True)
+    if pos > body_start and lines:
+        # The first chunk line may start mid-row
+        pos += len(lines.pop(0))
+    while lines and not lines[-1].strip():
+        lines.pop()
+    skip, lines = lines[:-n_rows], lines[-n_rows:]
+    offset = pos + sum(len(line) for line in skip)
+
+    tail = pd.read_csv(io.BytesIO(header + b''.join(lines)), index_col=0, parse_dates=[0])
+    tail.index.name = 'Date'
+    return offset, tail
+
+
+def _merge_bars(df_old: pd.DataFrame, df_new: pd.DataFrame) -> pd.DataFrame:
+    # Corrected prices overwrite stored ones; stored indicator values are kept.
+    overlap = df_new.index.intersection(df_old.index)
+    cols = [c for c in PRICE_COLUMNS if c in df_old.columns and c in df_new.columns]
+    if len(overlap) and cols:
+        df_old.loc[overlap, cols] = df_new.loc[overlap, cols].to_numpy()
+    combined = pd.concat([df_old, df_new[~df_new.index.isin(df_old.index)]])
+    combined.sort_index(inplace=True)
+    return combined
+
+
+def write_new_bars(csv_path, df_new: pd.DataFrame, tail_rows: int = 10) -> str:
+    """
+    Merge freshly downloaded bars into an existing bar CSV with minimal I/O.
+
+    Only the last `tail_rows` rows of the file are parsed. Bars newer than the
+    last stored date are appended. Re-downloaded bars that differ from the
+    stored ones (late corrections) or fill a gap are merged by rewriting just
+    the tail when they fall inside it, and by rewriting the whole file only
+    when they land further back in history.
+
+    Parameters
+    ----------
+    csv_path : str or Path
+        Existing CSV written by the downloaders.
+    df_new : pd.DataFrame
+        Downloaded bars indexed by Date. Columns the CSV does not already
+        have are dropped, so the file keeps its schema; indicator columns it
+        lacks (e.g. Keltner bands of another mode) raise ValueError instead.
+    tail_rows : int
+        Rows read from the end of the file to compare against.
+
+    Returns
+    -------
+    str
+        'unchanged', 'append', 'tail' or 'rewrite'.
+    """
+    offset, tail = read_csv_tail(csv_path, tail_rows)
+    if tail.empty:
+        mode = 'rewrite'
+    else:
+        lost = [c for c in df_new.columns if c not in tail.columns and schema.parse_column(c)]
+        if lost:
+            raise ValueError(f"{csv_path} has no {lost} columns; its stored indicators differ")
+        df_new = df_new.reindex(columns=tail.columns)
+        last_date = tail.index.max()
+        stored = df_new[df_new.index <= last_date]
+
+        changed = stored.index.difference(tail.index)
+        known = stored.index.intersection(tail.index)
+        cols = [c for c in PRICE_COLUMNS if c in tail.columns]
+        if len(known) and cols:
+            a = stored.loc[known, cols].to_numpy(dtype=float)
+            b = tail.loc[known, cols].to_numpy(dtype=float)
+            same = np.isclose(a, b, rtol=1e-9, equal_nan=True).all(axis=1)
+            changed = changed.union(known[~same])
+
+        if changed.empty:
+            fresh = df_new[df_new.index > last_date]
+            if fresh.empty:
+                return 'unchanged'
+            with open(csv_path, 'rb+') as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b'\n':
+                    f.write(b'\n')
+            fresh.to_csv(csv_path, mode='a', header=False)
+            return 'append'
+        mode = 'tail' if changed.min() >= tail.index.min() else 'rewrite'
+
+    if mode == 'tail':
+        merged = _merge_bars(tail, df_new)
+        with open(csv_path, 'rb+') as f:
+            f.truncate(offset)
+        merged.to_csv(csv_path, mode='a', header=False)
+    else:
+        df_old = pd.read_csv(csv_path, index_col=0, parse_dates=[0])
+        df_old.index.name = 'Date'
+        _merge_bars(df_old, df_new).to_csv(csv_path)
+    return mode
 
 
+def _load_cache_key(path) -> tuple:
+    # Key on the CSV's identity and stat so a rewrite invalidates the entry;
+    # fall back to the column store when the CSV has been archived.
+    src = path if os.path.exists(path) else bar_store.store_path(path) / bar_store.META_FILE
+    st = os.stat(src)
+    return (os.path.abspath(path), st.st_mtime_ns, st.st_size)
+
+
+def load_csv_cache_info() -> dict:
+    """
+    Return load_csv cache counters: hits, misses, current size and maxsize.
+    """
+    return {**_load_stats, 'size': len(_load_cache), 'maxsize': LOAD_CACHE_SIZE}
+
+
+def clear_load_csv_cache():
+    """
+    Drop every cached frame and reset the hit/miss counters.
+    """
+    _load_cache.clear()
+    _load_stats['hits'] = _load_stats['misses'] = 0
+
+
+def load_csv(path: str, copy: bool = False) -> pd.DataFrame:
+    """
+    Load a CSV with a date column ('Date_' or 'Date'), parse dates, rename, and set as index.
+
+    Parsed frames are kept in a process-wide LRU cache (LOAD_CACHE_SIZE entries)
+    keyed on (path, mtime, size), so loading the same file twice in one run costs
+    a dictionary lookup; the cache is safe to share between threads. The cached
+    frame itself is returned: treat it as read-only, or pass copy=True to get a
+    private copy you can modify in place.
+
+    Expected raw columns may include:
+      - Date_ or Date
+      - Open, High, Low, Close, Volume
+      - MACD_12_26_9, MACDh_12_26_9, MACDs_12_26_9
+      - RSI_14, EFI_2
+      - EMA_11, EMA_22
+      - KCLs_20_3.0, KCBs_20_3.0, KCUs_20_3.0 (or the KCLe_/KCBe_/KCUe_ EMA variants)
+
+    This function will:
+      1. Open the memory-mapped column store next to the CSV if it is fresh
+         (see src.bar_store), otherwise parse the CSV and its date column.
+      2. Rename the date column to 'Date'.
+      3. Rename indicator columns to canonical names via src.schema.resolve,
+         whatever their pandas_ta parameters:
+         - 'KCL?_n_k' / 'KCB?_n_k' / 'KCU?_n_k' → 'KC_lower' / 'KC_middle' / 'KC_upper'
+           (and 'ATRn', the band ATR, if absent)
+         - 'MACD_f_s_g' / 'MACDh_…' / 'MACDs_…' → 'MACD' / 'MACD_Hist' / 'MACD_Signal'
+         - 'EFI_n' → 'EFI'
+         - 'EMA_11' → 'EMA11', 'EMA_22' → 'EMA22'
+         The parameters found are recorded in df.attrs['indicator_params'].
+      4. Set the 'Date' column as index.
+    """
+    key = _load_cache_key(path)
+    with _load_lock:
+        df = _load_cache.get(key)
+        if df is not None:
+            _load_stats['hits'] += 1
+            _load_cache.move_to_end(key)
+        else:
+            _load_stats['misses'] += 1
+    if df is not None:
+        return df.copy() if copy else df
+
+    if bar_store.is_fresh(path):
+        df = bar_store.read_frame(bar_store.store_path(path))
+    else:
+        df = read_bar_csv(path)
+
+    # Indicator column renames
+    schema.resolve(df)
+
+    with _load_lock:
+        # Stale entries for the same path can never hit again
+        for k in [k for k in _load_cache if k[0] == key[0]]:
+            del _load_cache[k]
+        _load_cache[key] = df
+        while len(_load_cache) > LOAD_CACHE_SIZE:
+            _load_cache.popitem(last=False)
+    return df.copy() if copy else df
+
+
+def compute_keltner(df: pd.DataFrame, period: int = 20, multiplier: float = 3.0,
+                    bands: str = 'hl', mamode: str = 'ema') -> pd.DataFrame:
+    """
+    Compute a 3-level Keltner Channel (lower, middle, upper) based on EMA and ATR.
+
+    `bands` picks the kind (see src.schema): 'hl', the repo's channel (EMA of
+    Close ± multiplier × SMA of High − Low), or 'tr', pandas_ta's kc as stored
+    in the CSVs, whose `mamode` ('ema' or 'sma') averages Close and the true
+    range. 'EMA20' and 'ATR20' hold the basis and band average.
+
+    Returns a copy of `df`; use src.indicators.add_indicators to compute the
+    channel together with RSI/MACD/EFI/ATR without copying.
+    """
+    df = df.copy()
+    arrays = (indicators.float_array(df['Close']), indicators.float_array(df['High']),
+              indicators.float_array(df['Low']), period, multiplier)
+    if bands == 'hl':
+        if mamode != 'ema':
+            raise ValueError(f"The 'hl' Keltner channel has no {mamode} variant")
+        ema, atr, lower, middle, upper = indicators.keltner(*arrays)
+    elif bands == 'tr':
+        ema, atr, lower, middle, upper = indicators.ta_keltner(*arrays, mamode=mamode)
+    else:
+        raise ValueError(f"Unknown Keltner bands: {bands}")
+    df['EMA20']     = ema
+    df['ATR20']     = atr
+    df['KC_lower']  = lower
+    df['KC_middle'] = middle
+    df['KC_upper']  = upper
+    return schema.record_params(df, keltner={'mamode': mamode, 'bands': bands, 'length': period, 'scalar': multiplier})
 
-import pandas_ta as ta
 
 def compute_rsi(df: pd.DataFrame, period: int = 14) -> pd.DataFrame:
     df = df.copy()
-    df['RSI_14'] = ta.rsi(df['Close'], length=period)
+    df['RSI_14'] = indicators.rsi(indicators.float_array(df['Close']), period)
     return df
 
 def compute_macd(df: pd.DataFrame) -> pd.DataFrame:
     df = df.copy()
-    macd = ta.macd(df['Close'])
-    df['MACD'] = macd['MACD_12_26_9']
-    df['MACD_Signal'] = macd['MACDs_12_26_9']
-    df['MACD_Hist'] = macd['MACDh_12_26_9']
+    macd, signal, hist = indicators.macd(indicators.float_array(df['Close']))
+    df['MACD'] = macd
+    df['MACD_Signal'] = signal
+    df['MACD_Hist'] = hist
     return df
 
 def compute_efi(df: pd.DataFrame, length: int = 2) -> pd.DataFrame:
     df = df.copy()
-    df['EFI'] = ta.efi(close=df['Close'], volume=df['Volume'], length=length)
+    df['EFI'] = indicators.efi(indicators.float_array(df['Close']), indicators.float_array(df['Volume']), length)
     return df
 
 def compute_atr(df: pd.DataFrame, period: int = 14) -> pd.DataFrame:
     df = df.copy()
-    df['ATR'] = ta.atr(high=df['High'], low=df['Low'], close=df['Close'], length=period)
+    df['ATR'] = indicators.atr(
+        indicators.float_array(df['High']), indicators.float_array(df['Low']), indicators.float_array(df['Close']), period
+    )
     return df
@@ -0,0 +1,263 @@
+# src/walk_forward.py
+
+"""
+Walk-forward selection of rule-based filter configs and model parameters.
+
+The history is cut into rolling (or anchored) train/test windows. In every
+window a choice is made on the train segment only — the filter config of
+configs/filter_config_matrix.csv with the best average trade return, or the
+RandomForest parameters with the best validation F1 — and then scored on the
+following test segment, so the results show how the selection procedure
+would have performed out of sample.
+
+Nothing is recomputed per window. The trades of every config come from one
+full-history `filter_grid.run_grid` pass (indicators once per ticker; a
+window is then a date filter on entries and exits, see
+src.strategy.period_candidates), and the features come from the feature
+store tables, loaded once and sliced by date. The cost of an extra window is
+a group-by over the trade table, or the model fits of that window.
+
+A window's trades are therefore not those of a backtest on the window's bars
+alone: their indicators are warmed up on all the history before the window,
+as they would be for a live trader at that time. This is deliberate; a
+backtest started cold at the window start would lose its first ~26 bars to
+NaN indicators and see EMAs from a different seed. Indicators only use past
+bars, so the warm-up does not leak test data into train windows.
+
+    python -m src.walk_forward rules [--train-years 3] [--test-years 1] [--anchored]
+    python -m src.walk_forward model [--train-years 3] [--test-years 1] [--anchored]
+"""
+
+import argparse
+import json
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from sklearn.model_selection import ParameterGrid
+
+from src.backtest import evaluate_preds
+from src.feature_store import STORE_ROOT, load_table
+from src.features import FEATURE_COLUMNS
+from src.filter_grid import run_grid
+from src.model import train_model
+
+CONFIG_PATH  = "configs/filter_config_matrix.csv"
+TICKERS_FILE = "src/tickers.txt"
+RESULTS_DIR  = "results"
+
+MIN_TRADES   = 30     # configs with fewer train trades are not eligible
+EMBARGO_DAYS = 7      # train events this close to the test start may see test bars in their labels
+VAL_FRACTION = 0.25   # latest share of each train segment used to pick model params
+
+# Reduced src.hyperparams grid; every combination is fitted in every window
+MODEL_GRID = {
+    'clf__n_estimators':     [50, 100],
+    'clf__max_depth':        [5, 10],
+    'clf__min_samples_leaf': [1, 5],
+}
+
+
+def make_windows(first, last, train_years: int = 3, test_years: int = 1,
+                 step_years: int = None, anchored: bool = False) -> list:
+    """
+    Train/test windows covering `first`..`last`.
+
+    Parameters
+    ----------
+    first, last : date-like
+        First and last date of the history.
+    train_years, test_years : int
+        Segment lengths.
+    step_years : int, optional
+        Shift between windows (defaults to test_years, so test segments tile).
+    anchored : bool
+        Keep every train segment starting at `first` (expanding window).
+
+    Returns
+    -------
+    list of tuple
+        (train_start, test_start, test_end) timestamps; each segment includes
+        its start and excludes its end. The last test segment is cut at `last`.
+    """
+    first, last = pd.Timestamp(first), pd.Timestamp(last)
+    step = pd.DateOffset(years=step_years or test_years)
+    end = last + pd.Timedelta(days=1)
+    windows, start = [], first
+    while start + pd.DateOffset(years=train_years) <= last:
+        test_start = start + pd.DateOffset(years=train_years)
+        test_end = min(test_start + pd.DateOffset(years=test_years), end)
+        windows.append((first if anchored else start, test_start, test_end))
+        start = start + step
+    return windows
+
+
+def _trade_stats(returns: pd.Series) -> dict:
+    return {
+        'trades':           len(returns),
+        'win_rate_pct':     100 * returns.gt(0).mean() if len(returns) else np.nan,
+        'avg_return_pct':   returns.mean(),
+        'total_return_pct': returns.sum(),
+    }
+
+
+def walk_forward_rules(trades: pd.DataFrame, windows, min_trades: int = MIN_TRADES) -> pd.DataFrame:
+    """
+    Pick the best filter config on each train segment and score it on the test segment.
+
+    Parameters
+    ----------
+    trades : pd.DataFrame
+        Full-history trades of every config, as returned by run_grid
+        ('Config_ID', 'Entry Date', 'Exit Date', 'Return %', ...).
+    windows : list of tuple
+        Output of `make_windows`.
+    min_trades : int
+        Minimum train trades for a config to be eligible.
+
+    Returns
+    -------
+    pd.DataFrame
+        One row per window: its dates, the chosen 'Config_ID' (None if no
+        config is eligible), its train average return and trade count, and
+        its test trades, win rate, average and total return.
+    """
+    entry = trades['Entry Date'].to_numpy()
+    exit_ = trades['Exit Date'].to_numpy()
+    rows = []
+    for train_start, test_start, test_end in windows:
+        # A segment holds the trades that enter and exit inside it
+        train = trades[(entry >= train_start) & (exit_ < test_start)]
+        stats = train.groupby('Config_ID')['Return %'].agg(['size', 'mean'])
+        stats = stats[stats['size'] >= min_trades]
+        row = {'train_start': train_start, 'test_start': test_start, 'test_end': test_end}
+        if stats.empty:
+            rows.append({**row, 'Config_ID': None})
+            continue
+
+        best = stats['mean'].idxmax()
+        test = trades[(entry >= test_start) & (exit_ < test_end) & (trades['Config_ID'] == best).to_numpy()]
+        rows.append({
+            **row,
+            'Config_ID':            best,
+            'train_trades':         int(stats.at[best, 'size']),
+            'train_avg_return_pct': stats.at[best, 'mean'],
+            **{f'test_{k}': v for k, v in _trade_stats(test['Return %']).items()},
+        })
+    return pd.DataFrame(rows)
+
+
+def feature_panel(tickers, spec: dict = None, root=STORE_ROOT) -> pd.DataFrame:
+    """
+    Feature store tables of `tickers` stacked in date order, with a 'Ticker' column.
+    """
+    tables = []
+    for ticker in tickers:
+        try:
+            table = load_table(ticker, spec, root)
+        except (OSError, KeyError, ValueError) as e:
+            print(f"Skipping {ticker}: {e}")
+            continue
+        tables.append(table.assign(Ticker=ticker))
+    if not tables:
+        return pd.DataFrame()
+    return pd.concat(tables).sort_index(kind='stable')
+
+
+def walk_forward_model(panel: pd.DataFrame, windows, grid: dict = None,
+                       val_fraction: float = VAL_FRACTION, embargo_days: int = EMBARGO_DAYS) -> pd.DataFrame:
+    """
+    Pick RandomForest parameters on each train segment and score the retrained
+    model on the test segment.
+
+    Within a train segment the latest `val_fraction` of events is held out;
+    every combination of `grid` is fitted on the rest and the one with the
+    best held-out F1 is refitted on the whole segment. Train events within
+    `embargo_days` of the next segment are dropped, since their reversal
+    labels look ahead into it.
+
+    Parameters
+    ----------
+    panel : pd.DataFrame
+        Output of `feature_panel` (date index, FEATURE_COLUMNS, 'Reversal').
+    windows : list of tuple
+        Output of `make_windows`.
+    grid : dict, optional
+        Pipeline parameter grid (defaults to MODEL_GRID).
+
+    Returns
+    -------
+    pd.DataFrame
+        One row per window: its dates, train/test sizes, the chosen params
+        (JSON), their validation F1, and test precision, recall and F1.
+        Windows whose train labels hold a single class are skipped.
+    """
+    grid = list(ParameterGrid(grid or MODEL_GRID))
+    dates = panel.index.to_numpy()
+    X = panel[list(FEATURE_COLUMNS)]
+    y = panel['Reversal'].astype(bool)
+    embargo = pd.Timedelta(days=embargo_days)
+
+    rows = []
+    for train_start, test_start, test_end in windows:
+        train = np.flatnonzero((dates >= train_start) & (dates < test_start - embargo))
+        test = np.flatnonzero((dates >= test_start) & (dates < test_end))
+        split = int(len(train) * (1 - val_fraction))
+        fit, val = train[:split], train[split:]
+        if len(test) == 0 or y.iloc[fit].nunique() < 2 or y.iloc[train].nunique() < 2:
+            continue
+
+        scores = []
+        for params in grid:
+            model = train_model(X.iloc[fit], y.iloc[fit], params=params)
+            scores.append(evaluate_preds(y.iloc[val], model.predict(X.iloc[val]))['f1'])
+        best = grid[int(np.argmax(scores))]
+
+        model = train_model(X.iloc[train], y.iloc[train], params=best)
+        m = evaluate_preds(y.iloc[test], model.predict(X.iloc[test]))
+        rows.append({
+            'train_start': train_start, 'test_start': test_start, 'test_end': test_end,
+            'train_events': len(train), 'test_events': len(test),
+            'params':       json.dumps(best, sort_keys=True),
+            'val_f1':       max(scores),
+            **{f'test_{k}': v for k, v in m.items()},
+        })
+    return pd.DataFrame(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("mode", choices=["rules", "model"])
+    parser.add_argument("--train-years", type=int, default=3)
+    parser.add_argument("--test-years", type=int, default=1)
+    parser.add_argument("--anchored", action="store_true", help="Expanding train windows")
+    args = parser.parse_args()
+
+    tickers = [t.strip().upper() for t in Path(TICKERS_FILE).read_text().splitlines()
+               if t.strip() and not t.startswith("#")]
+
+    if args.mode == "rules":
+        trades = run_grid(pd.read_csv(CONFIG_PATH), tickers)
+        dates = trades['Entry Date']
+    else:
+        panel = feature_panel(tickers)
+        dates = panel.index
+    windows = make_windows(dates.min(), dates.max(), args.train_years, args.test_years,
+                           anchored=args.anchored)
+    print(f"{len(windows)} walk-forward windows")
+
+    if args.mode == "rules":
+        print("Note: window trades use indicators warmed up on the history before each window")
+        result = walk_forward_rules(trades, windows)
+    else:
+        result = walk_forward_model(panel, windows)
+
+    print(result.to_string(index=False))
+    Path(RESULTS_DIR).mkdir(exist_ok=True)
+    out = Path(RESULTS_DIR) / f"walk_forward_{args.mode}.csv"
+    result.to_csv(out, index=False)
+    print(f"Saved walk-forward results to {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -63,7 +63,7 @@ for ticker in labeled_events["Ticker"].unique():
         weekly_touches.index = pd.to_datetime(weekly_touches.index)
 
         # Drop NaNs in required columns
-        required_cols = ['KC_lower', 'KC_middle', 'KC_upper', 'MACD_12_26_9', 'RSI_14', 'ATR20']
+        required_cols = ['KC_lower', 'KC_middle', 'KC_upper', 'MACD', 'RSI_14', 'ATR20']
         weekly_touches.dropna(subset=required_cols, inplace=True)
 
         print(f"{ticker} weekly columns: {weekly_touches.columns.tolist()}")
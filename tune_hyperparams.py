@@ -5,72 +5,163 @@ Phase 1: Hyperparameter tuning on a representative subset of tickers.
 This script:
   1. Reads tickers from src/tickers.txt
   2. Samples a subset of N tickers (default 20)
-  3. For each ticker:
-     - Loads data
-     - Detects touch events
-     - Labels reversals
-     - Builds features
-     - Runs GridSearchCV (TimeSeriesSplit) on a trimmed grid
-     - Collects best_params_
-  4. Aggregates best parameters across tickers to find consensus defaults
-  5. Saves individual results to results/tuning_results.csv and consensus to results/consensus_params.json
+  3. Loads each sampled ticker's events, labels and features from the feature
+     store once, and keeps X/y in memory for every search below
+  4. Tunes each ticker with TimeSeriesSplit cross-validation, either
+     - grid:    exhaustive GridSearchCV over the trimmed grid, or
+     - halving: successive halving with n_estimators as the budget — every
+                candidate starts with the smallest forest and only the best
+                half moves on to the next size; n_estimators is then picked
+                for the winner from the grid values
+     Tickers run concurrently in worker processes, splitting a global core
+     budget between them.
+  5. Aggregates best parameters across tickers to find consensus defaults
+  6. Saves individual results to results/tuning_results.csv and consensus to results/consensus_params.json
 
 Run:
-  python src/tune_hyperparams.py
+  python tune_hyperparams.py [--search grid|halving] [--cores N] [--workers N] [--compare]
+
+--compare also runs the other search mode and reports the wall-clock time of
+both and how often they agree (results/tuning_comparison.csv).
 """
+import os
 import json
+import time
 import random
+import argparse
 from pathlib import Path
 from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 
+import numpy as np
 import pandas as pd
 
-from sklearn.model_selection import TimeSeriesSplit
-from src.utils      import load_csv
-from src.detection  import find_daily_touches, find_weekly_touches
-from src.labeling   import label_reversals
-from src.features   import build_feature_matrix
-from src.model      import train_model
+from sklearn.experimental import enable_halving_search_cv  # noqa: F401
+from sklearn.model_selection import HalvingGridSearchCV, TimeSeriesSplit, cross_val_score
+from src.feature_store import load_xy
+from src.model      import build_pipeline, limit_threads, train_model
 from src.hyperparams import param_grid  # your trimmed grid
 
 # Configuration
 SAMPLE_SIZE = 20    # number of tickers to tune on
 CV_SPLITS   = 3     # folds for TimeSeriesSplit
+HALVING_FACTOR = 2  # share of candidates kept (1/factor) and forest growth per halving round
 RESULTS_DIR = Path("results")
 RESULTS_DIR.mkdir(exist_ok=True)
 
-def tune_ticker(ticker: str):
+def load_sample(tickers) -> dict:
+    """
+    Touch events, labels and features of every ticker, refreshed from the CSVs
+    if needed and loaded once for all searches.
+    """
+    return {t: load_xy(t) for t in tickers}
+
+
+def halving_search(X, y, n_jobs: int = -1) -> dict:
+    """
+    Successive halving over param_grid with n_estimators as the resource.
+
+    Returns the best parameters, including the n_estimators grid value that
+    scores best for them.
+    """
+    sizes = sorted(param_grid['clf__n_estimators'])
+    grid = {k: v for k, v in param_grid.items() if k != 'clf__n_estimators'}
+    cv = TimeSeriesSplit(n_splits=CV_SPLITS)
+    search = HalvingGridSearchCV(
+        build_pipeline(), grid,
+        resource='clf__n_estimators',
+        min_resources=sizes[0],
+        max_resources=sizes[-1],
+        factor=HALVING_FACTOR,
+        cv=cv,
+        scoring='f1',
+        refit=False,
+        n_jobs=n_jobs
+    )
+    search.fit(X, y)
+
+    # Forest size for the winner: the smallest of the best-scoring grid values
+    best = {k: v for k, v in search.best_params_.items() if k != 'clf__n_estimators'}
+    scores = [
+        cross_val_score(build_pipeline({**best, 'clf__n_estimators': n}), X, y,
+                        cv=cv, scoring='f1', n_jobs=n_jobs).mean()
+        for n in sizes
+    ]
+    return {**best, 'clf__n_estimators': sizes[int(np.argmax(scores))]}
+
+
+def tune_ticker(ticker: str, X=None, y=None, search: str = 'grid', n_jobs: int = -1):
     """
     Tune hyperparameters for a single ticker.
 
     Returns the best_params_ dict.
     """
-    # Load and detect
-    df_full      = load_csv(f"stock_historical_information/daily/{ticker}_daily.csv")
-    daily_events = find_daily_touches(ticker)
-    weekly_events= find_weekly_touches(ticker)
-
-    # Label
-    touch_dates = daily_events.index.to_list()
-    labeled     = label_reversals(df_full, touch_dates, lookahead=[1,2])
-
-    # Merge and build features
-    events = daily_events.join(
-        labeled[['Close_t','Reversal','First_Reversal_Day','First_Reversal_Date']]
-    )
-    X, y = build_feature_matrix(events, weekly_events)
+    if X is None:
+        # Touch events, labels and features, refreshed from the CSVs if needed
+        X, y = load_xy(ticker)
+
+    print(f"Tuning {ticker}: {len(X)} samples ({search})", flush=True)
+    if search == 'halving':
+        return halving_search(X, y, n_jobs=n_jobs)
 
-    print(f"Tuning {ticker}: {len(X)} samples", flush=True)
     # Train + grid search
     model = train_model(
         X, y,
         param_grid=param_grid,
-        cv_splits=CV_SPLITS
+        cv_splits=CV_SPLITS,
+        n_jobs=n_jobs
     )
     return model.best_params_
 
 
+def _tune_item(item, search, n_jobs):
+    ticker, (X, y) = item
+    return tune_ticker(ticker, X, y, search=search, n_jobs=n_jobs)
+
+
+def tune_all(data: dict, search: str = 'grid', cores: int = None, workers: int = None):
+    """
+    Tune every ticker of `data` (ticker → (X, y)).
+
+    `workers` tickers run concurrently (default: one per core, at most one
+    per ticker) and each search gets cores // workers jobs, so the total
+    stays within `cores`; worker BLAS/OpenMP pools are capped at the same
+    share (src.model.limit_threads).
+
+    Returns (per-ticker results indexed by ticker, wall-clock seconds).
+    """
+    cores = cores or os.cpu_count() or 1
+    workers = max(1, min(workers or cores, cores, len(data)))
+    n_jobs = max(1, cores // workers)
+
+    start = time.perf_counter()
+    tune = partial(_tune_item, search=search, n_jobs=n_jobs)
+    if workers == 1:
+        best = [tune(item) for item in data.items()]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=limit_threads,
+                                 initargs=(n_jobs,)) as pool:
+            best = list(pool.map(tune, data.items()))
+    elapsed = time.perf_counter() - start
+
+    results = [{'ticker': t, **b} for t, b in zip(data, best)]
+    return pd.DataFrame(results).set_index('ticker'), elapsed
+
+
+def consensus_params(df_res: pd.DataFrame) -> dict:
+    # Most common value for each param
+    return {param: Counter(df_res[param].tolist()).most_common(1)[0][0] for param in param_grid}
+
+
 def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--search", choices=["grid", "halving"], default="grid")
+    parser.add_argument("--cores", type=int, default=None, help="Global core budget (default: all)")
+    parser.add_argument("--workers", type=int, default=None, help="Tickers tuned concurrently")
+    parser.add_argument("--compare", action="store_true", help="Also run the other search mode and compare")
+    args = parser.parse_args()
+
     # Read all tickers
     tickers_path = Path("src/tickers.txt")
     if not tickers_path.exists():
@@ -85,29 +176,43 @@ def main():
     random.seed(42)
     sample_tickers = random.sample(all_tickers, min(SAMPLE_SIZE, len(all_tickers)))
     print(f"Sampled {len(sample_tickers)} tickers for tuning: {sample_tickers}")
+    data = load_sample(sample_tickers)
 
     # Tune each
-    results = []
-    for t in sample_tickers:
-        best = tune_ticker(t)
-        results.append({'ticker': t, **best})
+    df_res, elapsed = tune_all(data, args.search, args.cores, args.workers)
+    print(f"{args.search} search: {elapsed:.1f}s")
 
     # Save individual results
-    df_res = pd.DataFrame(results).set_index('ticker')
     res_csv = RESULTS_DIR / 'tuning_results.csv'
     df_res.to_csv(res_csv)
     print(f"Saved per-ticker results to {res_csv}")
 
-    # Compute consensus: most common value for each param
-    consensus = {}
-    for param in param_grid:
-        vals = df_res[param].tolist()
-        consensus[param] = Counter(vals).most_common(1)[0][0]
+    # Compute consensus
+    consensus = consensus_params(df_res)
 
     # Save consensus
     cons_json = RESULTS_DIR / 'consensus_params.json'
     cons_json.write_text(json.dumps(consensus, indent=2))
     print(f"Saved consensus params to {cons_json}")
 
+    if args.compare:
+        other = 'halving' if args.search == 'grid' else 'grid'
+        df_other, other_elapsed = tune_all(data, other, args.cores, args.workers)
+        times = {args.search: elapsed, other: other_elapsed}
+        runs = {args.search: df_res, other: df_other}
+        agree = (runs['grid'].astype(str) == runs['halving'].astype(str))
+        print(f"\nWall-clock: grid {times['grid']:.1f}s, halving {times['halving']:.1f}s "
+              f"({times['grid'] / times['halving']:.1f}x)")
+        print("Per-ticker agreement with the exhaustive grid:")
+        for param in param_grid:
+            print(f"  {param}: {agree[param].mean():.0%}")
+        print(f"Consensus — grid: {consensus_params(runs['grid'])}")
+        print(f"Consensus — halving: {consensus_params(runs['halving'])}")
+
+        comparison = runs['grid'].join(runs['halving'], lsuffix='_grid', rsuffix='_halving')
+        comp_csv = RESULTS_DIR / 'tuning_comparison.csv'
+        comparison.to_csv(comp_csv)
+        print(f"Saved comparison to {comp_csv}")
+
 if __name__ == '__main__':
     main()